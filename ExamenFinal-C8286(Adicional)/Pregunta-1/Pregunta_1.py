@@ -1,71 +1,749 @@
+import ast
 import asyncio
-from queue import PriorityQueue
+import bisect
+import builtins
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import os
+import pickle
+import sys
 import threading
 import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# trazas.py está en la carpeta del examen y lo comparten las cuatro preguntas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trazas
+
+# Eventos de las celdas del notebook (añadidas, modificadas, ejecutadas)
+TRAZA_CELDAS = trazas.TRAZADOR.componente('pregunta1.celdas')
 
 #Configuracion del bucle de eventos encargado de monitorear las corrutinas
 #Con el formato de mensajes log que mostrará el mensaje
 logging.basicConfig(level=logging.DEBUG, format=' %(message)s')
 
+# Excepción que indica que la cola de eventos fue cerrada y ya no quedan eventos
+class ColaCerrada(Exception):
+    pass
+
+# Cola de prioridad nativa de asyncio para los eventos del notebook.
+# Usa un heap con un contador de secuencia para mantener el orden FIFO dentro
+# de una misma prioridad y futures para despertar a los consumidores sin
+# ocupar hilos del executor.
+class ColaEventos:
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._heap = []
+        self._secuencia = itertools.count()
+        self._getters = deque()
+        self._putters = deque()
+        self._cerrada = False
+
+    def qsize(self):
+        return len(self._heap)
+
+    def empty(self):
+        return not self._heap
+
+    def full(self):
+        return 0 < self.maxsize <= len(self._heap)
+
+    # Despierta al primer future pendiente que siga esperando
+    def _despertar(self, esperando):
+        while esperando:
+            futuro = esperando.popleft()
+            if not futuro.done():
+                futuro.set_result(None)
+                break
+
+    # Añade un evento sin esperar, falla si la cola está llena o cerrada
+    def put_nowait(self, prioridad, evento):
+        if self._cerrada:
+            raise ColaCerrada()
+        if self.full():
+            raise asyncio.QueueFull()
+        heapq.heappush(self._heap, (prioridad, next(self._secuencia), evento))
+        self._despertar(self._getters)
+
+    # Añade un lote de (prioridad, evento) de una sola vez; si no caben todos
+    # no se añade ninguno
+    def put_varios_nowait(self, eventos):
+        if self._cerrada:
+            raise ColaCerrada()
+        eventos = [(prioridad, next(self._secuencia), evento) for prioridad, evento in eventos]
+        if self.maxsize > 0 and len(self._heap) + len(eventos) > self.maxsize:
+            raise asyncio.QueueFull()
+        if len(eventos) > len(self._heap):
+            # Reconstruir el heap es O(n) frente a O(k log n) de k inserciones
+            self._heap.extend(eventos)
+            heapq.heapify(self._heap)
+        else:
+            for entrada in eventos:
+                heapq.heappush(self._heap, entrada)
+        for _ in range(min(len(eventos), len(self._getters))):
+            self._despertar(self._getters)
+
+    # Añade un evento esperando a que haya espacio (backpressure)
+    async def put(self, prioridad, evento):
+        while self.full() and not self._cerrada:
+            futuro = asyncio.get_running_loop().create_future()
+            self._putters.append(futuro)
+            try:
+                await futuro
+            except BaseException:
+                futuro.cancel()
+                # Cede el turno a otro productor si se canceló tras ser despertado
+                if not self.full():
+                    self._despertar(self._putters)
+                raise
+        self.put_nowait(prioridad, evento)
+
+    def get_nowait(self):
+        if not self._heap:
+            if self._cerrada:
+                raise ColaCerrada()
+            raise asyncio.QueueEmpty()
+        prioridad, _, evento = heapq.heappop(self._heap)
+        self._despertar(self._putters)
+        return prioridad, evento
+
+    # Saca hasta maximo eventos en orden de prioridad sin esperar
+    def get_varios_nowait(self, maximo):
+        eventos = []
+        while self._heap and len(eventos) < maximo:
+            prioridad, _, evento = heapq.heappop(self._heap)
+            eventos.append((prioridad, evento))
+        for _ in range(min(len(eventos), len(self._putters))):
+            self._despertar(self._putters)
+        return eventos
+
+    # Obtiene el evento de mayor prioridad esperando si la cola está vacía
+    async def get(self):
+        while not self._heap and not self._cerrada:
+            futuro = asyncio.get_running_loop().create_future()
+            self._getters.append(futuro)
+            try:
+                await futuro
+            except BaseException:
+                futuro.cancel()
+                if self._heap:
+                    self._despertar(self._getters)
+                raise
+        return self.get_nowait()
+
+    # Cierra la cola: los eventos pendientes se siguen entregando y después
+    # los consumidores reciben ColaCerrada
+    def cerrar(self):
+        self._cerrada = True
+        for esperando in (self._getters, self._putters):
+            while esperando:
+                futuro = esperando.popleft()
+                if not futuro.done():
+                    futuro.set_result(None)
+
+# Analiza el código de una celda y devuelve los nombres que define en el
+# ámbito global y los nombres que lee (sin contar los builtins)
+class _AnalizadorNombres(ast.NodeVisitor):
+    def __init__(self):
+        self.define = set()
+        self.lee = set()
+        self.profundidad = 0
+
+    def visit_Name(self, nodo):
+        if isinstance(nodo.ctx, ast.Load):
+            self.lee.add(nodo.id)
+        elif self.profundidad == 0:
+            self.define.add(nodo.id)
+
+    # Las funciones, clases y lambdas solo definen su propio nombre;
+    # sus variables internas son locales
+    def _ambito(self, nodo):
+        if self.profundidad == 0 and hasattr(nodo, 'name'):
+            self.define.add(nodo.name)
+        self.profundidad += 1
+        self.generic_visit(nodo)
+        self.profundidad -= 1
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_Lambda = _ambito
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _ambito
+
+    def visit_Import(self, nodo):
+        if self.profundidad == 0:
+            for alias in nodo.names:
+                self.define.add(alias.asname or alias.name.split('.')[0])
+
+    visit_ImportFrom = visit_Import
+
+    # x += 1 lee x antes de volver a definirlo
+    def visit_AugAssign(self, nodo):
+        if isinstance(nodo.target, ast.Name):
+            self.lee.add(nodo.target.id)
+        self.generic_visit(nodo)
+
+
+def analizar_celda(codigo):
+    try:
+        arbol = ast.parse(codigo)
+    except SyntaxError:
+        return set(), set()
+    analizador = _AnalizadorNombres()
+    analizador.visit(arbol)
+    return analizador.define, analizador.lee - set(dir(builtins))
+
+# Caché LRU con límite de entradas y, opcionalmente, de tamaño total en bytes.
+# Lleva contadores de aciertos, fallos y desalojos para ajustar su tamaño.
+class CacheLRU:
+    def __init__(self, max_entradas=256, max_bytes=None):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.entradas = OrderedDict()  # clave -> (valor, tamaño)
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def obtener(self, clave):
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self.entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada[0]
+
+    def guardar(self, clave, valor, tamano=0):
+        if self.max_bytes is not None and tamano > self.max_bytes:
+            return
+        self.descartar(clave)
+        self.entradas[clave] = (valor, tamano)
+        self.bytes += tamano
+        while len(self.entradas) > self.max_entradas or \
+                (self.max_bytes is not None and self.bytes > self.max_bytes):
+            antigua, (_, tamano_antiguo) = self.entradas.popitem(last=False)
+            self.bytes -= tamano_antiguo
+            self.desalojos += 1
+            self._desalojada(antigua)
+
+    def descartar(self, clave):
+        entrada = self.entradas.pop(clave, None)
+        if entrada is not None:
+            self.bytes -= entrada[1]
+            self._desalojada(clave)
+
+    # Gancho para las subclases que indexan las claves
+    def _desalojada(self, clave):
+        pass
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self.entradas),
+            'bytes': self.bytes,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'desalojos': self.desalojos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+        }
+
+
+def hash_codigo(codigo):
+    return hashlib.sha1(codigo.encode()).digest()
+
+# Caché de objetos de código compilados, indexada por el hash del código
+# fuente. Cada proceso (el notebook o cada trabajador) tiene la suya.
+cache_codigo = CacheLRU(max_entradas=1024)
+
+# Compila una celda: sus sentencias y, si termina en una expresión, esa
+# expresión por separado para devolver su valor
+def compilar_celda(codigo):
+    clave = hash_codigo(codigo)
+    compilado = cache_codigo.obtener(clave)
+    if compilado is None:
+        arbol = ast.parse(codigo)
+        ultima = None
+        if arbol.body and isinstance(arbol.body[-1], ast.Expr):
+            ultima = compile(ast.Expression(arbol.body.pop().value), '<celda>', 'eval')
+        compilado = (compile(arbol, '<celda>', 'exec'), ultima)
+        cache_codigo.guardar(clave, compilado)
+    return compilado
+
+# Evalúa una celda como en Jupyter: ejecuta sus sentencias y devuelve el valor
+# de la última expresión junto con los nombres que la celda define
+def evaluar_celda(codigo, entradas=None, definidos=()):
+    espacio = dict(entradas or {})
+    sentencias, ultima = compilar_celda(codigo)
+    exec(sentencias, espacio)
+    resultado = eval(ultima, espacio) if ultima else None
+    return resultado, {nombre: espacio[nombre] for nombre in definidos if nombre in espacio}
+
+# Memoización opcional de resultados de celdas puras. La clave combina la
+# celda, el hash de su código y sus entradas; los resultados se guardan
+# serializados, así cada acierto devuelve una copia y se conoce su tamaño.
+class CacheResultados(CacheLRU):
+    def __init__(self, max_entradas=256, max_bytes=64 * 1024 * 1024):
+        super().__init__(max_entradas, max_bytes)
+        self.por_celda = {}  # celda_id -> claves guardadas de esa celda
+
+    # Devuelve la clave de memoización, o None si las entradas no se pueden serializar
+    def clave(self, celda_id, codigo, entradas):
+        try:
+            datos = pickle.dumps(sorted(entradas.items()))
+        except Exception:
+            return None
+        return celda_id, hash_codigo(codigo) + hashlib.sha1(datos).digest()
+
+    def obtener_resultado(self, clave):
+        datos = self.obtener(clave)
+        return pickle.loads(datos) if datos is not None else None
+
+    def guardar_resultado(self, clave, resultado, salidas):
+        try:
+            datos = pickle.dumps((resultado, salidas))
+        except Exception:
+            return
+        self.guardar(clave, datos, len(datos))
+        # guardar descarta los resultados más grandes que max_bytes
+        if clave in self.entradas:
+            self.por_celda.setdefault(clave[0], set()).add(clave)
+
+    def _desalojada(self, clave):
+        claves = self.por_celda.get(clave[0])
+        if claves is not None:
+            claves.discard(clave)
+            if not claves:
+                del self.por_celda[clave[0]]
+
+    # Descarta los resultados de una celda (por ejemplo, al cambiar su código)
+    def invalidar_celda(self, celda_id):
+        for clave in list(self.por_celda.get(celda_id, ())):
+            self.descartar(clave)
+
+# Almacén de celdas indexado por id. Guarda para cada nombre qué celdas lo
+# definen y cuáles lo leen, lo que forma el grafo de dependencias: una celda
+# depende de la última celda anterior a ella que define cada nombre que lee.
+class AlmacenCeldas:
+    def __init__(self):
+        self.por_id = {}
+        self.definidores = {}  # nombre -> lista ordenada de ids que lo definen
+        self.lectores = {}     # nombre -> conjunto de ids que lo leen
+        self.ultimo_id = 0     # Mayor id usado, los ids automáticos siguen desde aquí
+
+    def __len__(self):
+        return len(self.por_id)
+
+    def __iter__(self):
+        return iter(self.por_id.values())
+
+    def obtener(self, celda_id):
+        return self.por_id.get(celda_id)
+
+    def _indexar(self, celda):
+        for nombre in celda['define']:
+            bisect.insort(self.definidores.setdefault(nombre, []), celda['id'])
+        for nombre in celda['lee']:
+            self.lectores.setdefault(nombre, set()).add(celda['id'])
+
+    def _desindexar(self, celda):
+        for nombre in celda['define']:
+            ids = self.definidores[nombre]
+            ids.remove(celda['id'])
+            if not ids:
+                del self.definidores[nombre]
+        for nombre in celda['lee']:
+            ids = self.lectores[nombre]
+            ids.discard(celda['id'])
+            if not ids:
+                del self.lectores[nombre]
+
+    # Añade una celda nueva o reemplaza el código de una existente
+    def guardar(self, codigo, celda_id=None):
+        define, lee = analizar_celda(codigo)
+        if celda_id is None:
+            celda_id = self.ultimo_id + 1
+        self.ultimo_id = max(self.ultimo_id, celda_id)
+        celda = self.por_id.get(celda_id)
+        if celda is None:
+            celda = {'id': celda_id, 'code': codigo, 'output': None, 'define': define, 'lee': lee}
+            self.por_id[celda_id] = celda
+        else:
+            self._desindexar(celda)
+            celda.update(code=codigo, output=None, define=define, lee=lee)
+        self._indexar(celda)
+        return celda
+
+    # Celda que provee un nombre a la celda celda_id (la última anterior que lo define)
+    def productor(self, nombre, celda_id):
+        ids = self.definidores.get(nombre, ())
+        posicion = bisect.bisect_left(ids, celda_id)
+        return ids[posicion - 1] if posicion else None
+
+    # Celdas afectadas (transitivamente) por la ejecución de celda_id, en orden
+    # de ejecución; solo recorre las celdas que leen algún nombre invalidado
+    def dependientes(self, celda_id):
+        afectadas = set()
+        pendientes = [celda_id]
+        while pendientes:
+            actual = self.por_id[pendientes.pop()]
+            for nombre in actual['define']:
+                for lector in self.lectores.get(nombre, ()):
+                    if lector not in afectadas and lector > actual['id'] \
+                            and self.productor(nombre, lector) == actual['id']:
+                        afectadas.add(lector)
+                        pendientes.append(lector)
+        return [self.por_id[i] for i in sorted(afectadas)]
+
+# Motores de ejecución de celdas: el notebook solo necesita que tengan una
+# corrutina ejecutar(codigo, entradas, definidos, timeout) que devuelva
+# (resultado, salidas) y una corrutina cerrar(). El timeout cuenta desde que
+# la celda empieza a ejecutarse, no el tiempo esperando un trabajador libre.
+
+# Ejecuta la celda en el mismo hilo del bucle de eventos (comportamiento original)
+class EjecutorLocal:
+    def __init__(self, retardo=2):
+        self.retardo = retardo
+
+    async def ejecutar(self, codigo, entradas=None, definidos=(), timeout=None):
+        await asyncio.wait_for(asyncio.sleep(self.retardo), timeout)  # Simula el tiempo de ejecución de la celda
+        return evaluar_celda(codigo, entradas, definidos)  # Evalúa el código de la celda
+
+    async def cerrar(self):
+        pass
+
+# Se queda solo con las variables que se pueden enviar de vuelta al notebook
+# (módulos o funciones definidas en el trabajador no se pueden serializar)
+def _serializables(salidas):
+    resultado = {}
+    for nombre, valor in salidas.items():
+        try:
+            pickle.dumps(valor)
+        except Exception:
+            continue
+        resultado[nombre] = valor
+    return resultado
+
+# Bucle de un proceso trabajador: recibe (código, entradas, definidos) por la
+# tubería y devuelve (True, (resultado, salidas)) o (False, excepción)
+def _trabajador_celda(conexion):
+    while True:
+        tarea = conexion.recv()
+        if tarea is None:
+            break
+        try:
+            resultado, salidas = evaluar_celda(*tarea)
+            respuesta = (True, (resultado, _serializables(salidas)))
+        except Exception as e:
+            respuesta = (False, e)
+        try:
+            conexion.send(respuesta)
+        except Exception as e:
+            # El resultado o la excepción no se pueden serializar
+            conexion.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+    conexion.close()
+
+# Ejecuta las celdas en un grupo de procesos trabajadores para no bloquear el
+# bucle de eventos. Limita las ejecuciones concurrentes a max_procesos y, si una
+# celda se cancela (o agota su tiempo), termina el proceso que la ejecutaba y
+# lo reemplaza por uno nuevo cuando haga falta.
+# Los send/recv bloqueantes de las tuberías se hacen en un grupo de hilos
+# (uno por proceso) con run_in_executor: funciona con cualquier bucle de
+# eventos, también con el ProactorEventLoop de Windows, que no admite
+# add_reader sobre una tubería.
+class EjecutorProcesos:
+    def __init__(self, max_procesos=None):
+        self.max_procesos = max_procesos or multiprocessing.cpu_count()
+        self.semaforo = asyncio.Semaphore(self.max_procesos)
+        self.hilos = ThreadPoolExecutor(self.max_procesos, thread_name_prefix='ejecutor-celdas')
+        self.libres = []
+        self.trabajadores = set()
+
+    def _crear_trabajador(self):
+        conexion, conexion_hijo = multiprocessing.Pipe()
+        proceso = multiprocessing.Process(target=_trabajador_celda, args=(conexion_hijo,), daemon=True)
+        proceso.start()
+        conexion_hijo.close()
+        trabajador = (proceso, conexion)
+        self.trabajadores.add(trabajador)
+        return trabajador
+
+    def _terminar_trabajador(self, trabajador):
+        proceso, conexion = trabajador
+        self.trabajadores.discard(trabajador)
+        proceso.terminate()
+        proceso.join()
+        conexion.close()
+
+    # Envía la tarea y espera la respuesta; se ejecuta en un hilo de self.hilos.
+    # Si el proceso se termina (cancelación o tiempo agotado), recv falla y el
+    # hilo queda libre
+    def _intercambiar(self, conexion, tarea):
+        try:
+            conexion.send(tarea)
+            return conexion.recv()
+        except (EOFError, OSError):
+            raise RuntimeError("El proceso trabajador terminó inesperadamente")
+
+    async def ejecutar(self, codigo, entradas=None, definidos=(), timeout=None):
+        loop = asyncio.get_running_loop()
+        async with self.semaforo:
+            trabajador = self.libres.pop() if self.libres else self._crear_trabajador()
+            try:
+                respuesta = loop.run_in_executor(self.hilos, self._intercambiar, trabajador[1],
+                                                 (codigo, entradas, tuple(definidos)))
+                correcto, valor = await asyncio.wait_for(respuesta, timeout)
+            except BaseException:
+                # Cancelación, tiempo agotado o trabajador caído: se descarta el proceso
+                self._terminar_trabajador(trabajador)
+                raise
+            self.libres.append(trabajador)
+        if not correcto:
+            raise valor
+        return valor
+
+    async def cerrar(self):
+        for proceso, conexion in self.libres:
+            conexion.send(None)
+        for trabajador in list(self.trabajadores):
+            trabajador[0].join(timeout=1)
+            self._terminar_trabajador(trabajador)
+        self.libres = []
+        self.hilos.shutdown()
+        self.hilos = ThreadPoolExecutor(self.max_procesos, thread_name_prefix='ejecutor-celdas')
+
 # Definimos el sistema de JupyterNotebook
 class Jupyter_Notebook:
-    def __init__(self):
-        self.celdas = []
-        self.evento_prio = PriorityQueue()
+    def __init__(self, max_eventos=0, ejecutor=None, timeout_celda=None, memoizar=None,
+                 max_lote=256, coalescer=True):
+        self.celdas = AlmacenCeldas()
+        self.espacio = {}  # Variables globales del notebook
+        self.evento_prio = ColaEventos(max_eventos)
         self.lock = threading.Lock()
+        self.tareas = set()
+        self.ejecutor = ejecutor or EjecutorLocal()
+        self.timeout_celda = timeout_celda
+        self.en_ejecucion = {}
+        self.max_lote = max_lote
+        # Ejecuciones lanzadas que aún no empezaron: celda_id -> tarea. Un nuevo
+        # evento execute de la misma celda se une a esa ejecución pendiente.
+        self.coalescer = coalescer
+        self.pendientes = {}
+        self.coalescidos = 0
+        # memoizar=True usa una CacheResultados por defecto; también se puede pasar una propia
+        self.resultados = CacheResultados() if memoizar is True else memoizar or None
     
-    # Se crea una corrutina que se encargará de la ejecución de celda
+    # Se crea una corrutina que se encargará de la ejecución de celda;
+    # devuelve True si la celda se ejecutó correctamente
     async def ejecuta_celda(self, celda):
         try:
-            await asyncio.sleep(2)  # Simula el tiempo de ejecución de la celda
-            resultado = eval(celda['code'])  # Evalúa el código de la celda
             with self.lock:
+                codigo, definidos = celda['code'], celda['define']
+                entradas = {n: self.espacio[n] for n in celda['lee'] if n in self.espacio}
+                clave = memoizado = None
+                if self.resultados is not None:
+                    clave = self.resultados.clave(celda['id'], codigo, entradas)
+                    if clave is not None:
+                        memoizado = self.resultados.obtener_resultado(clave)
+            if memoizado is not None:
+                resultado, salidas = memoizado
+            else:
+                resultado, salidas = await self.ejecutor.ejecutar(codigo, entradas, definidos, self.timeout_celda)
+            with self.lock:
+                # Solo se memoriza si el código no cambió durante la ejecución
+                if clave is not None and memoizado is None and celda['code'] == codigo:
+                    self.resultados.guardar_resultado(clave, resultado, salidas)
                 celda['output'] = resultado
-                logging.debug(f"Ejecutada celda {celda['id']}:{resultado}")
+                self.espacio.update(salidas)
+                if TRAZA_CELDAS.activo:
+                    TRAZA_CELDAS.evento('ejecutada', 'Ejecutada celda {celda}:{resultado}',
+                                        celda=celda['id'], resultado=resultado)
+            return True
 
+        except asyncio.TimeoutError:
+            logging.error(f"Tiempo agotado al ejecutar celda {celda['id']}")
+        except asyncio.CancelledError:
+            logging.error(f"Cancelada la ejecución de celda {celda['id']}")
+            raise
         except Exception as e:
             logging.error(f"Error en ejecutar celda {celda['id']}: {e}")
+        return False
+
+    # Espera a que terminen las ejecuciones en curso de las celdas que proveen
+    # los nombres que lee la celda. Los productores siempre tienen id menor,
+    # así que las esperas no forman ciclos.
+    async def _esperar_productores(self, celda):
+        with self.lock:
+            productores = {self.celdas.productor(n, celda['id']) for n in celda['lee']}
+        actual = asyncio.current_task()
+        tareas = {t for p in productores for t in self.en_ejecucion.get(p, ()) if t is not actual}
+        if tareas:
+            await asyncio.wait(tareas)
+
+    # Ejecuta una celda y después solo las celdas que dependen de los nombres
+    # que define, en orden; si una celda falla no se propaga a sus dependientes
+    async def ejecuta_con_dependientes(self, celda):
+        await self._esperar_productores(celda)
+        # A partir de aquí se lee el código de la celda: un nuevo execute ya no
+        # se puede unir a esta ejecución
+        if self.pendientes.get(celda['id']) is asyncio.current_task():
+            del self.pendientes[celda['id']]
+        if not await self.ejecuta_celda(celda):
+            return
+        with self.lock:
+            dependientes = self.celdas.dependientes(celda['id'])
+        fallidas = set()
+        for dependiente in dependientes:
+            with self.lock:
+                bloqueada = any(self.celdas.productor(n, dependiente['id']) in fallidas
+                                for n in dependiente['lee'])
+            if bloqueada or not await self.ejecuta_celda(dependiente):
+                fallidas.add(dependiente['id'])
+
+    # Cancela las ejecuciones en curso de una celda
+    def cancelar_celda(self, celda_id):
+        tareas = self.en_ejecucion.get(celda_id, ())
+        for tarea in tareas:
+            tarea.cancel()
+        return len(tareas)
     
-    # Añadir celda a la lista de celdas
-    def add_celda(self, codigo):
+    # Añadir celda a la lista de celdas, o reemplazar el código de la celda celda_id
+    def add_celda(self, codigo, celda_id=None):
+        with self.lock:
+            self._guardar_celda(codigo, celda_id)
+
+    # Añade o modifica varias celdas (pares (codigo, celda_id)) con una sola
+    # adquisición del lock
+    def add_celdas(self, celdas):
         with self.lock:
-            celda_id = len(self.celdas) + 1
-            celda = {'id': celda_id, 'code': codigo,'output':None}
-            self.celdas.append(celda)
-            logging.debug(f"Añadida nueva celda {celda_id}: {codigo}")
+            for codigo, celda_id in celdas:
+                self._guardar_celda(codigo, celda_id)
+
+    # Debe llamarse con self.lock adquirido
+    def _guardar_celda(self, codigo, celda_id):
+        anterior = self.celdas.obtener(celda_id)
+        if anterior is not None:
+            # El código cambia: se invalidan sus resultados. La compilación se
+            # queda en cache_codigo, que se indexa por el código y no por la celda
+            if self.resultados is not None:
+                self.resultados.invalidar_celda(celda_id)
+        celda = self.celdas.guardar(codigo, celda_id)
+        if TRAZA_CELDAS.activo:
+            if anterior is not None:
+                TRAZA_CELDAS.evento('modificada', 'Modificada celda {celda}: {codigo}', celda=celda['id'], codigo=codigo)
+            else:
+                TRAZA_CELDAS.evento('añadida', 'Añadida nueva celda {celda}: {codigo}', celda=celda['id'], codigo=codigo)
     
+    # Contadores de las cachés para ajustar su tamaño (la caché de código de
+    # EjecutorProcesos vive en cada proceso trabajador)
+    def estadisticas_cache(self):
+        return {
+            'codigo': cache_codigo.estadisticas(),
+            'resultados': self.resultados.estadisticas() if self.resultados is not None else None,
+        }
+
     # Manejar eventos de adición y ejecución de celdas
     def manejar_eventos(self, evento):
         try:
             if evento['type'] == 'execute':
                 celda_id = evento['celda_id']
                 with self.lock:
-                    celda = next((c for c in self.celdas if c['id'] == celda_id), None)
+                    celda = self.celdas.obtener(celda_id)
                 if celda:
-                    asyncio.create_task(self.ejecuta_celda(celda))
+                    if self.coalescer and celda_id in self.pendientes:
+                        self.coalescidos += 1
+                    else:
+                        self._lanzar_celda(celda)
+            elif evento['type'] == 'cancel':
+                self.cancelar_celda(evento['celda_id'])
             elif evento['type'] == 'add_cell':
                 code = evento['code']
-                self.add_celda(code)  
+                self.add_celda(code, evento.get('celda_id'))
             else:
                 logging.error(f"Tipo de evento desconocido {evento['type']}")
 
         except Exception as e:
             logging.error(f"Error en manejar el evento {evento['type']}: {e}")
 
+    # Maneja un lote de eventos en orden; los add_cell consecutivos se aplican
+    # juntos con una sola adquisición del lock
+    def manejar_lote(self, eventos):
+        celdas = []
+        for evento in eventos:
+            if evento.get('type') == 'add_cell' and 'code' in evento:
+                celdas.append((evento['code'], evento.get('celda_id')))
+                continue
+            if celdas:
+                self.add_celdas(celdas)
+                celdas = []
+            self.manejar_eventos(evento)
+        if celdas:
+            self.add_celdas(celdas)
+
+    # Crea la tarea de ejecución de una celda y la registra
+    def _lanzar_celda(self, celda):
+        tarea = asyncio.create_task(self.ejecuta_con_dependientes(celda))
+        # Guardamos la tarea para que no sea recolectada y poder esperarla al cerrar
+        self.tareas.add(tarea)
+        self.en_ejecucion.setdefault(celda['id'], set()).add(tarea)
+        self.pendientes[celda['id']] = tarea
+
+        def terminada(tarea, celda_id=celda['id']):
+            self.tareas.discard(tarea)
+            if self.pendientes.get(celda_id) is tarea:
+                del self.pendientes[celda_id]
+            tareas_celda = self.en_ejecucion.get(celda_id)
+            if tareas_celda is not None:
+                tareas_celda.discard(tarea)
+                if not tareas_celda:
+                    del self.en_ejecucion[celda_id]
+
+        tarea.add_done_callback(terminada)
+        return tarea
+
     # Corrutina que se encarga de obtener y manejar eventos de la cola de eventos
+    # hasta que la cola se cierre; al terminar espera las celdas en ejecución
+    # y cierra el motor de ejecución
     async def event_loop(self):
         while True:
-            prioridad, evento = await self.obtener_evento()
-            self.manejar_eventos(evento)
+            try:
+                eventos = await self.obtener_eventos()
+            except ColaCerrada:
+                break
+            self.manejar_lote(eventos)
+        if self.tareas:
+            await asyncio.gather(*self.tareas, return_exceptions=True)
+        await self.ejecutor.cerrar()
     
     # Corrutina que permite obtener el siguiente evento de la cola
     async def obtener_evento(self):
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self.evento_prio.get)
+        return await self.evento_prio.get()
+
+    # Corrutina que espera un evento y devuelve también los que ya estén en la
+    # cola (hasta max_lote), en orden de prioridad
+    async def obtener_eventos(self):
+        prioridad, evento = await self.evento_prio.get()
+        return [evento] + [e for _, e in self.evento_prio.get_varios_nowait(self.max_lote - 1)]
          
     # Añadir eventos a la cola de eventos con prioridad
+    # (lanza asyncio.QueueFull si la cola tiene límite y está llena)
     def add_evento(self, prioridad: int, event):
-        self.evento_prio.put((prioridad, event))
+        self.evento_prio.put_nowait(prioridad, event)
+
+    # Añadir eventos esperando a que haya espacio en la cola (backpressure)
+    async def add_evento_async(self, prioridad: int, event):
+        await self.evento_prio.put(prioridad, event)
+
+    # Añadir un lote de eventos [(prioridad, evento), ...] en una sola llamada
+    def add_eventos(self, eventos):
+        self.evento_prio.put_varios_nowait(eventos)
+
+    # Cierra la cola de eventos; el bucle termina tras procesar los pendientes
+    def cerrar(self):
+        self.evento_prio.cerrar()
 
 # Ejemplo de añadir eventos a cola
 async def main():
@@ -79,12 +757,17 @@ async def main():
     jupy_notebook.add_evento(0,{'type': 'add_cell', 'code': '2/0'})
     jupy_notebook.add_evento(5,{'type': 'execute', 'celda_id': 3})
 
-
+    # Cerramos la cola para que el bucle termine tras procesar los eventos
+    jupy_notebook.cerrar()
     await jupy_notebook.event_loop()
 
 # Inicia el bucle de eventos del jupyter_notebook
 if __name__ == "__main__":
+    # La demo imprime los eventos; con --trazas además los guarda para chrome://tracing
+    trazas.TRAZADOR.configurar(eco=True)
     asyncio.run(main())
+    if '--trazas' in sys.argv:
+        trazas.TRAZADOR.exportar_chrome('trazas-pregunta1.json')
 
 
 
@@ -0,0 +1,302 @@
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+# Pruebas de Pregunta_1.py (python -m pytest desde esta carpeta)
+
+_ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Pregunta_1.py')
+_spec = importlib.util.spec_from_file_location('pregunta_1', _ruta)
+pregunta_1 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pregunta_1)
+
+
+# Una celda que agota su tiempo termina su proceso; la siguiente usa uno nuevo
+def test_ejecutor_procesos_tiempo_agotado():
+    async def prueba():
+        ejecutor = pregunta_1.EjecutorProcesos(1)
+        try:
+            _, salidas = await ejecutor.ejecutar('x = 1 + 1', definidos=['x'])
+            assert salidas == {'x': 2}
+            colgado = ejecutor.libres[0]
+            with pytest.raises(asyncio.TimeoutError):
+                await ejecutor.ejecutar('while True: pass', timeout=0.2)
+            assert not colgado[0].is_alive()
+            assert colgado not in ejecutor.trabajadores
+            _, salidas = await ejecutor.ejecutar('y = 3', definidos=['y'])
+            assert salidas == {'y': 3}
+        finally:
+            await ejecutor.cerrar()
+    asyncio.run(prueba())
+
+
+# Cancelar la tarea de una celda libera el semáforo y descarta el proceso
+def test_ejecutor_procesos_cancelacion():
+    async def prueba():
+        ejecutor = pregunta_1.EjecutorProcesos(1)
+        try:
+            tarea = asyncio.create_task(ejecutor.ejecutar('import time\ntime.sleep(30)'))
+            await asyncio.sleep(0.5)
+            trabajador, = ejecutor.trabajadores
+            tarea.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await tarea
+            assert not trabajador[0].is_alive()
+            _, salidas = await asyncio.wait_for(ejecutor.ejecutar('z = 5', definidos=['z']), 10)
+            assert salidas == {'z': 5}
+        finally:
+            await ejecutor.cerrar()
+    asyncio.run(prueba())
+
+
+# Un resultado más grande que max_bytes no se guarda ni se indexa por celda
+def test_cache_resultados_no_indexa_resultados_descartados():
+    cache = pregunta_1.CacheResultados(max_bytes=100)
+    grande = cache.clave('c1', 'x', {})
+    cache.guardar_resultado(grande, 'a' * 1000, {})
+    assert len(cache) == 0 and cache.por_celda == {}
+    pequena = cache.clave('c1', 'y', {})
+    cache.guardar_resultado(pequena, 1, {})
+    assert cache.por_celda == {'c1': {pequena}}
+    cache.invalidar_celda('c1')
+    assert len(cache) == 0 and cache.por_celda == {}
+
+
+# Sale primero la menor prioridad y, con la misma prioridad, el orden de llegada
+def test_cola_eventos_orden():
+    cola = pregunta_1.ColaEventos()
+    cola.put_nowait(2, 'a')
+    cola.put_nowait(1, 'b')
+    cola.put_varios_nowait([(2, 'c'), (0, 'd'), (1, 'e')])
+    assert [cola.get_nowait() for _ in range(5)] == \
+        [(0, 'd'), (1, 'b'), (1, 'e'), (2, 'a'), (2, 'c')]
+    with pytest.raises(asyncio.QueueEmpty):
+        cola.get_nowait()
+
+
+# Con la cola llena put espera a que un consumidor saque un evento, y un lote
+# que no cabe entero no se añade
+def test_cola_eventos_backpressure():
+    async def prueba():
+        cola = pregunta_1.ColaEventos(maxsize=2)
+        await cola.put(0, 'a')
+        await cola.put(0, 'b')
+        with pytest.raises(asyncio.QueueFull):
+            cola.put_nowait(0, 'c')
+        productor = asyncio.create_task(cola.put(0, 'c'))
+        await asyncio.sleep(0)
+        assert not productor.done() and cola.qsize() == 2
+        assert await cola.get() == (0, 'a')
+        await asyncio.wait_for(productor, 1)
+        assert cola.full()
+        cola.get_nowait()
+        with pytest.raises(asyncio.QueueFull):
+            cola.put_varios_nowait([(0, 'd'), (0, 'e')])
+        assert [e for _, e in cola.get_varios_nowait(5)] == ['c']
+    asyncio.run(prueba())
+
+
+# Tras cerrar, los eventos pendientes se entregan y después se lanza
+# ColaCerrada; los consumidores y productores que esperaban despiertan
+def test_cola_eventos_cerrar():
+    async def prueba():
+        cola = pregunta_1.ColaEventos(maxsize=1)
+        consumidor = asyncio.create_task(cola.get())
+        await asyncio.sleep(0)
+        cola.cerrar()
+        with pytest.raises(pregunta_1.ColaCerrada):
+            await consumidor
+        with pytest.raises(pregunta_1.ColaCerrada):
+            cola.put_nowait(0, 'a')
+
+        cola = pregunta_1.ColaEventos(maxsize=1)
+        cola.put_nowait(0, 'a')
+        productor = asyncio.create_task(cola.put(0, 'b'))
+        await asyncio.sleep(0)
+        cola.cerrar()
+        with pytest.raises(pregunta_1.ColaCerrada):
+            await productor
+        assert await cola.get() == (0, 'a')
+        with pytest.raises(pregunta_1.ColaCerrada):
+            await cola.get()
+    asyncio.run(prueba())
+
+
+# El bucle del notebook procesa los eventos pendientes y termina al cerrar la cola
+def test_notebook_termina_al_cerrar_la_cola():
+    async def prueba():
+        notebook = pregunta_1.Jupyter_Notebook(ejecutor=pregunta_1.EjecutorLocal(0))
+        notebook.add_evento(1, {'type': 'execute', 'celda_id': 1})
+        notebook.add_evento(0, {'type': 'add_cell', 'code': 'x = 7'})
+        notebook.cerrar()
+        await asyncio.wait_for(notebook.event_loop(), 5)
+        return notebook
+    notebook = asyncio.run(prueba())
+    assert notebook.espacio == {'x': 7}
+
+
+# Notebook con EjecutorLocal sin retardo; ejecuta los eventos y cierra
+def ejecutar_notebook(notebook, eventos):
+    async def prueba():
+        for prioridad, evento in eventos:
+            notebook.add_evento(prioridad, evento)
+        notebook.cerrar()
+        await asyncio.wait_for(notebook.event_loop(), 5)
+    asyncio.run(prueba())
+    return notebook
+
+
+def test_dependencias_entre_celdas():
+    celdas = pregunta_1.AlmacenCeldas()
+    celdas.guardar('a = 1')                 # 1
+    celdas.guardar('b = a + 1')             # 2
+    celdas.guardar('c = 10')                # 3
+    celdas.guardar('d = b + c')             # 4
+    celdas.guardar('a = 5')                 # 5
+    celdas.guardar('e = a')                 # 6
+    assert celdas.obtener(2)['lee'] == {'a'}
+    assert celdas.productor('a', 2) == 1
+    assert celdas.productor('a', 6) == 5
+    assert celdas.productor('a', 1) is None
+    # La celda 6 lee la a de la celda 5, no la de la 1
+    assert [c['id'] for c in celdas.dependientes(1)] == [2, 4]
+    assert [c['id'] for c in celdas.dependientes(3)] == [4]
+    assert celdas.dependientes(4) == []
+    # Al cambiar el código cambian sus aristas; la c de la celda 3 llega
+    # después de la celda 2, así que no la provee
+    celdas.guardar('b = c', 2)
+    assert celdas.dependientes(1) == []
+    assert celdas.productor('c', 2) is None
+    assert [c['id'] for c in celdas.dependientes(3)] == [4]
+
+
+# Ejecutar una celda vuelve a ejecutar solo las que dependen de ella
+def test_reejecucion_de_dependientes():
+    notebook = pregunta_1.Jupyter_Notebook(ejecutor=pregunta_1.EjecutorLocal(0))
+    for codigo in ('a = 1', 'b = a * 2', 'c = 100', 'd = b + 1'):
+        notebook.add_celda(codigo)
+    ejecutar_notebook(notebook, [(0, {'type': 'execute', 'celda_id': 1}),
+                                 (1, {'type': 'execute', 'celda_id': 3})])
+    assert notebook.espacio == {'a': 1, 'b': 2, 'c': 100, 'd': 3}
+    notebook.evento_prio = pregunta_1.ColaEventos()
+    notebook.add_celda('a = 5', 1)
+    notebook.espacio['c'] = 'sin cambios'
+    ejecutar_notebook(notebook, [(0, {'type': 'execute', 'celda_id': 1})])
+    assert notebook.espacio == {'a': 5, 'b': 10, 'c': 'sin cambios', 'd': 11}
+
+
+# Si una celda falla no se ejecutan las que dependen de ella
+def test_fallo_no_se_propaga_a_dependientes():
+    notebook = pregunta_1.Jupyter_Notebook(ejecutor=pregunta_1.EjecutorLocal(0))
+    for codigo in ('a = 1', 'b = a / 0', 'c = b + 1', 'e = a + 1'):
+        notebook.add_celda(codigo)
+    ejecutar_notebook(notebook, [(0, {'type': 'execute', 'celda_id': 1})])
+    assert notebook.espacio == {'a': 1, 'e': 2}
+
+
+# Desaloja la entrada usada hace más tiempo al superar entradas o bytes
+def test_cache_lru_desaloja_por_entradas_y_bytes():
+    cache = pregunta_1.CacheLRU(max_entradas=2, max_bytes=10)
+    cache.guardar('a', 1, 4)
+    cache.guardar('b', 2, 4)
+    assert cache.obtener('a') == 1
+    cache.guardar('c', 3, 4)  # 12 bytes: sale b, la menos usada
+    assert cache.obtener('b') is None
+    assert set(cache.entradas) == {'a', 'c'} and cache.bytes == 8
+    cache.guardar('d', 4, 11)  # Mayor que max_bytes: no se guarda
+    assert 'd' not in cache.entradas
+    estadisticas = cache.estadisticas()
+    assert estadisticas['aciertos'] == 1 and estadisticas['fallos'] == 1
+    assert estadisticas['desalojos'] == 1
+
+
+# Compilar dos veces el mismo código usa la caché
+def test_cache_codigo():
+    codigo = 'valor_cache_codigo = 41\nvalor_cache_codigo + 1'
+    aciertos = pregunta_1.cache_codigo.aciertos
+    primero = pregunta_1.compilar_celda(codigo)
+    assert pregunta_1.compilar_celda(codigo) is primero
+    assert pregunta_1.cache_codigo.aciertos == aciertos + 1
+    assert pregunta_1.evaluar_celda(codigo, definidos=['valor_cache_codigo']) == \
+        (42, {'valor_cache_codigo': 41})
+
+
+class EjecutorContador(pregunta_1.EjecutorLocal):
+    def __init__(self):
+        super().__init__(0)
+        self.ejecutadas = []
+
+    async def ejecutar(self, codigo, entradas=None, definidos=(), timeout=None):
+        self.ejecutadas.append(codigo)
+        return await super().ejecutar(codigo, entradas, definidos, timeout)
+
+
+# Una celda pura con las mismas entradas se memoriza; al cambiar su código o
+# sus entradas se vuelve a ejecutar
+def test_memoizacion_de_resultados():
+    ejecutor = EjecutorContador()
+    notebook = pregunta_1.Jupyter_Notebook(ejecutor=ejecutor, memoizar=True)
+    notebook.add_celda('a = 2')
+    notebook.add_celda('b = a ** 10')
+
+    def ejecutar(celda_id):
+        notebook.evento_prio = pregunta_1.ColaEventos()
+        ejecutar_notebook(notebook, [(0, {'type': 'execute', 'celda_id': celda_id})])
+
+    ejecutar(1)
+    ejecutar(2)
+    assert ejecutor.ejecutadas == ['a = 2', 'b = a ** 10']
+    assert notebook.espacio['b'] == 1024
+    notebook.add_celda('b = a ** 3', 2)
+    ejecutar(2)
+    assert notebook.espacio['b'] == 8
+    notebook.add_celda('a = 3', 1)
+    ejecutar(1)
+    assert notebook.espacio['b'] == 27
+    assert ejecutor.ejecutadas == ['a = 2', 'b = a ** 10', 'b = a ** 3', 'a = 3', 'b = a ** 3']
+    assert notebook.estadisticas_cache()['resultados']['aciertos'] == 1
+
+
+# Varios execute de una celda que aún no empezó se unen en una sola ejecución,
+# que usa el código más reciente
+def test_coalescer_ejecuciones_pendientes():
+    ejecutor = EjecutorContador()
+    notebook = pregunta_1.Jupyter_Notebook(ejecutor=ejecutor)
+    notebook.add_celda('x = 1')
+    ejecutar_notebook(notebook, [(0, {'type': 'execute', 'celda_id': 1}),
+                                 (1, {'type': 'execute', 'celda_id': 1}),
+                                 (2, {'type': 'add_cell', 'code': 'x = 2', 'celda_id': 1}),
+                                 (3, {'type': 'execute', 'celda_id': 1})])
+    assert ejecutor.ejecutadas == ['x = 2']
+    assert notebook.coalescidos == 2
+    assert notebook.espacio == {'x': 2}
+
+
+def test_sin_coalescer_ejecuta_cada_evento():
+    ejecutor = EjecutorContador()
+    notebook = pregunta_1.Jupyter_Notebook(ejecutor=ejecutor, coalescer=False)
+    notebook.add_celda('x = 1')
+    ejecutar_notebook(notebook, [(0, {'type': 'execute', 'celda_id': 1}),
+                                 (1, {'type': 'execute', 'celda_id': 1})])
+    assert ejecutor.ejecutadas == ['x = 1', 'x = 1']
+    assert notebook.coalescidos == 0
+
+
+# Un execute que llega cuando la ejecución ya empezó lanza otra ejecución
+def test_no_coalesce_con_ejecucion_empezada():
+    async def prueba():
+        ejecutor = EjecutorContador()
+        ejecutor.retardo = 0.1
+        notebook = pregunta_1.Jupyter_Notebook(ejecutor=ejecutor)
+        notebook.add_celda('x = 1')
+        bucle = asyncio.create_task(notebook.event_loop())
+        notebook.add_evento(0, {'type': 'execute', 'celda_id': 1})
+        await asyncio.sleep(0.05)
+        notebook.add_evento(0, {'type': 'execute', 'celda_id': 1})
+        notebook.cerrar()
+        await asyncio.wait_for(bucle, 5)
+        return ejecutor, notebook
+    ejecutor, notebook = asyncio.run(prueba())
+    assert ejecutor.ejecutadas == ['x = 1', 'x = 1']
+    assert notebook.coalescidos == 0
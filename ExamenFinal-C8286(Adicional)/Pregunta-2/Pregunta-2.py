@@ -1,120 +1,501 @@
+import functools
+import itertools
+import mmap
+import operator
+import os
+import pickle
+import queue
+import struct
+import sys
 import threading
 import time
 import random
-from collections import defaultdict
+import zlib
+from array import array
+from collections import defaultdict, deque
 
-#Algoritmo Chandy-lamport
+# trazas.py está en la carpeta del examen y lo comparten las cuatro preguntas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trazas
 
-class Process:
-    def __init__(self, process_id):
-        self.process_id = process_id
-        self.state = None
-        self.channels = defaultdict(list)
-        self.neighbors = []
-        self.marker_received = {}
-        self.local_snapshot = None
+TRACE_SNAPSHOT = trazas.TRAZADOR.componente('pregunta2.instantaneas')
+TRACE_MUTEX = trazas.TRAZADOR.componente('pregunta2.exclusion')
+
+# NumPy es opcional: si está instalado se usa para las operaciones vectorizadas
+# de los relojes vectoriales
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#Algoritmo Chandy-Lamport concurrente con varias instantáneas
+
+MARKER = 'MARKER'
+MESSAGE = 'MESSAGE'
+_INICIAR = 'INICIAR'
+_ENVIAR = 'ENVIAR'
+_DETENER = 'DETENER'
+
+
+# Estado de una instantánea en un proceso: su estado local y los mensajes
+# registrados en cada canal de entrada que aún no recibió el marcador
+class LocalSnapshot:
+    __slots__ = ('state', 'recording', 'channels')
+
+    def __init__(self, state, recording):
+        self.state = state
+        self.recording = set(recording)
+        self.channels = {sender_id: [] for sender_id in recording}
+
+
+# Recibe las partes locales de cada instantánea y avisa cuando la instantánea
+# global está completa. Con un SnapshotStore las instantáneas completas se
+# guardan en disco en lugar de quedarse en memoria.
+class SnapshotCollector:
+    def __init__(self, num_processes, store=None):
+        self.num_processes = num_processes
+        self.store = store
         self.lock = threading.Lock()
+        self.partial = {}
+        self.completed = {}
+        self.events = defaultdict(threading.Event)
+        self.started_at = {}
+        self.finished_at = {}
+
+    def started(self, snapshot_id):
+        with self.lock:
+            self.started_at.setdefault(snapshot_id, time.perf_counter())
+            return self.events[snapshot_id]
+
+    def report(self, snapshot_id, process_id, local_snapshot):
+        with self.lock:
+            parts = self.partial.setdefault(snapshot_id, {})
+            parts[process_id] = (local_snapshot.state, local_snapshot.channels)
+            if len(parts) == self.num_processes:
+                del self.partial[snapshot_id]
+                if self.store is not None:
+                    self.store.append(snapshot_id, parts)
+                else:
+                    self.completed[snapshot_id] = parts
+                self.finished_at[snapshot_id] = time.perf_counter()
+                self.events[snapshot_id].set()
+
+    # Espera la instantánea global {process_id: (estado, canales)}
+    def wait(self, snapshot_id, timeout=None):
+        if not self.started(snapshot_id).wait(timeout):
+            return None
+        if self.store is not None:
+            return self.store.load(snapshot_id)
+        return self.completed[snapshot_id]
+
+    def duration(self, snapshot_id):
+        return self.finished_at[snapshot_id] - self.started_at[snapshot_id]
+
+
+# Proceso que se ejecuta en su propio hilo. Todos los mensajes le llegan por
+# su buzón (una cola FIFO); como cada vecino envía en orden, cada canal
+# vecino -> proceso es FIFO. Solo el hilo del proceso toca su estado, así que
+# no necesita locks.
+class ConcurrentProcess:
+    def __init__(self, process_id, collector, state=0):
+        self.process_id = process_id
+        self.collector = collector
+        self.state = state
+        self.inbox = queue.SimpleQueue()
+        self.neighbors = []      # canales de salida
+        self.in_neighbors = []   # canales de entrada
+        self.snapshots = {}      # snapshot_id -> LocalSnapshot en curso
+        self.messages_processed = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
 
     def set_neighbors(self, neighbors):
         self.neighbors = neighbors
         for neighbor in neighbors:
-            self.marker_received[neighbor.process_id] = False
+            neighbor.in_neighbors.append(self.process_id)
 
-    # Inicia una instantánea local del proceso
-    def initiate_snapshot(self):
-        with self.lock:
-            self.local_snapshot = self.state
-            print(f"Robot {self.process_id} taking local snapshot: {self.local_snapshot}")
+    def start(self):
+        self.thread.start()
 
-    # Envía mensajes marcadores a los procesos vecinos
-    def send_marker_messages(self):
-        for neighbor in self.neighbors:
-            self.send_message(neighbor, 'MARKER')
+    def run(self):
+        handlers = {
+            MARKER: self.receive_marker,
+            MESSAGE: self.receive_message,
+            _INICIAR: self.take_snapshot,
+            _ENVIAR: self.transfer,
+        }
+        while True:
+            message_type, sender_id, content = self.inbox.get()
+            if message_type == _DETENER:
+                break
+            handlers[message_type](sender_id, content)
 
     def send_message(self, neighbor, message_type, content=None):
-        message = (message_type, self.process_id, content)
-        neighbor.receive_message(message)
+        neighbor.inbox.put((message_type, self.process_id, content))
+
+    # Registra el estado local y envía marcadores por todos los canales de salida
+    def take_snapshot(self, sender_id, snapshot_id):
+        if snapshot_id in self.snapshots:
+            return
+        recording = [p for p in self.in_neighbors if p != sender_id]
+        local_snapshot = LocalSnapshot(self.state, recording)
+        if TRACE_SNAPSHOT.activo:
+            TRACE_SNAPSHOT.evento('instantanea', 'Robot {robot} taking local snapshot {instantanea}: {estado}',
+                                  robot=self.process_id, instantanea=snapshot_id, estado=self.state)
+        for neighbor in self.neighbors:
+            self.send_message(neighbor, MARKER, snapshot_id)
+        if recording:
+            self.snapshots[snapshot_id] = local_snapshot
+        else:
+            self.collector.report(snapshot_id, self.process_id, local_snapshot)
+
+    def receive_marker(self, sender_id, snapshot_id):
+        local_snapshot = self.snapshots.get(snapshot_id)
+        if local_snapshot is None:
+            # Primer marcador de esta instantánea: el canal de origen queda vacío.
+            # Cada canal lleva un solo marcador por instantánea, así que un
+            # marcador desconocido siempre es el primero.
+            self.take_snapshot(sender_id, snapshot_id)
+            return
+        local_snapshot.recording.discard(sender_id)
+        if not local_snapshot.recording:
+            del self.snapshots[snapshot_id]
+            self.collector.report(snapshot_id, self.process_id, local_snapshot)
+
+    def receive_message(self, sender_id, content):
+        # El mensaje pertenece al estado del canal en cada instantánea que
+        # todavía registra ese canal
+        for local_snapshot in self.snapshots.values():
+            if sender_id in local_snapshot.recording:
+                local_snapshot.channels[sender_id].append(content)
+        self.process_message(sender_id, content)
+
+    def process_message(self, sender_id, content):
+        self.state += content
+        self.messages_processed += 1
+
+    # Envía una cantidad del estado local a un vecino
+    def transfer(self, neighbor_index, amount):
+        neighbor = self.neighbors[neighbor_index % len(self.neighbors)]
+        amount = min(amount, self.state)
+        if amount > 0:
+            self.state -= amount
+            self.send_message(neighbor, MESSAGE, amount)
+
+
+# Ejecuta una topología de procesos concurrentes y permite tomar varias
+# instantáneas a la vez, cada una con su identificador
+class SnapshotRuntime:
+    def __init__(self, num_processes, topology=None, initial_state=100, store=None):
+        self.collector = SnapshotCollector(num_processes, store)
+        self.processes = [ConcurrentProcess(i, self.collector, initial_state) for i in range(num_processes)]
+        topology = topology or ring_topology(num_processes)
+        for process_id, neighbor_ids in topology.items():
+            self.processes[process_id].set_neighbors([self.processes[n] for n in neighbor_ids])
+        self.next_snapshot_id = 0
+        self.id_lock = threading.Lock()
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        for process in self.processes:
+            process.inbox.put((_DETENER, None, None))
+        for process in self.processes:
+            process.thread.join()
+
+    def initiate_snapshot(self, process_id=0):
+        with self.id_lock:
+            snapshot_id = self.next_snapshot_id
+            self.next_snapshot_id += 1
+        self.collector.started(snapshot_id)
+        self.processes[process_id].inbox.put((_INICIAR, None, snapshot_id))
+        return snapshot_id
+
+    def transfer(self, process_id, neighbor_index, amount):
+        self.processes[process_id].inbox.put((_ENVIAR, neighbor_index, amount))
+
+    def wait_snapshot(self, snapshot_id, timeout=None):
+        return self.collector.wait(snapshot_id, timeout)
 
-    # Recibe mensajes y procesa marcadores
-    def receive_message(self, message):
-        message_type, sender_id, content = message
+
+# Almacén en disco de instantáneas globales. Cada instantánea se añade al final
+# de un archivo de datos como un registro completo o como un delta respecto a
+# la anterior (solo los procesos cuyo estado o canales cambiaron). Un índice de
+# registros de tamaño fijo permite leer cualquier instantánea a través de mmap
+# decodificando solo los registros desde el último registro completo.
+class SnapshotStore:
+    INDEX_ENTRY = struct.Struct('<QQIB')  # snapshot_id, offset, longitud, tipo
+    FULL = 0
+    DELTA = 1
+
+    def __init__(self, path, keyframe_interval=16, compress=True):
+        self.data_path = path + '.dat'
+        self.index_path = path + '.idx'
+        self.keyframe_interval = keyframe_interval
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.data_file = open(self.data_path, 'ab+')
+        self.index_file = open(self.index_path, 'ab+')
+        self.entries = []    # (snapshot_id, offset, longitud, tipo) en orden de escritura
+        self.positions = {}  # snapshot_id -> posición en entries
+        self._load_index()
+        self._mmap = None
+        self._last_state = None  # última instantánea escrita, base del siguiente delta
+        # Al reabrir, la cadena de deltas sigue desde la última completa del disco
+        self._since_keyframe = 0
+        for entry in reversed(self.entries):
+            if entry[3] == self.FULL:
+                break
+            self._since_keyframe += 1
+        self._cache = None       # (posición, instantánea) de la última lectura
+
+    def _load_index(self):
+        self.index_file.seek(0)
+        data = self.index_file.read()
+        size = self.INDEX_ENTRY.size
+        for offset in range(0, len(data) - len(data) % size, size):
+            entry = self.INDEX_ENTRY.unpack_from(data, offset)
+            self.positions[entry[0]] = len(self.entries)
+            self.entries.append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, snapshot_id):
+        return snapshot_id in self.positions
+
+    def ids(self):
+        return [entry[0] for entry in self.entries]
+
+    def _encode(self, obj):
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        return zlib.compress(data) if self.compress else data
+
+    def _decode(self, data):
+        return pickle.loads(zlib.decompress(data) if self.compress else data)
+
+    def append(self, snapshot_id, global_snapshot):
         with self.lock:
-            if message_type == 'MARKER':
-                if not self.marker_received[sender_id]:
-                    self.marker_received[sender_id] = True
-                    if self.local_snapshot is None:
-                        self.local_snapshot = self.state
-                        print(f"Robot {self.process_id} taking local snapshot: {self.local_snapshot}")
-                        self.send_marker_messages()
-                    else:
-                        self.channels[sender_id].append(content)
-                else:
-                    self.channels[sender_id].append(content)
+            if snapshot_id in self.positions:
+                raise ValueError(f"La instantánea {snapshot_id} ya está guardada")
+            if self._last_state is None and self.entries:
+                self._last_state = self._reconstruct(len(self.entries) - 1)
+            if self._last_state is None or self._since_keyframe >= self.keyframe_interval:
+                kind, payload = self.FULL, global_snapshot
+                self._since_keyframe = 0
             else:
-                if self.local_snapshot is not None:
-                    self.channels[sender_id].append(content)
-                else:
-                    self.process_message(message)
+                changed = {p: v for p, v in global_snapshot.items() if self._last_state.get(p) != v}
+                removed = [p for p in self._last_state if p not in global_snapshot]
+                kind, payload = self.DELTA, (changed, removed)
+                self._since_keyframe += 1
+            data = self._encode(payload)
+            self.data_file.seek(0, os.SEEK_END)
+            offset = self.data_file.tell()
+            self.data_file.write(data)
+            self.data_file.flush()
+            entry = (snapshot_id, offset, len(data), kind)
+            self.index_file.write(self.INDEX_ENTRY.pack(*entry))
+            self.index_file.flush()
+            self.positions[snapshot_id] = len(self.entries)
+            self.entries.append(entry)
+            self._last_state = dict(global_snapshot)
 
-    def process_message(self, message):
-        # Simulate processing of a normal message
-        print(f"Robot {self.process_id} received message from Robot {message[1]}: {message[2]}")
+    # Vuelve a mapear el archivo de datos si creció desde el último mapeo
+    def _view(self, end):
+        if self._mmap is None or len(self._mmap) < end:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
 
-    def update_state(self, new_state):
-        self.state = new_state
+    def _read(self, position):
+        _, offset, length, kind = self.entries[position]
+        return kind, self._decode(self._view(offset + length)[offset:offset + length])
+
+    def _reconstruct(self, position):
+        # Parte de la lectura anterior si está en la misma cadena de deltas
+        start = position
+        while self.entries[start][3] != self.FULL:
+            if self._cache is not None and self._cache[0] == start:
+                break
+            start -= 1
+        if self.entries[start][3] == self.FULL:
+            state = self._read(start)[1]
+        else:
+            state = dict(self._cache[1])
+        for current in range(start + 1, position + 1):
+            changed, removed = self._read(current)[1]
+            state.update(changed)
+            for process_id in removed:
+                state.pop(process_id, None)
+        self._cache = (position, state)
+        return dict(state)
 
+    # Carga una instantánea global por su identificador
+    def load(self, snapshot_id):
+        with self.lock:
+            position = self.positions.get(snapshot_id)
+            if position is None:
+                raise KeyError(snapshot_id)
+            return self._reconstruct(position)
+
+    def size_bytes(self):
+        return os.path.getsize(self.data_path) + os.path.getsize(self.index_path)
+
+    def close(self):
+        with self.lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self.data_file.close()
+            self.index_file.close()
 
-#Algoritmo de Raymond
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc):
+        self.close()
 
-class RaymondMutex:
-    def __init__(self, node_id, parent=None):
+
+# Anillo bidireccional con cuerdas aleatorias: grado constante, así el número
+# de canales crece linealmente con el número de procesos
+def ring_topology(num_processes, chords=1, seed=0):
+    rng = random.Random(seed)
+    topology = {i: {(i - 1) % num_processes, (i + 1) % num_processes} for i in range(num_processes)}
+    for i in range(num_processes):
+        for _ in range(chords):
+            j = rng.randrange(num_processes)
+            if j != i:
+                topology[i].add(j)
+                topology[j].add(i)
+    return {i: sorted(n for n in neighbors if n != i) for i, neighbors in topology.items()}
+
+
+#Algoritmo de Raymond basado en mensajes
+
+REQUEST = 'REQUEST'
+PRIVILEGE = 'PRIVILEGE'
+RELEASE = 'RELEASE'
+
+
+# Nodo del árbol de Raymond: holder apunta al vecino en dirección al token
+# (o a sí mismo si lo tiene) y request_queue guarda los vecinos (o el propio
+# nodo) que pidieron el token, en orden
+class RaymondNode:
+    __slots__ = ('node_id', 'holder', 'request_queue', 'using', 'asked', 'tree', 'cs_entries')
+
+    def __init__(self, node_id, holder, tree):
         self.node_id = node_id
-        self.parent = parent
-        self.token_holder = (parent is None)
-        self.request_queue = []
+        self.holder = holder
+        self.request_queue = deque()
+        self.using = False
+        self.asked = False
+        self.tree = tree
+        self.cs_entries = 0
 
     def request_access(self):
-        # Solicita acceso al recurso crítico
-        if self.token_holder:
-            self.enter_critical_section()
-        else:
-            self.request_queue.append(self.node_id)
-            self.send_request_to_parent()
-
-    def send_request_to_parent(self):
-        if self.parent:
-            self.parent.receive_request(self)
-
-    def receive_request(self, requester):
-        # Recibe solicitudes y maneja el envío del token
-        if not self.token_holder:
-            self.request_queue.append(requester.node_id)
-            self.send_request_to_parent()
-        elif requester.node_id == self.node_id:
-            self.enter_critical_section()
-        else:
-            self.send_token(requester)
+        self.request_queue.append(self.node_id)
+        self.assign_privilege()
+        self.make_request()
 
-    def send_token(self, requester):
-        self.token_holder = False
-        requester.receive_token(self)
+    def receive_request(self, sender_id):
+        self.request_queue.append(sender_id)
+        self.assign_privilege()
+        self.make_request()
 
-    def send_token_to_next_in_queue(self):
-        next_node_id = self.request_queue.pop(0)
-        next_node = [node for node in nodes if node.node_id == next_node_id][0]
-        self.send_token(next_node)
-
-    def enter_critical_section(self):
-        # Entra a la sección crítica
-        print(f"El Robot {self.node_id} ingresando a la seccion critica")
-        self.leave_critical_section()
+    def receive_token(self, sender_id):
+        self.holder = self.node_id
+        self.assign_privilege()
+        self.make_request()
 
     def leave_critical_section(self):
-         # Sale de la sección crítica y pasa el token si es necesario
-        print(f"El Robot {self.node_id} dejando critical section")
-        if self.request_queue:
-            self.send_token_to_next_in_queue()
+        self.using = False
+        self.tree.leave(self)
+        self.assign_privilege()
+        self.make_request()
+
+    # Si tiene el token y no lo usa, se lo da al primero de la cola
+    def assign_privilege(self):
+        if self.holder == self.node_id and not self.using and self.request_queue:
+            self.holder = self.request_queue.popleft()
+            self.asked = False
+            if self.holder == self.node_id:
+                self.using = True
+                self.cs_entries += 1
+                self.tree.enter(self)
+            else:
+                self.tree.send(self.holder, PRIVILEGE, self.node_id)
+
+    # Pide el token al vecino que lo tiene (una sola vez por turno)
+    def make_request(self):
+        if self.holder != self.node_id and self.request_queue and not self.asked:
+            self.asked = True
+            self.tree.send(self.holder, REQUEST, self.node_id)
+
+
+# Árbol de nodos de Raymond con registro por id y entrega de mensajes por una
+# cola FIFO: los mensajes se procesan en un bucle, sin llamadas recursivas,
+# así que la profundidad del árbol no está limitada por la pila
+class RaymondTree:
+    def __init__(self, parents, cs_duration=1):
+        # parents: {node_id: parent_id}, la raíz tiene parent_id None y empieza con el token
+        self.nodes = {node_id: RaymondNode(node_id, node_id if parent is None else parent, self)
+                      for node_id, parent in parents.items()}
+        self.messages = deque()
+        # Número de mensajes que se entregan antes de que el nodo salga de la sección crítica
+        self.cs_duration = cs_duration
+        self.in_cs = None
+        self.cs_entries = 0
+        self.messages_sent = 0
+
+    def send(self, recipient_id, message_type, sender_id):
+        self.messages.append((recipient_id, message_type, sender_id))
+        self.messages_sent += 1
+
+    def enter(self, node):
+        if self.in_cs is not None:
+            raise RuntimeError(f"Nodos {self.in_cs} y {node.node_id} en la sección crítica a la vez")
+        self.in_cs = node.node_id
+        self.cs_entries += 1
+        if TRACE_MUTEX.activo:
+            TRACE_MUTEX.evento('entrada', 'El Robot {robot} ingresando a la seccion critica', robot=node.node_id)
+        # La salida de la sección crítica también es un mensaje, así otros
+        # pedidos pueden llegar mientras el nodo la usa
+        self.messages.append((node.node_id, RELEASE, self.cs_duration))
+
+    def leave(self, node):
+        self.in_cs = None
+        if TRACE_MUTEX.activo:
+            TRACE_MUTEX.evento('salida', 'El Robot {robot} dejando critical section', robot=node.node_id)
+
+    def request_access(self, node_id):
+        self.nodes[node_id].request_access()
+
+    # Entrega mensajes hasta que no quede ninguno (o hasta max_messages)
+    def run(self, max_messages=None):
+        delivered = 0
+        nodes = self.nodes
+        messages = self.messages
+        while messages and (max_messages is None or delivered < max_messages):
+            recipient_id, message_type, content = messages.popleft()
+            node = nodes[recipient_id]
+            if message_type == REQUEST:
+                node.receive_request(content)
+            elif message_type == PRIVILEGE:
+                node.receive_token(content)
+            elif content > 1:
+                # Todavía no termina su sección crítica
+                messages.append((recipient_id, RELEASE, content - 1))
+            else:
+                node.leave_critical_section()
+            delivered += 1
+        return delivered
+
+
+# Árbol k-ario con la raíz en el nodo 0: {node_id: parent_id}
+def kary_tree(num_nodes, arity=2):
+    return {i: None if i == 0 else (i - 1) // arity for i in range(num_nodes)}
 
 
 #Relojes Vectoriales
@@ -139,92 +520,561 @@ class VectorClock:
         self.clock[self.node_id] += 1
 
 
+#Difusión con orden causal
+
+# Difusión causal (Birman-Schiper-Stephenson) sobre VectorClock. En
+# self.clock.clock[k] se lleva cuántas difusiones de k se entregaron (la
+# entrada propia cuenta las difusiones propias). Un mensaje de j con vector V
+# se puede entregar cuando V[j] es el siguiente número de secuencia de j y
+# V[k] <= entregados[k] para los demás k; si no, queda en el buffer.
+# Los pendientes se indexan por (emisor, secuencia) y cada pendiente cuenta
+# cuántas dependencias le faltan y se apunta en waiting[(k, valor)]: al
+# entregar el mensaje (k, valor) solo se revisan los que esperaban por él,
+# sin recorrer el buffer.
+class CausalBroadcast:
+    def __init__(self, num_nodes, node_id, on_deliver=None, now=time.perf_counter):
+        self.clock = VectorClock(num_nodes, node_id)
+        self.node_id = node_id
+        self.on_deliver = on_deliver  # on_deliver(sender_id, payload)
+        self.now = now
+        self.pending = {}  # (emisor, secuencia) -> [dependencias que faltan, vector, payload, llegada]
+        self.waiting = defaultdict(list)  # (k, valor) -> pendientes que esperan entregados[k] == valor
+        # Métricas
+        self.delivered = 0
+        self.buffered = 0
+        self.duplicates = 0
+        self.max_pending = 0
+        self.occupancy_sum = 0  # Suma del tamaño del buffer en cada llegada
+        self.arrivals = 0
+        self.delays = []  # Tiempo en el buffer de los mensajes que llegaron antes de tiempo
+
+    # Difunde payload: devuelve (emisor, vector, payload) para enviar a los
+    # demás nodos y lo entrega localmente
+    def broadcast(self, payload):
+        vector = self.clock.send_event()
+        self.delivered += 1
+        if self.on_deliver is not None:
+            self.on_deliver(self.node_id, payload)
+        return self.node_id, vector, payload
+
+    def receive(self, sender_id, vector, payload):
+        delivered = self.clock.clock
+        sequence = vector[sender_id]
+        self.arrivals += 1
+        self.occupancy_sum += len(self.pending)
+        if sequence <= delivered[sender_id] or (sender_id, sequence) in self.pending:
+            self.duplicates += 1
+            return
+        key = (sender_id, sequence)
+        missing = 0
+        if sequence != delivered[sender_id] + 1:
+            self.waiting[(sender_id, sequence - 1)].append(key)
+            missing += 1
+        for k, value in enumerate(vector):
+            if k != sender_id and value > delivered[k]:
+                self.waiting[(k, value)].append(key)
+                missing += 1
+        if missing == 0:
+            self.deliver(sender_id, sequence, payload)
+            return
+        self.pending[key] = [missing, vector, payload, self.now()]
+        self.buffered += 1
+        self.max_pending = max(self.max_pending, len(self.pending))
+
+    # Entrega el mensaje y después, con una pila explícita, los pendientes que
+    # quedan sin dependencias
+    def deliver(self, sender_id, sequence, payload):
+        ready = [(sender_id, sequence, payload)]
+        while ready:
+            sender_id, sequence, payload = ready.pop()
+            self.clock.clock[sender_id] = sequence
+            self.delivered += 1
+            if self.on_deliver is not None:
+                self.on_deliver(sender_id, payload)
+            for key in self.waiting.pop((sender_id, sequence), ()):
+                entry = self.pending[key]
+                entry[0] -= 1
+                if entry[0] == 0:
+                    del self.pending[key]
+                    self.delays.append(self.now() - entry[3])
+                    ready.append((key[0], key[1], entry[2]))
+
+    def stats(self):
+        delays = sorted(self.delays)
+        return {
+            'delivered': self.delivered,
+            'buffered': self.buffered,
+            'duplicates': self.duplicates,
+            'pending': len(self.pending),
+            'max_pending': self.max_pending,
+            'mean_pending': self.occupancy_sum / self.arrivals if self.arrivals else 0.0,
+            'mean_delay': sum(delays) / len(delays) if delays else 0.0,
+            'p99_delay': delays[min(len(delays) - 1, int(0.99 * len(delays)))] if delays else 0.0,
+            'max_delay': delays[-1] if delays else 0.0,
+        }
+
+
+# Grupo de nodos con difusión causal sobre una red simulada que entrega los
+# mensajes en vuelo en orden aleatorio (reorder=1.0) o FIFO (reorder=0.0)
+class CausalGroup:
+    def __init__(self, num_nodes, reorder=1.0, seed=None, on_deliver=None):
+        self.nodes = [CausalBroadcast(num_nodes, i,
+                                      None if on_deliver is None else functools.partial(on_deliver, i))
+                      for i in range(num_nodes)]
+        self.reorder = reorder
+        self.rng = random.Random(seed)
+        self.in_flight = deque()  # (destino, emisor, vector, payload)
+        self.messages_sent = 0
+
+    def broadcast(self, node_id, payload):
+        sender_id, vector, payload = self.nodes[node_id].broadcast(payload)
+        for recipient_id in range(len(self.nodes)):
+            if recipient_id != node_id:
+                self.in_flight.append((recipient_id, sender_id, vector, payload))
+                self.messages_sent += 1
+
+    # Entrega hasta max_messages mensajes en vuelo (todos por defecto);
+    # devuelve cuántos entregó la red
+    def run(self, max_messages=None):
+        delivered = 0
+        while self.in_flight and (max_messages is None or delivered < max_messages):
+            if self.reorder and self.rng.random() < self.reorder:
+                # Saca un mensaje al azar intercambiándolo con el último
+                i = self.rng.randrange(len(self.in_flight))
+                self.in_flight[i], self.in_flight[-1] = self.in_flight[-1], self.in_flight[i]
+                recipient_id, sender_id, vector, payload = self.in_flight.pop()
+            else:
+                recipient_id, sender_id, vector, payload = self.in_flight.popleft()
+            self.nodes[recipient_id].receive(sender_id, vector, payload)
+            delivered += 1
+        return delivered
+
+
+#Relojes vectoriales compactos
+
+# Resultados de comparar dos marcas de tiempo a y b
+BEFORE = -1     # a ocurrió antes que b
+CONCURRENT = 0  # a y b son concurrentes
+AFTER = 1       # b ocurrió antes que a
+EQUAL = 2
+
+
+def _clock_storage(values):
+    if np is not None:
+        return np.array(values, dtype=np.uint64)
+    return array('Q', values)
+
+
+# Reloj vectorial guardado en un arreglo de enteros de 64 bits (NumPy si está
+# disponible, si no array('Q')), con merge vectorizado. Con sparse=True lleva
+# la última actualización de cada entrada y el último envío a cada destino
+# (técnica de Singhal-Kshemkalyani), así send_event(destino) solo envía las
+# entradas que cambiaron desde el último envío a ese destino. Esto requiere
+# canales FIFO.
+class CompactVectorClock:
+    def __init__(self, num_nodes, node_id, sparse=False):
+        self.num_nodes = num_nodes
+        self.node_id = node_id
+        self.clock = _clock_storage([0] * num_nodes)
+        self.sparse = sparse
+        if sparse:
+            self.last_update = _clock_storage([0] * num_nodes)
+            self.last_sent = _clock_storage([0] * num_nodes)
+
+    def tick(self):
+        self.clock[self.node_id] += 1
+        if self.sparse:
+            self.last_update[self.node_id] = self.clock[self.node_id]
+
+    # Devuelve una copia completa del reloj o, con sparse y un destino, el
+    # delta (índices, valores) de las entradas que cambiaron desde el último
+    # envío a ese destino
+    def send_event(self, recipient_id=None):
+        self.tick()
+        if recipient_id is None or not self.sparse:
+            return self.clock.copy() if np is not None else array('Q', self.clock)
+        since = self.last_sent[recipient_id]
+        self.last_sent[recipient_id] = self.clock[self.node_id]
+        if np is not None:
+            indices = np.flatnonzero(self.last_update > since)
+            return indices, self.clock[indices]
+        indices = array('I', (i for i, t in enumerate(self.last_update) if t > since))
+        return indices, array('Q', (self.clock[i] for i in indices))
+
+    # Recibe un reloj completo o un delta (índices, valores) y actualiza el reloj
+    def receive_event(self, received):
+        if isinstance(received, tuple):
+            self._merge_delta(*received)
+        else:
+            self._merge_full(received)
+
+    def _merge_full(self, received):
+        if np is not None:
+            received = np.asarray(received, dtype=np.uint64)
+            changed = np.flatnonzero(received > self.clock) if self.sparse else None
+            np.maximum(self.clock, received, out=self.clock)
+        else:
+            changed = [i for i, (a, b) in enumerate(zip(self.clock, received)) if b > a] if self.sparse else None
+            self.clock = array('Q', map(max, self.clock, received))
+        self._after_merge(changed)
+
+    def _merge_delta(self, indices, values):
+        if np is not None:
+            indices = np.asarray(indices, dtype=np.intp)
+            values = np.asarray(values, dtype=np.uint64)
+            mask = values > self.clock[indices]
+            changed = indices[mask]
+            self.clock[changed] = values[mask]
+        else:
+            changed = []
+            for i, value in zip(indices, values):
+                if value > self.clock[i]:
+                    self.clock[i] = value
+                    changed.append(i)
+        self._after_merge(changed)
+
+    def _after_merge(self, changed):
+        self.tick()
+        if self.sparse and len(changed):
+            if np is not None:
+                self.last_update[changed] = self.clock[self.node_id]
+            else:
+                for i in changed:
+                    self.last_update[i] = self.clock[self.node_id]
+
+    def to_list(self):
+        return [int(v) for v in self.clock]
+
+
+# Compara dos marcas de tiempo
+def compare_clocks(a, b):
+    le = all(map(operator.le, a, b))
+    ge = all(map(operator.ge, a, b))
+    if le and ge:
+        return EQUAL
+    if le:
+        return BEFORE
+    if ge:
+        return AFTER
+    return CONCURRENT
+
+
+# Compara por pares dos lotes de marcas de tiempo registradas (A[k] con B[k])
+# y devuelve un array('b') con BEFORE, AFTER, CONCURRENT o EQUAL para cada par.
+# Con NumPy la comparación se hace sobre matrices completas.
+def compare_clocks_batch(a_batch, b_batch):
+    if np is None:
+        return array('b', map(compare_clocks, a_batch, b_batch))
+    a = np.asarray(a_batch, dtype=np.uint64)
+    b = np.asarray(b_batch, dtype=np.uint64)
+    le = (a <= b).all(axis=1)
+    ge = (a >= b).all(axis=1)
+    result = np.full(len(a), CONCURRENT, dtype=np.int8)
+    result[le] = BEFORE
+    result[ge] = AFTER
+    result[le & ge] = EQUAL
+    return array('b', result.tobytes())
+
+
+# a_batch[k] ocurrió antes que b_batch[k]
+def happened_before_batch(a_batch, b_batch):
+    return [r == BEFORE for r in compare_clocks_batch(a_batch, b_batch)]
+
+
+# a_batch[k] y b_batch[k] son concurrentes
+def concurrent_batch(a_batch, b_batch):
+    return [r == CONCURRENT for r in compare_clocks_batch(a_batch, b_batch)]
+
+
+#Recolector de basura generacional con arenas de tamaño fijo
+
+# Heap generacional simulado. Cada objeto tiene un valor y una lista de
+# referencias (direcciones de otros objetos). Las direcciones menores que
+# young_size son del espacio joven y las demás de la arena vieja
+# (young_size + índice).
+# - Generación joven: dos semiespacios preasignados; la recolección menor
+#   copia (Cheney) los objetos alcanzables desde las raíces y el conjunto
+#   recordado, y promueve a la arena vieja los que sobreviven promotion_age
+#   recolecciones.
+# - Generación vieja: arena preasignada con lista de huecos libres; la
+#   recolección mayor marca desde las raíces y libera los objetos no marcados.
+# - Conjunto recordado: objetos viejos con referencias a objetos jóvenes,
+#   mantenido por la barrera de escritura de set_ref.
+class GenerationalHeap:
+    def __init__(self, young_size, old_size, promotion_age=2, major_threshold=0.9):
+        self.young_size = young_size
+        self.old_size = old_size
+        self.promotion_age = promotion_age
+        self.major_threshold = major_threshold
+        self.young_objs = [None] * young_size
+        self.young_refs = [None] * young_size
+        self.young_age = bytearray(young_size)
+        self.to_objs = [None] * young_size
+        self.to_refs = [None] * young_size
+        self.to_age = bytearray(young_size)
+        self.young_ptr = 0
+        self.old_objs = [None] * old_size
+        self.old_refs = [None] * old_size
+        self.old_live = bytearray(old_size)
+        self.old_free = list(range(old_size - 1, -1, -1))
+        self.remembered = set()
+        self.roots = {}
+        self.next_root = 0
+        # Estadísticas
+        self.created_at = time.perf_counter()
+        self.allocations = 0
+        self.promoted = 0
+        self.freed_old = 0
+        self.minor_pauses = []
+        self.major_pauses = []
+
+    def is_young(self, addr):
+        return addr < self.young_size
 
+    def get(self, addr):
+        if addr < self.young_size:
+            return self.young_objs[addr]
+        return self.old_objs[addr - self.young_size]
 
-#Recolerctor_Basura geracional
+    def get_refs(self, addr):
+        if addr < self.young_size:
+            return self.young_refs[addr]
+        return self.old_refs[addr - self.young_size]
 
-class GenerationalCollector:
-    def __init__(self, size):
-        # Inicializa el colector generacional con dos generaciones: joven y vieja
-        self.size = size
-        self.young_gen = [None] * size  
-        self.old_gen = [None] * size    
-        self.young_ptr = 0  
-        self.old_ptr = 0    
+    # Barrera de escritura: registra las referencias de objetos viejos a jóvenes
+    def set_ref(self, addr, index, target):
+        refs = self.get_refs(addr)
+        refs[index] = target
+        if addr >= self.young_size and target < self.young_size:
+            self.remembered.add(addr - self.young_size)
 
-    def allocate(self, obj, old=False):
-        # Asigna un objeto en la generación especificada (joven por defecto)
+    # Las raíces se identifican por un handle porque los objetos jóvenes se
+    # mueven; root(handle) devuelve la dirección actual
+    def add_root(self, addr):
+        handle = self.next_root
+        self.next_root += 1
+        self.roots[handle] = addr
+        return handle
+
+    def root(self, handle):
+        return self.roots[handle]
+
+    def remove_root(self, handle):
+        del self.roots[handle]
+
+    def allocate(self, obj, refs=(), old=False):
+        refs = list(refs)
         if old:
-            # Asignación en la generación vieja
-            if self.old_ptr >= self.size:
-                # Si la generación vieja está llena, recolectar basura
-                self.collect_old()
-            addr = self.old_ptr
-            self.old_gen[addr] = obj
-            self.old_ptr += 1
+            if not self.old_free:
+                refs = self._collect_keeping(refs, self.collect_old)
+                if not self.old_free:
+                    raise MemoryError("La generación vieja está llena")
+            index = self.old_free.pop()
+            self.old_objs[index] = obj
+            self.old_refs[index] = refs
+            self.old_live[index] = 1
+            if any(r < self.young_size for r in refs):
+                self.remembered.add(index)
+            addr = self.young_size + index
         else:
-            # Asignación en la generación joven
-            if self.young_ptr >= self.size:
-                # Si la generación joven está llena, recolectar basura
-                self.collect_young()
+            if self.young_ptr >= self.young_size:
+                refs = self._collect_keeping(refs, self.collect_young)
+                if self.young_ptr >= self.young_size:
+                    # Todos los objetos jóvenes sobrevivieron: se promueven sin
+                    # importar su edad tras liberar espacio en la arena vieja
+                    refs = self._collect_keeping(refs, lambda: self.collect_old(promote_all=True))
+                    if self.young_ptr >= self.young_size:
+                        raise MemoryError("La generación joven está llena")
             addr = self.young_ptr
-            self.young_gen[addr] = obj
+            self.young_objs[addr] = obj
+            self.young_refs[addr] = refs
+            self.young_age[addr] = 0
             self.young_ptr += 1
+        self.allocations += 1
         return addr
 
+    # Recolecta tratando las referencias del objeto que se está asignando
+    # como raíces temporales, y devuelve sus direcciones actualizadas
+    def _collect_keeping(self, refs, collect):
+        handles = [self.add_root(r) for r in refs]
+        collect()
+        refs = [self.roots.pop(h) for h in handles]
+        return refs
 
-    def collect_young(self):
-        self.old_gen = self.old_gen + [obj for obj in self.young_gen if obj is not None]
+    # Recolección menor: copia los objetos jóvenes alcanzables al otro
+    # semiespacio o los promueve a la arena vieja
+    def collect_young(self, promote_all=False, allow_major=True):
+        start = time.perf_counter()
+        promotion_age = 0 if promote_all else self.promotion_age
+        young_size = self.young_size
+        young_objs, young_refs, young_age = self.young_objs, self.young_refs, self.young_age
+        to_objs, to_refs, to_age = self.to_objs, self.to_refs, self.to_age
+        old_objs, old_refs, old_live, old_free = self.old_objs, self.old_refs, self.old_live, self.old_free
+        forward = {}
+        promoted = []
+        to_ptr = 0
 
-        # Reinicia la generación joven
-        self.young_gen = [None] * self.size
-        self.young_ptr = 0
+        def copy(addr):
+            nonlocal to_ptr
+            new = forward.get(addr)
+            if new is not None:
+                return new
+            age = young_age[addr] + 1
+            if age >= promotion_age and old_free:
+                index = old_free.pop()
+                old_objs[index] = young_objs[addr]
+                old_refs[index] = young_refs[addr]
+                old_live[index] = 1
+                promoted.append(index)
+                new = young_size + index
+            else:
+                # Sin espacio en la arena vieja el objeto sigue en la generación joven
+                new = to_ptr
+                to_objs[new] = young_objs[addr]
+                to_refs[new] = young_refs[addr]
+                to_age[new] = min(age, 255)
+                to_ptr += 1
+            forward[addr] = new
+            return new
 
-    def collect_old(self):
-        # Recolección de basura en la generación vieja
-        self.old_gen = [obj for obj in self.old_gen if obj is not None]
-        self.old_ptr = len(self.old_gen)
-        # Ajusta el tamaño de la generación vieja al tamaño original
-        self.old_gen += [None] * (self.size - self.old_ptr)
+        def update(refs):
+            if refs:
+                for i, r in enumerate(refs):
+                    if r < young_size:
+                        refs[i] = copy(r)
+
+        for handle, addr in self.roots.items():
+            if addr < young_size:
+                self.roots[handle] = copy(addr)
+        for index in self.remembered:
+            update(old_refs[index])
+        # Recorrido en anchura de lo copiado y lo promovido
+        scan = 0
+        scan_promoted = 0
+        while scan < to_ptr or scan_promoted < len(promoted):
+            if scan < to_ptr:
+                update(to_refs[scan])
+                scan += 1
+            else:
+                update(old_refs[promoted[scan_promoted]])
+                scan_promoted += 1
+
+        self.remembered = {index for index in itertools.chain(self.remembered, promoted)
+                           if old_live[index] and any(r < young_size for r in old_refs[index] or ())}
+        for addr in range(self.young_ptr):
+            young_objs[addr] = None
+            young_refs[addr] = None
+        self.young_objs, self.to_objs = to_objs, young_objs
+        self.young_refs, self.to_refs = to_refs, young_refs
+        self.young_age, self.to_age = to_age, young_age
+        self.young_ptr = to_ptr
+        self.promoted += len(promoted)
+        self.minor_pauses.append(time.perf_counter() - start)
+        # Si la arena vieja supera major_threshold se hace una recolección mayor
+        if allow_major and len(old_free) < (1 - self.major_threshold) * self.old_size:
+            self.collect_old(minor_first=False)
+
+    # Recolección mayor: marca desde las raíces en ambas generaciones y libera
+    # los objetos viejos no alcanzables
+    def collect_old(self, minor_first=True, promote_all=False):
+        if minor_first:
+            self.collect_young(allow_major=False)
+        start = time.perf_counter()
+        young_size = self.young_size
+        marked_old = bytearray(self.old_size)
+        marked_young = bytearray(young_size)
+        stack = list(self.roots.values())
+        while stack:
+            addr = stack.pop()
+            if addr < young_size:
+                if marked_young[addr]:
+                    continue
+                marked_young[addr] = 1
+                refs = self.young_refs[addr]
+            else:
+                index = addr - young_size
+                if marked_old[index]:
+                    continue
+                marked_old[index] = 1
+                refs = self.old_refs[index]
+            if refs:
+                stack.extend(refs)
+        freed = 0
+        for index in range(self.old_size):
+            if self.old_live[index] and not marked_old[index]:
+                self.old_live[index] = 0
+                self.old_objs[index] = None
+                self.old_refs[index] = None
+                self.old_free.append(index)
+                freed += 1
+        self.remembered = {index for index in self.remembered if marked_old[index]}
+        self.freed_old += freed
+        self.major_pauses.append(time.perf_counter() - start)
+        if promote_all:
+            self.collect_young(promote_all=True, allow_major=False)
+
+    def old_used(self):
+        return self.old_size - len(self.old_free)
+
+    # Estadísticas de pausas (en ms) y de asignación
+    def stats(self):
+        def summary(pauses):
+            if not pauses:
+                return {'count': 0, 'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+            ordered = sorted(pauses)
+            return {
+                'count': len(pauses),
+                'mean_ms': sum(pauses) / len(pauses) * 1000,
+                'p99_ms': ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+
+        elapsed = time.perf_counter() - self.created_at
+        return {
+            'allocations': self.allocations,
+            'allocation_rate': self.allocations / elapsed if elapsed else 0.0,
+            'promoted': self.promoted,
+            'freed_old': self.freed_old,
+            'young_used': self.young_ptr,
+            'old_used': self.old_used(),
+            'minor': summary(self.minor_pauses),
+            'major': summary(self.major_pauses),
+        }
 
 
 #Sistema de coordinación de tareas en una red de robots industriales
 if __name__=='__main__':
+    # La demo imprime los eventos; con --trazas además los guarda para chrome://tracing
+    trazas.TRAZADOR.configurar(eco=True)
 
     #Instantáneas del estado global de los robots durante la ejecución de n tareas
-    #En este caso 3 tareas
-    processes = [Process(i) for i in range(3)]
-    for i, process in enumerate(processes):
-        neighbors = [p for j, p in enumerate(processes) if i != j]
-        process.set_neighbors(neighbors)
-
-    
-    processes[0].update_state("State A")
-    processes[1].update_state("State B")
-    processes[2].update_state("State C")
+    #En este caso 3 tareas: cada robot empieza con 100 unidades y se las
+    #transfiere a los demás mientras se toma la instantánea
+    runtime = SnapshotRuntime(3, topology={i: [j for j in range(3) if j != i] for i in range(3)})
+    runtime.start()
+    runtime.transfer(1, 0, 10)
     # Ejecución de toma de instantáneas
-    processes[0].initiate_snapshot()
-
-    time.sleep(1)
-    processes[1].send_message(processes[0], 'MESSAGE', "Message 1 from R1 to R0")
-    time.sleep(1)
-    processes[2].send_message(processes[0], 'MESSAGE', "Message 2 from R2 to R0")
-    time.sleep(1)
-    processes[2].send_message(processes[1], 'MESSAGE', "Message 3 from R2 to R1")
-    
+    snapshot_id = runtime.initiate_snapshot(0)
+    runtime.transfer(2, 0, 20)
+    runtime.transfer(2, 1, 30)
+    estado_global = runtime.wait_snapshot(snapshot_id, timeout=5)
+    runtime.stop()
+    for robot, (estado, canales) in sorted(estado_global.items()):
+        print(f"Robot {robot}: estado {estado}, canales {canales}")
+    total = sum(estado + sum(map(sum, canales.values())) for estado, canales in estado_global.values())
+    print(f"Total de la instantánea: {total}")
+
 
     #Cordinación de recursos compartidos
-    nodes = [RaymondMutex(i) for i in range(3)]
-    nodes[0].parent = nodes[1]
-    nodes[1].parent = nodes[2]
+    # Cadena 0 -> 1 -> 2: el robot 2 es la raíz y empieza con el token
+    arbol = RaymondTree({0: 1, 1: 2, 2: None})
 
     # Simular que robot 0 quiere ingresar a la secciòn critica
-    nodes[0].request_access()
-    time.sleep(2)
-    nodes[0].leave_critical_section()
+    arbol.request_access(0)
+    arbol.run()
         
     #Actualiza cada robot para mantener y utlizar relojes en la comunicación
-    num_nodes = len(nodes)
+    num_nodes = len(arbol.nodes)
     node1 = VectorClock(num_nodes, 0)
     node2 = VectorClock(num_nodes, 1)
     node3 = VectorClock(num_nodes, 2)
@@ -245,8 +1095,13 @@ if __name__=='__main__':
     
     #Gestión eficiente de la memoria en los nodos de control de los robots.
     # Ejecución de recolector de basura generacional
-    collector = GenerationalCollector(10)
-    addr1 = collector.allocate("obj1")
+    heap = GenerationalHeap(10, 40)
+    addr1 = heap.allocate("obj1")
+    raiz = heap.add_root(addr1)
     print(f"Asignado en el obj1: {addr1}")
-    collector.collect_young()
-    print("Se completa la recoleccion de basura de la generacion joven")
\ No newline at end of file
+    heap.allocate("basura")
+    heap.collect_young()
+    print("Se completa la recoleccion de basura de la generacion joven")
+    print(f"obj1 sobrevive en {heap.root(raiz)}: {heap.get(heap.root(raiz))}, objetos jóvenes vivos: {heap.stats()['young_used']}")
+    if '--trazas' in sys.argv:
+        trazas.TRAZADOR.exportar_chrome('trazas-pregunta2.json')
@@ -0,0 +1,271 @@
+import importlib.util
+import os
+import random
+from collections import defaultdict
+
+import pytest
+
+# Pruebas de Pregunta-2.py (python -m pytest desde esta carpeta)
+
+_ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Pregunta-2.py')
+_spec = importlib.util.spec_from_file_location('pregunta_2', _ruta)
+pregunta_2 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pregunta_2)
+
+
+# Suma los estados locales y los mensajes registrados en los canales
+def total_instantanea(estado_global):
+    return sum(estado + sum(sum(mensajes) for mensajes in canales.values())
+               for estado, canales in estado_global.values())
+
+
+# Varias instantáneas superpuestas mientras los procesos se transfieren
+# unidades: cada una conserva el total y registra a todos los procesos
+def test_instantaneas_concurrentes_conservan_el_total():
+    num_procesos = 30
+    runtime = pregunta_2.SnapshotRuntime(num_procesos, pregunta_2.ring_topology(num_procesos, 2))
+    aleatorio = random.Random(0)
+    runtime.start()
+    try:
+        ids = []
+        for ronda in range(5):
+            for _ in range(200):
+                runtime.transfer(aleatorio.randrange(num_procesos), aleatorio.randrange(8),
+                                 aleatorio.randint(1, 20))
+            ids.append(runtime.initiate_snapshot(aleatorio.randrange(num_procesos)))
+        for snapshot_id in ids:
+            estado_global = runtime.wait_snapshot(snapshot_id, timeout=10)
+            assert estado_global is not None
+            assert len(estado_global) == num_procesos
+            assert total_instantanea(estado_global) == num_procesos * 100
+    finally:
+        runtime.stop()
+
+
+# Instantáneas sintéticas: en cada una cambian algunos procesos y a veces uno
+# desaparece, así el almacén guarda deltas con altas, cambios y bajas
+def instantaneas_sinteticas(cantidad, num_procesos=8, semilla=0):
+    aleatorio = random.Random(semilla)
+    actual = {p: (100, {}) for p in range(num_procesos)}
+    resultado = []
+    for _ in range(cantidad):
+        actual = dict(actual)
+        for p in aleatorio.sample(range(num_procesos), 2):
+            actual[p] = (aleatorio.randint(0, 200), {(p + 1) % num_procesos: [aleatorio.randint(1, 9)]})
+        if aleatorio.random() < 0.3:
+            actual.pop(aleatorio.randrange(num_procesos), None)
+        resultado.append(actual)
+    return resultado
+
+
+# Las instantáneas se reconstruyen igual desde deltas y completas, también
+# después de reabrir el almacén y al seguir añadiendo
+def test_almacen_reabrir_y_reconstruir(tmp_path):
+    ruta = str(tmp_path / 'instantaneas')
+    instantaneas = instantaneas_sinteticas(40)
+    with pregunta_2.SnapshotStore(ruta, keyframe_interval=5) as almacen:
+        for snapshot_id, instantanea in enumerate(instantaneas[:25]):
+            almacen.append(snapshot_id, instantanea)
+        assert almacen.load(12) == instantaneas[12]
+        tipos = [entrada[3] for entrada in almacen.entries]
+        assert tipos.count(almacen.FULL) == 5
+    with pregunta_2.SnapshotStore(ruta, keyframe_interval=5) as almacen:
+        assert len(almacen) == 25 and 24 in almacen
+        for snapshot_id, instantanea in enumerate(instantaneas[25:], 25):
+            almacen.append(snapshot_id, instantanea)
+        # Lecturas en orden inverso: sin reutilizar la reconstrucción anterior
+        for snapshot_id in reversed(almacen.ids()):
+            assert almacen.load(snapshot_id) == instantaneas[snapshot_id]
+        with pytest.raises(ValueError):
+            almacen.append(3, instantaneas[3])
+
+
+# El runtime escribe las instantáneas completas en el almacén
+def test_runtime_con_almacen(tmp_path):
+    with pregunta_2.SnapshotStore(str(tmp_path / 'runtime')) as almacen:
+        runtime = pregunta_2.SnapshotRuntime(10, store=almacen)
+        runtime.start()
+        try:
+            ids = [runtime.initiate_snapshot(i) for i in range(3)]
+            for snapshot_id in ids:
+                assert total_instantanea(runtime.wait_snapshot(snapshot_id, timeout=10)) == 1000
+        finally:
+            runtime.stop()
+        assert sorted(almacen.ids()) == ids
+        assert runtime.collector.completed == {}
+
+
+# Con pedidos que llegan mientras otros nodos están en la sección crítica,
+# nunca hay dos nodos dentro (enter lanza RuntimeError) y todos entran
+def test_raymond_exclusion_mutua():
+    arbol = pregunta_2.RaymondTree(pregunta_2.kary_tree(200, 3), cs_duration=3)
+    aleatorio = random.Random(0)
+    pedidos = 0
+    for _ in range(100):
+        for node_id in aleatorio.sample(range(200), 5):
+            # Un nodo no pide otra vez mientras espera o usa el token
+            nodo = arbol.nodes[node_id]
+            if node_id not in nodo.request_queue and not nodo.using:
+                arbol.request_access(node_id)
+                pedidos += 1
+        arbol.run(max_messages=aleatorio.randint(1, 50))
+    arbol.run()
+    assert arbol.cs_entries == pedidos
+    assert arbol.in_cs is None
+    # Un solo nodo tiene el token
+    assert sum(nodo.holder == nodo.node_id for nodo in arbol.nodes.values()) == 1
+
+
+# Un pedido recorre el camino hasta el poseedor y el token vuelve por él
+def test_raymond_cadena():
+    arbol = pregunta_2.RaymondTree({0: 1, 1: 2, 2: None})
+    arbol.request_access(0)
+    arbol.run()
+    assert arbol.nodes[0].cs_entries == 1
+    assert arbol.messages_sent == 4  # Dos pedidos y dos envíos del token
+    assert arbol.nodes[0].holder == 0 and arbol.nodes[2].holder == 1
+
+
+# Marcas de tiempo con pares iguales, ordenados y concurrentes
+def marcas_de_tiempo(cantidad, num_nodos=6, semilla=0):
+    aleatorio = random.Random(semilla)
+    a_batch, b_batch = [], []
+    for _ in range(cantidad):
+        a = [aleatorio.randint(0, 5) for _ in range(num_nodos)]
+        caso = aleatorio.randrange(4)
+        if caso == 0:
+            b = list(a)
+        elif caso == 1:
+            b = [v + aleatorio.randint(0, 2) for v in a]
+        elif caso == 2:
+            b = [max(0, v - aleatorio.randint(0, 2)) for v in a]
+        else:
+            b = [aleatorio.randint(0, 5) for _ in range(num_nodos)]
+        a_batch.append(a)
+        b_batch.append(b)
+    return a_batch, b_batch
+
+
+# La comparación en lote coincide con compare_clocks, con y sin NumPy
+@pytest.mark.parametrize('sin_numpy', [False, True])
+def test_compare_clocks_batch_coincide_con_escalar(monkeypatch, sin_numpy):
+    if sin_numpy:
+        monkeypatch.setattr(pregunta_2, 'np', None)
+    elif pregunta_2.np is None:
+        pytest.skip("NumPy no está instalado")
+    a_batch, b_batch = marcas_de_tiempo(500)
+    esperado = [pregunta_2.compare_clocks(a, b) for a, b in zip(a_batch, b_batch)]
+    assert set(esperado) == {pregunta_2.BEFORE, pregunta_2.AFTER, pregunta_2.CONCURRENT, pregunta_2.EQUAL}
+    assert list(pregunta_2.compare_clocks_batch(a_batch, b_batch)) == esperado
+    assert pregunta_2.happened_before_batch(a_batch, b_batch) == [r == pregunta_2.BEFORE for r in esperado]
+    assert pregunta_2.concurrent_batch(a_batch, b_batch) == [r == pregunta_2.CONCURRENT for r in esperado]
+
+
+# Los relojes compactos, con relojes completos o con deltas por canales FIFO,
+# terminan igual que los VectorClock originales
+@pytest.mark.parametrize('sin_numpy', [False, True])
+def test_reloj_compacto_coincide_con_el_original(monkeypatch, sin_numpy):
+    if sin_numpy:
+        monkeypatch.setattr(pregunta_2, 'np', None)
+    elif pregunta_2.np is None:
+        pytest.skip("NumPy no está instalado")
+    num_nodos = 5
+    originales = [pregunta_2.VectorClock(num_nodos, i) for i in range(num_nodos)]
+    compactos = [pregunta_2.CompactVectorClock(num_nodos, i) for i in range(num_nodos)]
+    dispersos = [pregunta_2.CompactVectorClock(num_nodos, i, sparse=True) for i in range(num_nodos)]
+    aleatorio = random.Random(1)
+    for _ in range(300):
+        origen, destino = aleatorio.sample(range(num_nodos), 2)
+        originales[destino].receive_event(originales[origen].send_event())
+        compactos[destino].receive_event(compactos[origen].send_event())
+        dispersos[destino].receive_event(dispersos[origen].send_event(destino))
+    for original, compacto, disperso in zip(originales, compactos, dispersos):
+        assert compacto.to_list() == original.clock == disperso.to_list()
+
+
+# Recorre el heap desde las raíces y comprueba que cada objeto alcanzable
+# tiene el valor y las referencias del grafo de referencia (valor -> valores
+# referenciados). Devuelve {valor: dirección} de los objetos alcanzables.
+def recorrer(heap, raices, grafo):
+    direcciones = {}
+    pendientes = [heap.root(handle) for handle in raices.values()]
+    while pendientes:
+        addr = pendientes.pop()
+        valor = heap.get(addr)
+        if valor in direcciones:
+            assert direcciones[valor] == addr
+            continue
+        direcciones[valor] = addr
+        refs = heap.get_refs(addr)
+        assert [heap.get(r) for r in refs] == grafo[valor]
+        pendientes.extend(refs)
+    return direcciones
+
+
+# Asigna objetos jóvenes y viejos, cambia referencias (también de viejos a
+# jóvenes, por la barrera de escritura) y quita raíces: tras cada recolección
+# menor o mayor los objetos alcanzables siguen intactos
+def test_heap_generacional_conserva_lo_alcanzable():
+    heap = pregunta_2.GenerationalHeap(64, 256, promotion_age=2)
+    aleatorio = random.Random(0)
+    grafo = {}
+    raices = {}  # valor -> handle
+    for valor in range(3000):
+        direcciones = recorrer(heap, raices, grafo) if valor % 10 == 0 else None
+        vivos = list(raices)
+        refs_valores = aleatorio.sample(vivos, min(len(vivos), aleatorio.randint(0, 2)))
+        refs = [heap.root(raices[v]) for v in refs_valores]
+        addr = heap.allocate(valor, refs, old=aleatorio.random() < 0.05)
+        grafo[valor] = refs_valores
+        raices[valor] = heap.add_root(addr)
+        if len(raices) > 30:
+            heap.remove_root(raices.pop(aleatorio.choice(list(raices))))
+        if direcciones:
+            # Un objeto viejo alcanzable pasa a apuntar al recién asignado
+            viejos = [(v, a) for v, a in direcciones.items() if not heap.is_young(a) and grafo[v]]
+            if viejos and valor in raices:
+                v, a = aleatorio.choice(viejos)
+                heap.set_ref(a, 0, heap.root(raices[valor]))
+                grafo[v][0] = valor
+    assert heap.stats()['minor']['count'] > 0
+    assert heap.promoted > 0
+    recorrer(heap, raices, grafo)
+    heap.collect_old()
+    direcciones = recorrer(heap, raices, grafo)
+    # Tras la recolección mayor la arena vieja solo tiene objetos alcanzables
+    assert heap.old_used() == sum(not heap.is_young(a) for a in direcciones.values())
+    assert heap.stats()['major']['count'] > 0 and heap.freed_old > 0
+
+
+# Con la red reordenando los mensajes, cada nodo entrega todas las difusiones
+# una vez y en un orden compatible con la causalidad
+def test_difusion_causal_respeta_el_orden():
+    num_nodos = 6
+    entregas = defaultdict(list)
+    grupo = pregunta_2.CausalGroup(num_nodos, reorder=1.0, seed=3,
+                                   on_deliver=lambda nodo, emisor, payload: entregas[nodo].append(payload))
+    aleatorio = random.Random(3)
+    vectores = {}
+    emisores = {}
+    for mensaje in range(300):
+        node_id = aleatorio.randrange(num_nodos)
+        grupo.broadcast(node_id, mensaje)
+        vectores[mensaje] = list(grupo.nodes[node_id].clock.clock)
+        emisores[mensaje] = node_id
+        grupo.run(max_messages=aleatorio.randint(0, 10))
+    grupo.run()
+    # Un mensaje repetido se descarta
+    repetido = next(m for m in range(300) if emisores[m] != 1)
+    grupo.in_flight.append((1, emisores[repetido], vectores[repetido], repetido))
+    grupo.run()
+    assert sum(nodo.stats()['buffered'] for nodo in grupo.nodes) > 0
+    assert grupo.nodes[1].duplicates == 1
+    for nodo in range(num_nodos):
+        orden = entregas[nodo]
+        assert sorted(orden) == list(range(300))
+        posicion = {mensaje: i for i, mensaje in enumerate(orden)}
+        for a in range(300):
+            for b in range(a + 1, 300):
+                if pregunta_2.compare_clocks(vectores[a], vectores[b]) == pregunta_2.BEFORE:
+                    assert posicion[a] < posicion[b]
+        assert grupo.nodes[nodo].stats()['pending'] == 0
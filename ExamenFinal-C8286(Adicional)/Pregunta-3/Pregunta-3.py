@@ -1,13 +1,118 @@
+import asyncio
+import heapq
+import multiprocessing
+import operator
+import os
+import pickle
+import struct
+import sys
 import threading
 import time
 import random
+from collections import Counter, deque
+from multiprocessing import shared_memory
+
+# trazas.py está en la carpeta del examen y lo comparten las cuatro preguntas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trazas
+
+TRACE_NETWORK = trazas.TRAZADOR.componente('pregunta3.red')
+TRACE_MUTEX = trazas.TRAZADOR.componente('pregunta3.exclusion')
+TRACE_HEAP = trazas.TRAZADOR.componente('pregunta3.heap')
+TRACE_TERMINATION = trazas.TRAZADOR.componente('pregunta3.terminacion')
+
+
+# Formato binario de un mensaje (21 bytes de cabecera): flags y tipo (el
+# método del nodo destino), nodo destino, emisor, marca de tiempo y longitud
+# del contenido, seguidos del contenido en UTF-8 o serializado con pickle
+WIRE = struct.Struct('<BIIdI')
+WIRE_KIND = 0x1F     # Código del método en WIRE_METHODS
+WIRE_INTEGER = 0x20  # La marca de tiempo es un entero
+WIRE_TEXT = 0x40     # Contenido str en UTF-8
+WIRE_PICKLED = 0x80  # Contenido serializado con pickle (sin ninguno de los dos, None)
 
 
 class Message:
-    def __init__(self, sender, content, timestamp):
+    __slots__ = ('sender', 'content', 'timestamp', 'kind', 'recipient')
+
+    def __init__(self, sender, content, timestamp, kind=0, recipient=0):
         self.sender = sender
         self.content = content
         self.timestamp = timestamp
+        self.kind = kind
+        self.recipient = recipient
+
+    def encode(self):
+        content = self.content
+        flags = self.kind
+        if content is None:
+            body = b''
+        elif type(content) is str:
+            body = content.encode()
+            flags |= WIRE_TEXT
+        else:
+            body = pickle.dumps(content)
+            flags |= WIRE_PICKLED
+        if type(self.timestamp) is int:
+            flags |= WIRE_INTEGER
+        return WIRE.pack(flags, self.recipient, self.sender, self.timestamp, len(body)) + body
+
+    # Decodifica el mensaje que empieza en offset; devuelve (mensaje, fin)
+    @staticmethod
+    def decode(buffer, offset=0):
+        flags, recipient, sender, timestamp, length = WIRE.unpack_from(buffer, offset)
+        start = offset + WIRE.size
+        end = start + length
+        if flags & WIRE_TEXT:
+            content = bytes(buffer[start:end]).decode()
+        elif flags & WIRE_PICKLED:
+            content = pickle.loads(buffer[start:end])
+        else:
+            content = None
+        if flags & WIRE_INTEGER:
+            timestamp = int(timestamp)
+        return Message(sender, content, timestamp, flags & WIRE_KIND, recipient), end
+
+
+# Métodos de Node que viajan como Message y en qué campos van sus argumentos;
+# el código del método (kind) es su posición en la tupla
+WIRE_METHODS = (
+    ('receive_message', None),  # El argumento es el propio Message
+    ('receive_request', ('timestamp', 'sender')),
+    ('receive_reply', ('sender',)),
+    ('receive_clock_poll', ('sender',)),
+    ('receive_clock_value', ('sender', 'timestamp')),
+    ('receive_clock_adjustment', ('timestamp',)),
+    ('receive_gossip_clock', ('sender', 'timestamp')),
+    ('receive_gossip_reply', ('timestamp',)),
+    ('send_message', ('sender', 'content')),  # sender lleva el destinatario final
+    ('request_cs', ()),
+    ('release_cs', ()),
+    ('synchronize_clocks', ()),
+    ('garbage_collect', ()),
+)
+WIRE_CODES = {method: code for code, (method, _) in enumerate(WIRE_METHODS)}
+
+
+# Codifica la llamada recipient.method(*args) como un Message en binario
+def encode_call(recipient_id, method, args):
+    code = WIRE_CODES[method]
+    fields = WIRE_METHODS[code][1]
+    if fields is None:
+        message = args[0]
+        return Message(message.sender, message.content, message.timestamp, code, recipient_id).encode()
+    message = Message(0, None, 0, code, recipient_id)
+    for field, value in zip(fields, args):
+        setattr(message, field, value)
+    return message.encode()
+
+
+# Devuelve (method, args) de un Message decodificado
+def decode_call(message):
+    method, fields = WIRE_METHODS[message.kind]
+    if fields is None:
+        return method, (message,)
+    return method, tuple(getattr(message, field) for field in fields)
 
 class Node:
     def __init__(self, node_id, total_nodes, network):
@@ -16,8 +121,18 @@ class Node:
         self.network = network
         self.clock = 0
         self.mutex = RicartAgrawalaMutex(node_id, total_nodes, network)
+        self._heap = None  # Heap propio durante toda la vida del nodo, se crea al usarlo
+        self.termination = TerminationDetector()
         self.processes = {}
 
+    # Los semiespacios se reservan en el primer garbage_collect: una red de
+    # miles de nodos que no recolectan no paga 2 * HEAP_SIZE bytes por nodo
+    @property
+    def heap(self):
+        if self._heap is None:
+            self._heap = CheneyCollector(size=HEAP_SIZE)
+        return self._heap
+
     def send_message(self, recipient_id, content):
         message = Message(self.node_id, content, self.clock)
         recipient_node = self.network.get_node_by_id(recipient_id)
@@ -25,13 +140,13 @@ class Node:
 
 
     def send_reply(self, target_id):
-        for node in self.network.nodes:
-            if node.node_id == target_id:
-                node.receive_reply(self.node_id)
+        self.network.get_node_by_id(target_id).receive_reply(self.node_id)
 
     def receive_message(self, message):
         self.clock = max(self.clock, message.timestamp) + 1
-        print(f"Mensaje recibido en Nodo {self.node_id}: {message.content}")
+        if TRACE_NETWORK.activo:
+            TRACE_NETWORK.evento('recibido', 'Mensaje recibido en Nodo {nodo}: {contenido}',
+                                 nodo=self.node_id, origen=message.sender, contenido=message.content)
 
     def request_cs(self):
         self.mutex.request_access()
@@ -45,174 +160,784 @@ class Node:
     def release_cs(self):
         self.mutex.leave_critical_section()
 
+    # Intercambio de gossip con un nodo al azar (2 mensajes); la red completa
+    # se sincroniza con network.clock_sync
     def synchronize_clocks(self):
-        # Implementación básica de sincronización de relojes
-        max_clock = max([node.clock for node in self.network.nodes])
-        self.clock = max_clock
+        self.network.clock_sync.gossip_exchange(self.node_id)
+
+    def receive_clock_poll(self, master_id):
+        self.network.clock_sync.on_poll(self, master_id)
+
+    def receive_clock_value(self, sender_id, clock):
+        self.network.clock_sync.on_value(self, sender_id, clock)
+
+    def receive_clock_adjustment(self, offset):
+        self.network.clock_sync.on_adjustment(self, offset)
+
+    def receive_gossip_clock(self, sender_id, clock):
+        self.network.clock_sync.on_gossip(self, sender_id, clock)
+
+    def receive_gossip_reply(self, clock):
+        self.network.clock_sync.on_gossip_reply(self, clock)
 
     def garbage_collect(self):
-        # Implementación básica de recolección de basura utilizando el algoritmo de Cheney
-        collector = CheneyCollector(size=100)  # Tamaño de la memoria ficticio
+        # Recolección de basura utilizando el algoritmo de Cheney sobre el heap del nodo
         # Simulación de asignación y recolección de memoria
         for i in range(3):  # Simular 3 asignaciones
-            addr = collector.allocate(f"Objeto {i}")
-            print(f"Nodo {self.node_id} asignó objeto en dirección {addr}")
-        collector.collect()
-        print(f"Nodo {self.node_id} recolectó basura")
+            addr = self.heap.allocate(f"Objeto {i}")
+            if TRACE_HEAP.activo:
+                TRACE_HEAP.evento('asignado', 'Nodo {nodo} asignó objeto en dirección {direccion}',
+                                  nodo=self.node_id, direccion=addr)
+        with TRACE_HEAP.intervalo('recolectado', 'Nodo {nodo} recolectó basura', nodo=self.node_id):
+            self.heap.collect()
 
     def terminate_process_detection(self):
         # Implementación básica de detección de terminación de procesos distribuidos
         if not self.processes:
            return
-        active_processes = [p for p in self.processes.values() if p.active]
-        if not active_processes:
-            print(f"Nodo {self.node_id}: Todos los procesos han terminado.")
+        # El detector entrega los reconocimientos pendientes y responde en O(1)
+        if self.termination.flush() and TRACE_TERMINATION.activo:
+            TRACE_TERMINATION.evento('terminado', 'Nodo {nodo}: Todos los procesos han terminado.',
+                                     nodo=self.node_id)
 
     def add_process(self, process_id, neighbors):
-        self.processes[process_id] = Process(process_id, neighbors)
+        self.processes[process_id] = Process(process_id, neighbors, detector=self.termination)
 
+    # El primer proceso es la raíz de la computación difusa: envía un mensaje
+    # a cada vecino y termina su tarea
     def start_processes(self):
-        for process in self.processes.values():
-            process.send_message(process.neighbors[0])
+        if not self.processes:
+            return
+        root = next(iter(self.processes.values()))
+        self.termination.start(root.detector_id)
+        for neighbor_id in root.neighbors:
+            if neighbor_id in self.processes:
+                root.send_message(self.processes[neighbor_id])
+        root.process_task()
 
     def receive_process_message(self, sender_id, process_id):
         if process_id not in self.processes:
             self.add_process(process_id, neighbors=[sender_id])
-        else:
-            self.processes[process_id].send_message(self, sender_id)
+        sender = self.processes.get(sender_id)
+        if sender is not None:
+            sender.send_message(self.processes[process_id])
 
     def remove_process(self, process_id):
-        del self.processes[process_id]
+        process = self.processes.pop(process_id)
+        self.termination.finish(process.detector_id)
+        self.termination.flush()
 
 # Algoritmo de Dijkstra-Scholten :
 
+# Cada proceso es un índice en el TerminationDetector de su nodo, que lleva el
+# padre, el déficit y el estado activo: los envíos pasan por detector.send y
+# el fin de la tarea por detector.finish, y flush() entrega los reconocimientos
+# por rondas en lugar de reconocer a cada hijo por separado.
 class Process:
-    def __init__(self, process_id, neighbors):
+    def __init__(self, process_id, neighbors, detector):
         self.process_id = process_id
         self.neighbors = neighbors
-        self.parent = None
-        self.children = set()
-        self.active = True
+        self.detector = detector
+        self.detector_id = detector.add_process()
 
+    @property
+    def active(self):
+        return bool(self.detector.active[self.detector_id])
+
+    @property
+    def parent(self):
+        return self.detector.parent[self.detector_id]
+
+    # El mensaje engancha al destino al árbol (o se reconoce en el siguiente flush)
     def send_message(self, recipient):
+        self.detector.send(self.detector_id, recipient.detector_id)
         recipient.receive_message(self, self.process_id)
 
     def receive_message(self, sender, sender_id):
-        if self.parent is None:
-            self.parent = sender
-        self.children.add(sender_id)
         self.process_task()
 
     def process_task(self):
         # Simulate task processing
-        self.active = False
-        self.check_termination()
+        self.detector.finish(self.detector_id)
+        self.detector.flush()
+
+
+# Detector de terminación iterativo (Dijkstra-Scholten)
 
-    def check_termination(self):
-        if not self.active and not self.children:
-            if self.parent:
-                self.parent.receive_termination(self.process_id)
+# Los procesos se identifican por índices densos y su estado vive en listas y
+# bytearrays. deficit[p] cuenta los mensajes que p envió y aún no fueron
+# reconocidos. El primer mensaje que recibe un proceso libre lo engancha al
+# árbol (parent = emisor); los demás se reconocen enseguida. Un proceso pasivo
+# con déficit 0 se desengancha y reconoce a su padre.
+# Los reconocimientos no se entregan uno a uno: en cada ronda de flush() se
+# agrupan por destino y se aplican como una sola señal con un contador, y una
+# cola de trabajo explícita reemplaza a la recursión hacia la raíz.
+class TerminationDetector:
+    def __init__(self, num_processes=0):
+        self.parent = [-1] * num_processes
+        self.deficit = [0] * num_processes
+        self.active = bytearray(num_processes)
+        self.engaged = bytearray(num_processes)
+        self.active_count = 0
+        self.root = None
+        self.done = False
+        self.work = deque()
+        self.pending_acks = {}  # proceso -> reconocimientos pendientes
+        # Estadísticas
+        self.messages = 0
+        self.acks = 0
+        self.signals = 0
+        self.rounds = 0
 
-    def receive_termination(self, child_id):
-        self.children.remove(child_id)
-        self.check_termination()
+    def add_process(self, active=False):
+        self.parent.append(-1)
+        self.deficit.append(0)
+        self.active.append(1 if active else 0)
+        self.engaged.append(0)
+        if active:
+            self.active_count += 1
+        return len(self.parent) - 1
+
+    # El proceso raíz inicia la computación difusa
+    def start(self, root):
+        self.root = root
+        self.done = False
+        self.engaged[root] = 1
+        if not self.active[root]:
+            self.active[root] = 1
+            self.active_count += 1
+
+    def send(self, sender, recipient):
+        self.messages += 1
+        self.deficit[sender] += 1
+        if self.engaged[recipient]:
+            self.pending_acks[sender] = self.pending_acks.get(sender, 0) + 1
+        else:
+            self.engaged[recipient] = 1
+            self.parent[recipient] = sender
+        if not self.active[recipient]:
+            self.active[recipient] = 1
+            self.active_count += 1
+
+    # El proceso termina su trabajo local y pasa a pasivo
+    def finish(self, process):
+        if not self.active[process]:
+            return
+        self.active[process] = 0
+        self.active_count -= 1
+        self.work.append(process)
+
+    # Entrega los reconocimientos pendientes por rondas hasta que no quede
+    # nada que propagar; devuelve si la computación terminó
+    def flush(self):
+        parent, deficit, active, engaged = self.parent, self.deficit, self.active, self.engaged
+        work = self.work
+        while work or self.pending_acks:
+            if self.pending_acks:
+                acks, self.pending_acks = self.pending_acks, {}
+                self.rounds += 1
+                self.signals += len(acks)
+                for process, count in acks.items():
+                    self.acks += count
+                    deficit[process] -= count
+                    if deficit[process] == 0 and not active[process]:
+                        work.append(process)
+            pending = self.pending_acks
+            while work:
+                process = work.popleft()
+                if active[process] or deficit[process] or not engaged[process]:
+                    continue
+                engaged[process] = 0
+                if process == self.root:
+                    self.done = True
+                    continue
+                target = parent[process]
+                parent[process] = -1
+                pending[target] = pending.get(target, 0) + 1
+        return self.done
+
+    # Consulta O(1)
+    def is_done(self):
+        return self.done
 
 
 #Algoritmo RicartAgrawalaMutex
 
+REQUEST = 'REQUEST'
+REPLY = 'REPLY'
+
+# Ricart-Agrawala con respuestas diferidas: una solicitud se responde en el
+# momento solo si el nodo no está en la sección crítica ni tiene una solicitud
+# con más prioridad (menor (timestamp, node_id)); si no, se guarda en un heap
+# y se responde al salir de la sección crítica.
+# Con la optimización de Roucairol-Carvalho el nodo recuerda de qué nodos ya
+# tiene permiso (authorized) y solo se lo pide a los demás, así que puede volver
+# a entrar a la sección crítica sin mensajes si nadie más la pidió.
 class RicartAgrawalaMutex:
-    def __init__(self, node_id, num_nodes, network):
+    def __init__(self, node_id, num_nodes, network, roucairol_carvalho=True):
         self.node_id = node_id
         self.num_nodes = num_nodes
         self.clock = 0  # Reloj lógico del nodo
-        self.request_queue = []  # Cola de solicitudes de acceso
-        self.replies_received = 0  # Contador de respuestas recibidas
+        self.request_queue = []  # Heap de solicitudes diferidas (timestamp, node_id)
+        self.pending_replies = set()  # Nodos de los que falta respuesta
         self.network = network  # Referencia a la red de nodos
+        self.roucairol_carvalho = roucairol_carvalho
+        self.authorized = set()  # Nodos de los que ya se tiene permiso
+        self.requesting = False
+        self.in_cs = False
+        self.request_timestamp = None
+        self.cs_entries = 0
 
     def request_access(self):
+        if self.requesting or self.in_cs:
+            return
         self.clock += 1  # Incrementa el reloj lógico antes de enviar la solicitud
-        self.request_queue.append((self.clock, self.node_id))  # Añade la solicitud a la cola de solicitudes
-        # Envía una solicitud de acceso a todos los demás nodos
-        for node in self.network.nodes:
-            if node.node_id != self.node_id:
-                node.receive_request(self.clock, self.node_id)
+        self.request_timestamp = self.clock
+        self.requesting = True
+        others = set(range(self.num_nodes))
+        others.discard(self.node_id)
+        if self.roucairol_carvalho:
+            others -= self.authorized
+        self.pending_replies = others
+        if not others:
+            self.enter_critical_section()
+            return
+        # Envía una solicitud de acceso a los nodos de los que necesita permiso
+        for node_id in list(others):
+            self.send_request(node_id)
+
+    def send_request(self, target_id):
+        self.network.count_message(REQUEST)
+        self.network.get_node_by_id(target_id).receive_request(self.request_timestamp, self.node_id)
+
+    # La solicitud propia va antes que la de (timestamp, sender_id)
+    def has_priority(self, timestamp, sender_id):
+        return (self.request_timestamp, self.node_id) < (timestamp, sender_id)
 
     def receive_request(self, timestamp, sender_id):
         self.clock = max(self.clock, timestamp) + 1  # Actualiza el reloj lógico del nodo
-        self.request_queue.append((timestamp, sender_id))  # Añade la solicitud a la cola de solicitudes
-        self.request_queue.sort()  # Ordena la cola de solicitudes por timestamp
-        self.send_reply(sender_id)  # Envía una respuesta al nodo solicitante
+        if self.in_cs or (self.requesting and self.has_priority(timestamp, sender_id)):
+            heapq.heappush(self.request_queue, (timestamp, sender_id))  # Difiere la respuesta
+            return
+        self.send_reply(sender_id)
+        # Roucairol-Carvalho: al responder se pierde el permiso de ese nodo, si
+        # se está esperando la sección crítica hay que volver a pedírselo
+        if self.requesting and sender_id not in self.pending_replies:
+            self.pending_replies.add(sender_id)
+            self.send_request(sender_id)
 
     def send_reply(self, target_id):
-        for node in self.network.nodes:
-            if node.node_id == target_id:
-                node.receive_reply(self.node_id)  # Envía la respuesta al nodo destinatario
+        self.authorized.discard(target_id)
+        self.network.count_message(REPLY)
+        self.network.get_node_by_id(target_id).receive_reply(self.node_id)  # Envía la respuesta al nodo destinatario
 
     def receive_reply(self, sender_id):
-        self.replies_received += 1  # Incrementa el contador de respuestas recibidas
-        # Si ha recibido respuestas de todos los demás nodos, ingresa a la sección crítica
-        if self.replies_received == self.num_nodes - 1:
+        self.pending_replies.discard(sender_id)
+        if self.roucairol_carvalho:
+            self.authorized.add(sender_id)
+        # Si ha recibido respuestas de todos los nodos necesarios, ingresa a la sección crítica
+        if self.requesting and not self.pending_replies:
             self.enter_critical_section()
 
     def enter_critical_section(self):
-        print(f"Nodo {self.node_id} ingresando a la sección crítica")
+        self.requesting = False
+        self.in_cs = True
+        self.cs_entries += 1
+        if TRACE_MUTEX.activo:
+            TRACE_MUTEX.evento('entrada', 'Nodo {nodo} ingresando a la sección crítica', nodo=self.node_id)
         self.leave_critical_section()
 
     def leave_critical_section(self):
-        self.replies_received = 0  # Reinicia el contador de respuestas recibidas
-        # Filtra la cola de solicitudes para eliminar la solicitud del propio nodo
-        self.request_queue = [(t, n) for t, n in self.request_queue if n != self.node_id]
-         # Verifica si hay nodos en la cola de solicitudes restantes para enviar respuestas
-        if self.request_queue:
-            timestamp, node_id = self.request_queue[0]  # Obtiene la primera solicitud en la cola
+        if not self.in_cs:
+            return
+        self.in_cs = False
+        self.request_timestamp = None
+        # Responde las solicitudes diferidas en orden de prioridad
+        while self.request_queue:
+            timestamp, node_id = heapq.heappop(self.request_queue)
             self.send_reply(node_id)
 
-        print(f"Nodo {self.node_id} dejando la sección crítica")
+        if TRACE_MUTEX.activo:
+            TRACE_MUTEX.evento('salida', 'Nodo {nodo} dejando la sección crítica', nodo=self.node_id)
 
 
 
 # Algoritmo de recolección de basura (Cheney)
 
+# Cada semiespacio es un bytearray. Un objeto ocupa una cabecera fija
+# (flags, número de referencias, longitud del contenido), luego sus
+# referencias como direcciones de 4 bytes y luego su contenido en bytes.
+# Al copiar un objeto se marca FORWARDED en el semiespacio origen y su nueva
+# dirección se escribe en el campo de longitud (dirección de reenvío), así un
+# objeto compartido se copia una sola vez.
+HEADER = struct.Struct('<BxHI')  # flags, número de referencias, longitud
+REF = struct.Struct('<I')
+NULL = 0xFFFFFFFF
+FORWARDED = 1
+TEXT = 2
+PICKLED = 4
+HEAP_SIZE = 64 * 1024  # Bytes de cada semiespacio del heap de un nodo
+
+
 class CheneyCollector:
     def __init__(self, size):
-        self.size = size
-        self.from_space = [None] * size
-        self.to_space = [None] * size
+        self.size = size  # Bytes de cada semiespacio
+        self.from_space = bytearray(size)
+        self.to_space = bytearray(size)
         self.free_ptr = 0
+        self.roots = {}
+        self.next_root = 0
+        # Estadísticas
+        self.created_at = time.perf_counter()
+        self.allocations = 0
+        self.collections = 0
+        self.copied_objects = 0
+        self.copied_bytes = 0
+        self.pauses = []
+
+    # Convierte el objeto al contenido guardado en el heap
+    @staticmethod
+    def encode(obj):
+        if isinstance(obj, (bytes, bytearray)):
+            return 0, bytes(obj)
+        if isinstance(obj, str):
+            return TEXT, obj.encode()
+        return PICKLED, pickle.dumps(obj)
 
-    def allocate(self, obj):
-        if self.free_ptr >= self.size:
-            self.collect()
+    def allocate(self, obj, refs=()):
+        flags, payload = self.encode(obj)
+        refs = list(refs)
+        needed = HEADER.size + REF.size * len(refs) + len(payload)
+        if self.free_ptr + needed > self.size:
+            refs = self._collect_keeping(refs)
+            if self.free_ptr + needed > self.size:
+                raise MemoryError("El semiespacio está lleno")
         addr = self.free_ptr
-        self.from_space[addr] = obj
-        self.free_ptr += 1
+        space = self.from_space
+        HEADER.pack_into(space, addr, flags, len(refs), len(payload))
+        offset = addr + HEADER.size
+        for ref in refs:
+            REF.pack_into(space, offset, NULL if ref is None else ref)
+            offset += REF.size
+        space[offset:offset + len(payload)] = payload
+        self.free_ptr = addr + needed
+        self.allocations += 1
         return addr
 
+    # Recolecta tratando las referencias del objeto que se está asignando
+    # como raíces temporales, y devuelve sus direcciones actualizadas
+    def _collect_keeping(self, refs):
+        handles = [None if r is None else self.add_root(r) for r in refs]
+        self.collect()
+        return [None if h is None else self.roots.pop(h) for h in handles]
+
+    def get(self, addr):
+        flags, num_refs, length = HEADER.unpack_from(self.from_space, addr)
+        offset = addr + HEADER.size + REF.size * num_refs
+        payload = bytes(self.from_space[offset:offset + length])
+        if flags & TEXT:
+            return payload.decode()
+        if flags & PICKLED:
+            return pickle.loads(payload)
+        return payload
+
+    def get_refs(self, addr):
+        num_refs = HEADER.unpack_from(self.from_space, addr)[1]
+        offset = addr + HEADER.size
+        refs = []
+        for i in range(num_refs):
+            ref = REF.unpack_from(self.from_space, offset + REF.size * i)[0]
+            refs.append(None if ref == NULL else ref)
+        return refs
+
+    def set_ref(self, addr, index, target):
+        if index >= HEADER.unpack_from(self.from_space, addr)[1]:
+            raise IndexError(index)
+        REF.pack_into(self.from_space, addr + HEADER.size + REF.size * index, NULL if target is None else target)
+
+    # Las raíces se identifican por un handle porque los objetos se mueven en
+    # cada recolección; root(handle) devuelve la dirección actual
+    def add_root(self, addr):
+        handle = self.next_root
+        self.next_root += 1
+        self.roots[handle] = addr
+        return handle
+
+    def root(self, handle):
+        return self.roots[handle]
+
+    def remove_root(self, handle):
+        del self.roots[handle]
+
+    # Copia en anchura: primero las raíces, luego el puntero scan recorre el
+    # semiespacio destino reenviando las referencias de cada objeto copiado
     def collect(self):
-        self.to_space = [None] * self.size
+        t0 = time.perf_counter()
         self.free_ptr = 0
-        for obj in self.from_space:
-            if obj is not None:
-                self.copy(obj)
+        roots = self.roots
+        for handle, addr in roots.items():
+            roots[handle] = self.copy(addr)
+        to_space = self.to_space
+        scan = 0
+        while scan < self.free_ptr:
+            flags, num_refs, length = HEADER.unpack_from(to_space, scan)
+            offset = scan + HEADER.size
+            for _ in range(num_refs):
+                ref = REF.unpack_from(to_space, offset)[0]
+                if ref != NULL:
+                    REF.pack_into(to_space, offset, self.copy(ref))
+                offset += REF.size
+            scan = offset + length
         self.from_space, self.to_space = self.to_space, self.from_space
+        self.collections += 1
+        self.pauses.append(time.perf_counter() - t0)
 
+    # Copia un objeto del semiespacio origen al destino (una sola vez)
     def copy(self, obj):
+        from_space = self.from_space
+        flags, num_refs, length = HEADER.unpack_from(from_space, obj)
+        if flags & FORWARDED:
+            return length  # Dirección de reenvío
         addr = self.free_ptr
-        self.to_space[addr] = obj
-        self.free_ptr += 1
+        size = HEADER.size + REF.size * num_refs + length
+        self.to_space[addr:addr + size] = memoryview(from_space)[obj:obj + size]
+        HEADER.pack_into(from_space, obj, flags | FORWARDED, num_refs, addr)
+        self.free_ptr = addr + size
+        self.copied_objects += 1
+        self.copied_bytes += size
         return addr
 
+    def stats(self):
+        elapsed = time.perf_counter() - self.created_at
+        ordered = sorted(self.pauses)
+        return {
+            'allocations': self.allocations,
+            'allocation_rate': self.allocations / elapsed if elapsed else 0.0,
+            'used_bytes': self.free_ptr,
+            'collections': self.collections,
+            'copied_objects': self.copied_objects,
+            'copied_bytes': self.copied_bytes,
+            'mean_pause_ms': sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+            'p99_pause_ms': ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))] * 1000 if ordered else 0.0,
+            'max_pause_ms': ordered[-1] * 1000 if ordered else 0.0,
+        }
+
+
+# Sincronización de relojes escalable
+
+CLOCK_POLL = 'CLOCK_POLL'
+CLOCK_VALUE = 'CLOCK_VALUE'
+CLOCK_ADJUST = 'CLOCK_ADJUST'
+GOSSIP = 'GOSSIP'
+GOSSIP_REPLY = 'GOSSIP_REPLY'
+
+
+# Sincroniza node.clock de todos los nodos con mensajes de la red, sin leer
+# los relojes de los demás nodos directamente.
+# - 'berkeley': el maestro pide los relojes (N-1 mensajes), los nodos responden
+#   (N-1), el maestro promedia los que difieren del suyo a lo sumo tolerance y
+#   envía a cada nodo su corrección (N-1): 3(N-1) mensajes por ronda.
+# - 'gossip': cada nodo intercambia su reloj con un nodo al azar y ambos
+#   quedan con el promedio (push-pull): 2N mensajes por ronda y O(log N)
+#   rondas para converger.
+# Con un transporte asíncrono, run_round() solo envía los mensajes; hay que
+# esperar transport.wait_idle() antes de consultar stats().
+class ClockSyncService:
+    def __init__(self, network, mode='berkeley', master=0, tolerance=None, seed=None):
+        if mode not in ('berkeley', 'gossip'):
+            raise ValueError(f"Modo de sincronización desconocido: {mode}")
+        self.network = network
+        self.mode = mode
+        self.master = master
+        self.tolerance = tolerance
+        self.rng = random.Random(seed)
+        self.values = {}  # Relojes recibidos por el maestro en la ronda
+        self.pending = {}  # Relojes enviados en intercambios de gossip en curso
+        self.rounds = 0
+        self.round_messages = 0
+        self.adjustments = []  # Correcciones aplicadas en la última ronda
+
+    def send(self, message_type, recipient_id, method, *args):
+        self.network.count_message(message_type)
+        self.round_messages += 1
+        getattr(self.network.get_node_by_id(recipient_id), method)(*args)
+
+    def run_round(self):
+        self.rounds += 1
+        self.round_messages = 0
+        self.adjustments = []
+        if self.mode == 'berkeley':
+            self.values = {}
+            for node_id in range(self.network.num_nodes):
+                if node_id != self.master:
+                    self.send(CLOCK_POLL, node_id, 'receive_clock_poll', self.master)
+            if self.network.num_nodes == 1:
+                self.finish_berkeley()
+        else:
+            for node_id in range(self.network.num_nodes):
+                self.gossip_exchange(node_id)
+
+    # Rondas hasta que el desfase máximo entre relojes sea <= target_skew
+    def synchronize(self, target_skew=0.0, max_rounds=100):
+        for _ in range(max_rounds):
+            if self.stats()['skew'] <= target_skew:
+                break
+            self.run_round()
+        return self.rounds
+
+    # Berkeley
+    def on_poll(self, node, master_id):
+        self.send(CLOCK_VALUE, master_id, 'receive_clock_value', node.node_id, node.clock)
+
+    def on_value(self, master, sender_id, clock):
+        self.values[sender_id] = clock
+        if len(self.values) == self.network.num_nodes - 1:
+            self.finish_berkeley()
+
+    def finish_berkeley(self):
+        master = self.network.nodes[self.master]
+        values = self.values
+        values[self.master] = master.clock
+        if self.tolerance is None:
+            accepted = list(values.values())
+        else:
+            accepted = [c for c in values.values() if abs(c - master.clock) <= self.tolerance]
+        average = sum(accepted) / len(accepted)
+        for node_id, clock in values.items():
+            if node_id == self.master:
+                self.on_adjustment(master, average - clock)
+            else:
+                self.send(CLOCK_ADJUST, node_id, 'receive_clock_adjustment', average - clock)
+        self.values = {}
+
+    def on_adjustment(self, node, offset):
+        node.clock += offset
+        self.adjustments.append(offset)
+
+    # Gossip push-pull
+    def gossip_exchange(self, node_id):
+        num_nodes = self.network.num_nodes
+        if num_nodes < 2:
+            return
+        peer = self.rng.randrange(num_nodes - 1)
+        if peer >= node_id:
+            peer += 1
+        clock = self.network.nodes[node_id].clock
+        self.pending[node_id] = clock
+        self.send(GOSSIP, peer, 'receive_gossip_clock', node_id, clock)
+
+    def on_gossip(self, node, sender_id, clock):
+        own = node.clock
+        self.on_adjustment(node, (own + clock) / 2 - own)
+        self.send(GOSSIP_REPLY, sender_id, 'receive_gossip_reply', own)
+
+    def on_gossip_reply(self, node, clock):
+        sent = self.pending.pop(node.node_id, node.clock)
+        # Se aplica el promedio como corrección para no perder lo que el
+        # reloj avanzó mientras el intercambio estaba en curso
+        self.on_adjustment(node, (sent + clock) / 2 - sent)
+
+    # Desfase (skew) entre relojes y correcciones aplicadas en la última ronda,
+    # que reflejan la deriva acumulada desde la ronda anterior
+    def stats(self):
+        clocks = [node.clock for node in self.network.nodes]
+        mean = sum(clocks) / len(clocks)
+        adjustments = [abs(a) for a in self.adjustments]
+        return {
+            'rounds': self.rounds,
+            'skew': max(clocks) - min(clocks),
+            'max_offset': max(abs(c - mean) for c in clocks),
+            'stddev': (sum((c - mean) ** 2 for c in clocks) / len(clocks)) ** 0.5,
+            'round_messages': self.round_messages,
+            'mean_adjustment': sum(adjustments) / len(adjustments) if adjustments else 0.0,
+            'max_adjustment': max(adjustments, default=0.0),
+        }
+
+
+# Avanza los relojes dt unidades con una deriva distinta por nodo (rates[i]
+# en partes por millón)
+def advance_clocks(network, dt, rates):
+    for node, rate in zip(network.nodes, rates):
+        node.clock += dt * (1 + rate * 1e-6)
+
+
+# Transporte asíncrono basado en buzones
 
+# Representa a un nodo remoto: cada llamada a un método se convierte en un
+# mensaje que se deja en el buzón del nodo. Así los algoritmos siguen llamando
+# network.get_node_by_id(i).receive_request(...) sin cambios.
+class NodeProxy:
+    def __init__(self, transport, node_id):
+        self._transport = transport
+        self._node_id = node_id
+
+    def __getattr__(self, method):
+        transport, node_id = self._transport, self._node_id
+
+        def send(*args):
+            transport.send(node_id, method, args)
+
+        return send
+
+
+# Sin retardo ni pérdidas
+def no_latency(sender_id, recipient_id):
+    return 0.0
+
+
+def no_loss(sender_id, recipient_id):
+    return False
+
+
+# Retardo uniforme entre minimo y maximo segundos
+def uniform_latency(minimo, maximo, seed=None):
+    rng = random.Random(seed)
+
+    def latency(sender_id, recipient_id):
+        return rng.uniform(minimo, maximo)
+
+    return latency
+
+
+# Pierde cada mensaje con probabilidad p
+def random_loss(p, seed=None):
+    rng = random.Random(seed)
+
+    def loss(sender_id, recipient_id):
+        return rng.random() < p
+
+    return loss
+
+
+# Cada nodo tiene un buzón (deque) que vacía su propia tarea de asyncio. La
+# tarea entrega los mensajes acumulados en lotes de hasta batch_size antes de
+# ceder el control al bucle de eventos. Los modelos de latencia y pérdida son
+# funciones (sender_id, recipient_id) -> segundos / bool; con latencia los
+# mensajes pueden llegar desordenados.
+class MailboxTransport:
+    def __init__(self, latency=no_latency, loss=no_loss, batch_size=64):
+        self.latency = latency
+        self.loss = loss
+        self.batch_size = batch_size
+        self.network = None
+        self.mailboxes = []
+        self.wakeups = []
+        self.tasks = []
+        self.proxies = []
+        self.in_flight = 0
+        self.idle = None
+        self.current_sender = None
+        self.sent = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = []  # (node_id, method, excepción) de los manejadores que fallaron
+        self.started_at = None
+
+    def attach(self, network):
+        self.network = network
+        self.mailboxes = [deque() for _ in network.nodes]
+        self.proxies = [NodeProxy(self, node.node_id) for node in network.nodes]
+
+    def proxy(self, node_id):
+        return self.proxies[node_id]
+
+    # Debe llamarse dentro del bucle de eventos
+    def start(self):
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.wakeups = [asyncio.Event() for _ in self.mailboxes]
+        self.tasks = [asyncio.create_task(self._drain(node_id)) for node_id in range(len(self.mailboxes))]
+        self.started_at = time.perf_counter()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def send(self, recipient_id, method, args=()):
+        self.sent += 1
+        sender_id = self.current_sender
+        if self.loss(sender_id, recipient_id):
+            self.dropped += 1
+            return
+        self.in_flight += 1
+        self.idle.clear()
+        delay = self.latency(sender_id, recipient_id)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._enqueue, recipient_id, method, args)
+        else:
+            self._enqueue(recipient_id, method, args)
+
+    def _enqueue(self, recipient_id, method, args):
+        self.mailboxes[recipient_id].append((method, args))
+        self.wakeups[recipient_id].set()
+
+    async def _drain(self, node_id):
+        node = self.network.nodes[node_id]
+        mailbox = self.mailboxes[node_id]
+        wakeup = self.wakeups[node_id]
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            while mailbox:
+                for _ in range(min(self.batch_size, len(mailbox))):
+                    method, args = mailbox.popleft()
+                    self.current_sender = node_id
+                    try:
+                        getattr(node, method)(*args)
+                    except Exception as e:
+                        # Un manejador que falla no detiene el buzón del nodo
+                        self.errors.append((node_id, method, e))
+                        if TRACE_NETWORK.activo:
+                            TRACE_NETWORK.evento('error', 'Error en {metodo} del Nodo {nodo}: {error}',
+                                                 nodo=node_id, metodo=method, error=e)
+                    finally:
+                        self.current_sender = None
+                        self.delivered += 1
+                        self.in_flight -= 1
+                if mailbox:
+                    # Cede el bucle para que los demás nodos avancen
+                    await asyncio.sleep(0)
+            if self.in_flight == 0:
+                self.idle.set()
+
+    # Espera a que no queden mensajes en vuelo
+    async def wait_idle(self):
+        await self.idle.wait()
+
+    def messages_per_second(self):
+        elapsed = time.perf_counter() - self.started_at
+        return self.delivered / elapsed if elapsed else 0.0
 
 
 class Network:
-    def __init__(self, num_nodes):
+    # node_ids: nodos que viven en este proceso (todos por defecto); en los
+    # trabajadores de ProcessNetwork los demás quedan como None
+    def __init__(self, num_nodes, transport=None, node_ids=None):
         self.num_nodes = num_nodes
-        self.nodes = [Node(node_id, num_nodes, self) for node_id in range(num_nodes)]
+        local = range(num_nodes) if node_ids is None else set(node_ids)
+        self.nodes = [Node(node_id, num_nodes, self) if node_id in local else None for node_id in range(num_nodes)]
+        self.messages_sent = Counter()  # Mensajes enviados por tipo
+        self.clock_sync = ClockSyncService(self)
+        # Sin transporte los mensajes son llamadas directas a los métodos del nodo
+        self.transport = transport
+        if transport is not None:
+            transport.attach(self)
+
+    def count_message(self, message_type):
+        self.messages_sent[message_type] += 1
 
     def get_node_by_id(self, node_id):
+        if self.transport is not None:
+            return self.transport.proxy(node_id)
         return self.nodes[node_id]
 
+    # Pide a un nodo que ejecute una acción local (por ejemplo 'request_cs');
+    # con transporte se entrega por su buzón
+    def post(self, node_id, method, *args):
+        getattr(self.get_node_by_id(node_id), method)(*args)
+
     def start_network(self):
         for node in self.nodes:
             node.start_processes()
@@ -224,9 +949,8 @@ class Network:
         print("Red de nodos detenida.")
 
     def simulate_tasks(self):
-        # Sincronizar los relojes de los nodos
-        for node in self.nodes:
-            node.synchronize_clocks()
+        # Sincronizar los relojes de los nodos (una ronda de Berkeley, O(N) mensajes)
+        self.clock_sync.run_round()
 
         # Realizar solicitudes de exclusión mutua para acceder a recursos compartidos
         for node in self.nodes:
@@ -243,7 +967,313 @@ class Network:
         self.stop_network()
 
 
+# Backend multiproceso sobre memoria compartida
+
+# Anillo de bytes de un productor y un consumidor sobre SharedMemory. head y
+# tail son posiciones absolutas (crecen sin volver a 0) en líneas de caché
+# distintas: solo el productor escribe head y solo el consumidor escribe tail,
+# así que no hace falta ningún lock entre procesos. El productor escribe
+# bloques completos de mensajes y después avanza head.
+RING_HEAD = 0
+RING_TAIL = 64
+RING_DATA = 128
+POSITION = struct.Struct('<Q')
+
+
+class SharedRing:
+    def __init__(self, size=1 << 20, name=None):
+        self.size = size
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=RING_DATA + size)
+        self.data = self.shm.buf[RING_DATA:RING_DATA + size]
+
+    # Con el método spawn el anillo se vuelve a abrir por nombre en el hijo
+    def __reduce__(self):
+        return SharedRing, (self.size, self.shm.name)
+
+    def free(self):
+        buf = self.shm.buf
+        return self.size - (POSITION.unpack_from(buf, RING_HEAD)[0] - POSITION.unpack_from(buf, RING_TAIL)[0])
+
+    # Escribe el bloque completo o nada (False si no cabe)
+    def write(self, block):
+        buf = self.shm.buf
+        head = POSITION.unpack_from(buf, RING_HEAD)[0]
+        if len(block) > self.size - (head - POSITION.unpack_from(buf, RING_TAIL)[0]):
+            return False
+        start = head % self.size
+        first = min(len(block), self.size - start)
+        block = memoryview(block)
+        self.data[start:start + first] = block[:first]
+        if first < len(block):
+            self.data[:len(block) - first] = block[first:]
+        POSITION.pack_into(buf, RING_HEAD, head + len(block))
+        return True
+
+    # Devuelve todo lo escrito desde la última lectura (b'' si no hay nada)
+    def read(self):
+        buf = self.shm.buf
+        head = POSITION.unpack_from(buf, RING_HEAD)[0]
+        tail = POSITION.unpack_from(buf, RING_TAIL)[0]
+        if head == tail:
+            return b''
+        start = tail % self.size
+        length = head - tail
+        first = min(length, self.size - start)
+        block = bytes(self.data[start:start + first])
+        if first < length:
+            block += bytes(self.data[:length - first])
+        POSITION.pack_into(buf, RING_TAIL, head)
+        return block
+
+    def close(self, unlink=False):
+        self.data.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+# Escribe en cada anillo los mensajes pendientes que quepan, en orden;
+# devuelve True si no quedó ninguno
+def flush_pending(pending, rings):
+    flushed = True
+    for worker, records in enumerate(pending):
+        if not records:
+            continue
+        ring = rings[worker]
+        free = ring.free()
+        count = size = 0
+        for record in records:
+            if size + len(record) > free:
+                break
+            size += len(record)
+            count += 1
+        if count:
+            ring.write(b''.join(records[:count]))
+            del records[:count]
+        flushed = flushed and not records
+    return flushed
+
+
+# Transporte de un proceso trabajador de ProcessNetwork. Los mensajes a nodos
+# del mismo trabajador van a una cola local; los demás se codifican como
+# Message y se acumulan por trabajador destino hasta el siguiente flush. Los
+# contadores compartidos (enviados y entregados por participante) permiten al
+# coordinador detectar cuándo no queda ningún mensaje en vuelo.
+class SharedMemoryTransport:
+    def __init__(self, worker_id, num_workers, incoming, outgoing, counters, batch_size=256, idle_sleep=0.0005):
+        self.worker_id = worker_id
+        self.num_workers = num_workers
+        self.incoming = incoming  # Anillos desde los demás trabajadores y el coordinador
+        self.outgoing = outgoing  # outgoing[w]: anillo hacia el trabajador w (None para sí mismo)
+        self.counters = counters
+        self.batch_size = batch_size
+        self.idle_sleep = idle_sleep
+        self.network = None
+        self.proxies = []
+        self.local = deque()  # (recipient_id, method, args)
+        self.pending = [[] for _ in range(num_workers)]
+        self.sent = 0
+        self.delivered = 0
+
+    def attach(self, network):
+        self.network = network
+        self.proxies = [NodeProxy(self, node_id) for node_id in range(network.num_nodes)]
+
+    def proxy(self, node_id):
+        return self.proxies[node_id]
+
+    def send(self, recipient_id, method, args=()):
+        self.sent += 1
+        worker = recipient_id % self.num_workers
+        if worker == self.worker_id:
+            self.local.append((recipient_id, method, args))
+        else:
+            self.pending[worker].append(encode_call(recipient_id, method, args))
+
+    def poll(self):
+        received = 0
+        for ring in self.incoming:
+            block = ring.read()
+            offset = 0
+            while offset < len(block):
+                message, offset = Message.decode(block, offset)
+                method, args = decode_call(message)
+                self.local.append((message.recipient, method, args))
+                received += 1
+        return received
+
+    # Publica los contadores (primero los enviados) antes de que los mensajes
+    # sean visibles en los anillos
+    def flush(self):
+        slot = 2 * self.worker_id
+        self.counters[slot] = self.sent
+        self.counters[slot + 1] = self.delivered
+        return flush_pending(self.pending, self.outgoing)
+
+    def answer(self, command, argument):
+        if command == 'get':
+            getter = operator.attrgetter(argument)
+            return {node.node_id: getter(node) for node in self.network.nodes if node is not None}
+        if command == 'counts':
+            return dict(self.network.messages_sent)
+        raise ValueError(f"Comando desconocido: {command}")
+
+    # Bucle del trabajador: lee los anillos, entrega lotes de batch_size
+    # mensajes y escribe los pendientes; atiende los comandos del coordinador
+    # entre lotes y duerme cuando no hay trabajo
+    def run(self, connection):
+        nodes = self.network.nodes
+        local = self.local
+        idle = 0
+        while True:
+            received = self.poll()
+            processed = 0
+            while local and processed < self.batch_size:
+                recipient_id, method, args = local.popleft()
+                getattr(nodes[recipient_id], method)(*args)
+                processed += 1
+            self.delivered += processed
+            flushed = self.flush()
+            if connection.poll():
+                command, argument = connection.recv()
+                if command == 'stop':
+                    break
+                connection.send(self.answer(command, argument))
+            if received or processed or local or not flushed:
+                idle = 0
+            else:
+                idle += 1
+                time.sleep(0 if idle < 100 else self.idle_sleep)
+
+
+def _process_worker(worker_id, num_workers, num_nodes, incoming, outgoing, counters, connection, batch_size):
+    transport = SharedMemoryTransport(worker_id, num_workers, incoming, outgoing, counters, batch_size)
+    Network(num_nodes, transport=transport, node_ids=range(worker_id, num_nodes, num_workers))
+    transport.run(connection)
+    connection.close()
+
+
+# Red con los nodos repartidos entre procesos trabajadores (el nodo i vive en
+# el trabajador i % num_workers), así que la simulación usa todos los núcleos.
+# Cada par de participantes (trabajadores y el coordinador, que es este
+# proceso) tiene un SharedRing por sentido y los mensajes viajan en el formato
+# binario de Message. Uso:
+#     with ProcessNetwork(1000) as red:
+#         red.post(0, 'request_cs')
+#         red.wait_idle()
+#         red.gather('mutex.cs_entries')
+class ProcessNetwork:
+    def __init__(self, num_nodes, num_workers=None, ring_bytes=1 << 20, batch_size=256):
+        self.num_nodes = num_nodes
+        self.num_workers = min(num_nodes, num_workers or os.cpu_count() or 1)
+        self.ring_bytes = ring_bytes
+        self.batch_size = batch_size
+        participants = self.num_workers + 1  # El último es el coordinador
+        self.rings = {(source, target): SharedRing(ring_bytes)
+                      for source in range(participants) for target in range(self.num_workers) if source != target}
+        self.counters = multiprocessing.RawArray('Q', 2 * participants)
+        self.outgoing = [self.rings[self.num_workers, target] for target in range(self.num_workers)]
+        self.pending = [[] for _ in range(self.num_workers)]
+        self.sent = 0
+        self.workers = []
+        self.connections = []
+
+    def owner(self, node_id):
+        return node_id % self.num_workers
+
+    def start(self):
+        participants = self.num_workers + 1
+        for worker_id in range(self.num_workers):
+            incoming = [self.rings[source, worker_id] for source in range(participants) if source != worker_id]
+            outgoing = [self.rings.get((worker_id, target)) for target in range(self.num_workers)]
+            connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_process_worker, daemon=True,
+                args=(worker_id, self.num_workers, self.num_nodes, incoming, outgoing, self.counters,
+                      child_connection, self.batch_size))
+            process.start()
+            child_connection.close()
+            self.workers.append(process)
+            self.connections.append(connection)
+        return self
+
+    # Pide a un nodo que ejecute un método de WIRE_METHODS (por ejemplo 'request_cs')
+    def post(self, node_id, method, *args):
+        self.sent += 1
+        records = self.pending[self.owner(node_id)]
+        records.append(encode_call(node_id, method, args))
+        if len(records) >= self.batch_size:
+            self.flush()
+
+    # Escribe los mensajes pendientes esperando si algún anillo está lleno
+    def flush(self):
+        self.counters[2 * self.num_workers] = self.sent
+        while not flush_pending(self.pending, self.outgoing):
+            time.sleep(0.0001)
+
+    # Espera a que todos los mensajes enviados se hayan entregado: los totales
+    # de enviados y entregados coinciden en dos lecturas seguidas iguales
+    def wait_idle(self, timeout=None):
+        self.flush()
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        previous = None
+        while True:
+            counters = self.counters[:]
+            totals = (sum(counters[0::2]), sum(counters[1::2]))
+            if totals[0] == totals[1] and totals == previous:
+                return True
+            previous = totals
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.0005)
+
+    # Valor de un atributo de cada nodo (por ejemplo 'clock' o 'mutex.cs_entries')
+    def gather(self, attribute):
+        for connection in self.connections:
+            connection.send(('get', attribute))
+        values = {}
+        for connection in self.connections:
+            values.update(connection.recv())
+        return [values[node_id] for node_id in range(self.num_nodes)]
+
+    # Mensajes enviados por tipo, sumados en todos los trabajadores
+    def messages_sent(self):
+        for connection in self.connections:
+            connection.send(('counts', None))
+        total = Counter()
+        for connection in self.connections:
+            total.update(connection.recv())
+        return total
+
+    def messages_delivered(self):
+        return sum(self.counters[1::2])
+
+    def stop(self):
+        for connection in self.connections:
+            connection.send(('stop', None))
+        for process in self.workers:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.workers = []
+        self.connections = []
+        for ring in self.rings.values():
+            ring.close(unlink=True)
+        self.rings = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exception):
+        self.stop()
+        return False
+
+
 # Ejemplo de uso
 if __name__ == "__main__":
+    # La demo imprime los eventos; con --trazas además los guarda para chrome://tracing
+    trazas.TRAZADOR.configurar(eco=True)
     network = Network(5)  # Crear una red con 5 nodos
     network.simulate_tasks()  # Ejecutar la simulación de tareas científicas
+    if '--trazas' in sys.argv:
+        trazas.TRAZADOR.exportar_chrome('trazas-pregunta3.json')
@@ -0,0 +1,308 @@
+import asyncio
+import importlib.util
+import os
+import random
+
+import pytest
+
+# Pruebas de Pregunta-3.py (python -m pytest desde esta carpeta)
+
+_ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Pregunta-3.py')
+_spec = importlib.util.spec_from_file_location('pregunta_3', _ruta)
+pregunta_3 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pregunta_3)
+
+
+# Mensajes de exclusión mutua: 2(N-1) por entrada con Ricart-Agrawala; con
+# Roucairol-Carvalho un nodo que vuelve a entrar sin que nadie más lo pidiera
+# no envía ninguno
+@pytest.mark.parametrize('roucairol_carvalho, esperado', [(False, [8, 8, 8, 8]), (True, [8, 0, 0, 8])])
+def test_mensajes_por_entrada(roucairol_carvalho, esperado):
+    red = pregunta_3.Network(5)
+    for node in red.nodes:
+        node.mutex.roucairol_carvalho = roucairol_carvalho
+    mensajes = []
+    for node_id in (0, 0, 0, 1):
+        antes = sum(red.messages_sent.values())
+        red.nodes[node_id].request_cs()
+        mensajes.append(sum(red.messages_sent.values()) - antes)
+    assert mensajes == esperado
+    assert red.nodes[0].mutex.cs_entries == 3 and red.nodes[1].mutex.cs_entries == 1
+
+
+# Con mensajes desordenados por la latencia y todos los nodos pidiendo la
+# sección crítica a la vez, nunca hay dos nodos dentro y todos entran
+@pytest.mark.parametrize('roucairol_carvalho', [False, True])
+def test_ricart_agrawala_exclusion_mutua(monkeypatch, roucairol_carvalho):
+    num_nodos = 8
+    transporte = pregunta_3.MailboxTransport(latency=pregunta_3.uniform_latency(0, 0.002, seed=1))
+    red = pregunta_3.Network(num_nodos, transporte)
+    for node in red.nodes:
+        node.mutex.roucairol_carvalho = roucairol_carvalho
+
+    # La sección crítica dura hasta que se entrega un release_cs por el buzón
+    def entrar(mutex):
+        assert not any(node.mutex.in_cs for node in red.nodes)
+        mutex.requesting = False
+        mutex.in_cs = True
+        mutex.cs_entries += 1
+        red.post(mutex.node_id, 'release_cs')
+    monkeypatch.setattr(pregunta_3.RicartAgrawalaMutex, 'enter_critical_section', entrar)
+
+    async def prueba():
+        transporte.start()
+        for ronda in range(3):
+            for node_id in range(num_nodos):
+                red.post(node_id, 'request_cs')
+            await asyncio.wait_for(transporte.wait_idle(), 10)
+        await transporte.stop()
+    asyncio.run(prueba())
+    assert transporte.errors == []
+    assert [node.mutex.cs_entries for node in red.nodes] == [3] * num_nodos
+
+
+# Los buzones entregan todo en orden FIFO (sin latencia), en lotes que ceden
+# el bucle entre nodos; un manejador que falla se registra y el buzón sigue
+def test_buzones_entregan_y_registran_errores():
+    transporte = pregunta_3.MailboxTransport(batch_size=4)
+    red = pregunta_3.Network(3, transporte)
+    recibidos = {0: [], 1: []}
+    for node_id in recibidos:
+        red.nodes[node_id].receive_message = recibidos[node_id].append
+    orden = []
+    for node in red.nodes[:2]:
+        recibir = node.receive_message
+
+        def anotar(message, node_id=node.node_id, recibir=recibir):
+            orden.append(node_id)
+            recibir(message)
+        node.receive_message = anotar
+
+    async def prueba():
+        transporte.start()
+        for i in range(20):
+            for node_id in (0, 1):
+                red.post(node_id, 'receive_message', pregunta_3.Message(2, f'm{i}', i))
+        red.post(2, 'metodo_inexistente')
+        red.post(2, 'request_cs')
+        await asyncio.wait_for(transporte.wait_idle(), 5)
+        await transporte.stop()
+    asyncio.run(prueba())
+    for node_id in (0, 1):
+        assert [m.content for m in recibidos[node_id]] == [f'm{i}' for i in range(20)]
+    # Con lotes de 4 los dos nodos se alternan
+    assert orden[:8] == [0] * 4 + [1] * 4
+    node_id, metodo, error = transporte.errors[0]
+    assert (node_id, metodo) == (2, 'metodo_inexistente') and isinstance(error, AttributeError)
+    assert red.nodes[2].mutex.cs_entries == 1
+    # 42 enviados por la prueba más 2 solicitudes y 2 respuestas del request_cs
+    assert transporte.sent == transporte.delivered == 46 and transporte.in_flight == 0
+
+
+# Los mensajes perdidos no quedan en vuelo y wait_idle termina
+def test_buzones_con_perdidas():
+    transporte = pregunta_3.MailboxTransport(latency=pregunta_3.uniform_latency(0, 0.001, seed=0),
+                                             loss=pregunta_3.random_loss(0.5, seed=0))
+    red = pregunta_3.Network(2, transporte)
+
+    async def prueba():
+        transporte.start()
+        for i in range(200):
+            red.post(i % 2, 'garbage_collect')
+        await asyncio.wait_for(transporte.wait_idle(), 5)
+        await transporte.stop()
+    asyncio.run(prueba())
+    assert 0 < transporte.dropped < 200
+    assert transporte.delivered + transporte.dropped == transporte.sent == 200
+    assert transporte.errors == []
+
+
+# Un objeto compartido se copia una sola vez (reenvío), los ciclos y las
+# referencias nulas sobreviven, la basura no se copia y las raíces apuntan a
+# las direcciones nuevas
+def test_cheney_reenvio_y_raices():
+    heap = pregunta_3.CheneyCollector(size=4096)
+    basura = heap.allocate('basura' * 20)
+    compartido = heap.allocate(b'compartido')
+    a = heap.allocate('a', (compartido, None))
+    b = heap.allocate({'b': 1}, (compartido, a))
+    heap.set_ref(a, 1, b)  # Ciclo a <-> b
+    raiz_a = heap.add_root(a)
+    raiz_b = heap.add_root(b)
+    heap.collect()
+    assert heap.copied_objects == 3
+    nuevo_a, nuevo_b = heap.root(raiz_a), heap.root(raiz_b)
+    assert (nuevo_a, nuevo_b) != (a, b)
+    assert heap.get(nuevo_a) == 'a' and heap.get(nuevo_b) == {'b': 1}
+    refs_a, refs_b = heap.get_refs(nuevo_a), heap.get_refs(nuevo_b)
+    assert refs_a == [refs_b[0], nuevo_b] and refs_b[1] == nuevo_a
+    assert heap.get(refs_a[0]) == b'compartido'
+    heap.remove_root(raiz_b)
+    heap.set_ref(nuevo_a, 1, None)
+    heap.collect()
+    assert heap.get_refs(heap.root(raiz_a))[1] is None
+    assert heap.copied_objects == 5
+
+
+# Una asignación que llena el semiespacio recolecta conservando sus referencias
+def test_cheney_asignar_recolecta():
+    heap = pregunta_3.CheneyCollector(size=1024)
+    vivo = heap.add_root(heap.allocate('vivo'))
+    for i in range(100):
+        destino = heap.root(vivo)
+        nuevo = heap.allocate(f'objeto {i}', (destino,))
+        assert heap.get(heap.get_refs(nuevo)[0]) == 'vivo'
+    assert heap.collections > 0
+    with pytest.raises(IndexError):
+        heap.set_ref(heap.root(vivo), 0, None)
+    with pytest.raises(MemoryError):
+        heap.allocate(b'x' * 2048)
+
+
+# Computación difusa aleatoria: mientras quede un proceso activo o un
+# reconocimiento sin entregar is_done() es False; al terminar todos, True
+def test_detector_terminacion_aleatorio():
+    aleatorio = random.Random(0)
+    detector = pregunta_3.TerminationDetector(200)
+    detector.start(0)
+    activos = {0}
+    while activos:
+        proceso = aleatorio.choice(sorted(activos))
+        if aleatorio.random() < 0.6 and detector.messages < 2000:
+            destino = aleatorio.randrange(200)
+            detector.send(proceso, destino)
+            activos.add(destino)
+        else:
+            detector.finish(proceso)
+            activos.discard(proceso)
+        if aleatorio.random() < 0.3:
+            detector.flush()
+        assert detector.active_count == len(activos)
+        assert not detector.is_done() or not activos
+    assert detector.flush() and detector.is_done()
+    # Cada mensaje se reconoce una vez, agrupados en menos señales
+    assert detector.acks == detector.messages
+    assert detector.signals <= detector.acks
+
+
+# Una cadena de 100000 procesos se desengancha sin recursión
+def test_detector_terminacion_cadena_profunda():
+    n = 100000
+    detector = pregunta_3.TerminationDetector(n)
+    detector.start(0)
+    for p in range(n - 1):
+        detector.send(p, p + 1)
+    for p in range(n):
+        detector.finish(p)
+        assert not detector.flush() or p == n - 1
+    assert detector.is_done()
+
+
+# Los procesos de un nodo terminan a través del detector del nodo
+def test_procesos_del_nodo_usan_el_detector():
+    red = pregunta_3.Network(1)
+    nodo = red.nodes[0]
+    for i in range(4):
+        nodo.add_process(i, [1, 2, 3])
+    raiz = nodo.processes[0]
+    nodo.start_processes()
+    assert nodo.termination.is_done()
+    assert not raiz.active and all(p.parent == -1 for p in nodo.processes.values())
+    assert nodo.termination.messages == nodo.termination.acks == 3
+
+
+# Relojes con desfase inicial y deriva distinta por nodo
+def red_con_desfase(num_nodos, modo, semilla=0, tolerance=None):
+    aleatorio = random.Random(semilla)
+    red = pregunta_3.Network(num_nodos)
+    red.clock_sync = pregunta_3.ClockSyncService(red, modo, tolerance=tolerance, seed=semilla)
+    for node in red.nodes:
+        node.clock = aleatorio.uniform(0, 100)
+    return red, [aleatorio.uniform(-50, 50) for _ in range(num_nodos)]
+
+
+# Berkeley deja todos los relojes en el promedio en una ronda de 3(N-1)
+# mensajes; la deriva posterior vuelve a separarlos poco
+def test_berkeley_converge_en_una_ronda():
+    red, derivas = red_con_desfase(50, 'berkeley')
+    promedio = sum(node.clock for node in red.nodes) / 50
+    red.clock_sync.run_round()
+    estadisticas = red.clock_sync.stats()
+    assert estadisticas['skew'] < 1e-9
+    assert estadisticas['round_messages'] == 3 * 49
+    assert abs(red.nodes[0].clock - promedio) < 1e-9
+    pregunta_3.advance_clocks(red, 10, derivas)
+    assert red.clock_sync.stats()['skew'] < 10 * 100e-6 + 1e-9
+
+
+# Con tolerancia, el promedio ignora los relojes que se alejan demasiado del
+# maestro, pero a ellos también se los corrige
+def test_berkeley_con_tolerancia():
+    red, _ = red_con_desfase(5, 'berkeley', tolerance=10)
+    for node, reloj in zip(red.nodes, (100, 102, 98, 100, 500)):
+        node.clock = reloj
+    red.clock_sync.run_round()
+    assert [node.clock for node in red.nodes] == [100] * 5
+
+
+# El gossip push-pull conserva la suma de los relojes y reduce el desfase en
+# O(log N) rondas
+def test_gossip_converge():
+    red, _ = red_con_desfase(256, 'gossip', semilla=3)
+    suma = sum(node.clock for node in red.nodes)
+    rondas = red.clock_sync.synchronize(target_skew=0.01, max_rounds=60)
+    assert red.clock_sync.stats()['skew'] <= 0.01
+    assert rondas < 60
+    assert abs(sum(node.clock for node in red.nodes) - suma) < 1e-6
+    assert red.clock_sync.stats()['round_messages'] == 2 * 256
+
+
+# Varios mensajes codificados uno tras otro se decodifican igual, con
+# contenido str, None u otro objeto y marcas de tiempo enteras o reales
+def test_message_encode_decode():
+    mensajes = [
+        pregunta_3.Message(3, 'hola ñandú', 7, kind=0, recipient=1),
+        pregunta_3.Message(0, None, 2.5, kind=5, recipient=4),
+        pregunta_3.Message(9, {'clave': [1, 2]}, 0, kind=1, recipient=2**32 - 1),
+    ]
+    buffer = b''.join(m.encode() for m in mensajes)
+    offset = 0
+    for original in mensajes:
+        decodificado, offset = pregunta_3.Message.decode(memoryview(buffer), offset)
+        for campo in pregunta_3.Message.__slots__:
+            assert getattr(decodificado, campo) == getattr(original, campo)
+        assert type(decodificado.timestamp) is type(original.timestamp)
+    assert offset == len(buffer)
+
+
+# Cada método de WIRE_METHODS viaja con sus argumentos
+def test_encode_decode_call():
+    llamadas = [
+        ('receive_request', (12, 3)),
+        ('receive_reply', (4,)),
+        ('receive_clock_value', (1, 10.25)),
+        ('receive_gossip_reply', (99,)),
+        ('send_message', (2, 'contenido')),
+        ('request_cs', ()),
+    ]
+    for method, args in llamadas:
+        mensaje, _ = pregunta_3.Message.decode(pregunta_3.encode_call(5, method, args))
+        assert mensaje.recipient == 5
+        assert pregunta_3.decode_call(mensaje) == (method, args)
+    original = pregunta_3.Message(1, 'texto', 3)
+    mensaje, _ = pregunta_3.Message.decode(pregunta_3.encode_call(0, 'receive_message', (original,)))
+    method, (recibido,) = pregunta_3.decode_call(mensaje)
+    assert method == 'receive_message'
+    assert (recibido.sender, recibido.content, recibido.timestamp) == (1, 'texto', 3)
+
+
+# Red de procesos pequeña: todos los nodos entran una vez a la sección crítica
+def test_process_network():
+    with pregunta_3.ProcessNetwork(6, num_workers=2, ring_bytes=1 << 16) as red:
+        for node_id in range(6):
+            red.post(node_id, 'request_cs')
+        assert red.wait_idle(timeout=30)
+        assert red.gather('mutex.cs_entries') == [1] * 6
+        enviados = red.messages_sent()
+        assert enviados[pregunta_3.REQUEST] == enviados[pregunta_3.REPLY] > 0
+        assert red.messages_delivered() == red.sent + enviados[pregunta_3.REQUEST] + enviados[pregunta_3.REPLY]
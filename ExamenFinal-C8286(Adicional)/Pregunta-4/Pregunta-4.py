@@ -1,6 +1,24 @@
+import bisect
+import hashlib
+import heapq
+import mmap
+import os
+import pickle
+import struct
+import tempfile
 import threading
 import time
 import random
+import sys
+import zlib
+from collections import Counter
+
+# trazas.py está en la carpeta del examen y lo comparten las cuatro preguntas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trazas
+
+TRACE_DATA = trazas.TRAZADOR.componente('pregunta4.datos')
+TRACE_NETWORK = trazas.TRAZADOR.componente('pregunta4.red')
 
 # Estructura para manejar la conectividad entre nodos
 connected_nodes = {
@@ -17,113 +35,1415 @@ def latencia_red():
     time.sleep(latencia)
     return latencia
 
+MERKLE_DEPTH = 10  # El árbol de Merkle de cada nodo tiene 2**MERKLE_DEPTH hojas
+
+# Roles de un RaftNode
+LEADER = 'leader'
+FOLLOWER = 'follower'
+
+
+# Hash de 64 bits de una versión de una clave. El hash de una hoja del árbol
+# de Merkle es el XOR de los hashes de sus claves, así que una escritura
+# actualiza la hoja y sus ancestros en O(profundidad) con un solo XOR.
+def hash_version(key, version):
+    digest = hashlib.blake2b(repr((key, version)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
 # Algoritmo de replicación de datos entre nodos (consistencia eventual)
+# Cada escritura lleva una versión (reloj de Lamport, node_id) y gana la más
+# reciente. replicate envía solo las entradas del log posteriores a la marca
+# de agua (high-water mark) del peer; anti_entropy compara los árboles de
+# Merkle de data y envía solo los rangos de claves que difieren.
 class Node:
-    def __init__(self, node_id):
+    def __init__(self, node_id, merkle_depth=MERKLE_DEPTH):
         self.node_id = node_id
         self.data = {}
-        self.log = []
+        self.log = []  # Entradas (key, value, version)
+        self.clock = 0
+        self.versions = {}
+        self.shipped = {}  # peer -> posición del log ya enviada
+        self.leaves = 1 << merkle_depth
+        self.merkle = [0] * (2 * self.leaves)  # Árbol en un arreglo, raíz en 1
+        self.buckets = {}  # hoja -> claves
+        self.traffic = Counter()
 
     def put(self, key, value):
         latency = latencia_red()
-        self.data[key] = value
-        self.log.append((key, value))
-        print(f"Nodo {self.node_id} ha puesto datos para Nodo {key[-1]} con latencia {latency:.4f} segundos")
+        self.store(key, value)
+        if TRACE_DATA.activo:
+            TRACE_DATA.evento('put', 'Nodo {nodo} ha puesto datos para Nodo {destino} con latencia {latencia:.4f} segundos',
+                              nodo=self.node_id, clave=key, destino=key[-1], latencia=latency)
+
+    # Escritura local sin simular la latencia de red
+    def store(self, key, value):
+        self.clock += 1
+        self.apply(key, value, (self.clock, self.node_id))
 
     def get(self, key):
         return self.data.get(key, None)
 
+    # Aplica una escritura si su versión es más reciente que la guardada
+    def apply(self, key, value, version):
+        if not self.update_data(key, value, version):
+            return False
+        self.log.append((key, value, version))
+        return True
+
+    # Actualiza data, las versiones y el árbol de Merkle, sin tocar el log
+    def update_data(self, key, value, version):
+        old = self.versions.get(key)
+        if old is not None and old >= version:
+            return False
+        bucket = self.bucket(key)
+        if old is None:
+            self.buckets.setdefault(bucket, set()).add(key)
+            delta = hash_version(key, version)
+        else:
+            delta = hash_version(key, old) ^ hash_version(key, version)
+        self.update_merkle(bucket, delta)
+        self.data[key] = value
+        self.versions[key] = version
+        self.clock = max(self.clock, version[0])
+        return True
+
+    def bucket(self, key):
+        return zlib.crc32(repr(key).encode()) % self.leaves
+
+    def update_merkle(self, bucket, delta):
+        i = self.leaves + bucket
+        while i:
+            self.merkle[i] ^= delta
+            i //= 2
+
+    # Quita una clave de data (por ejemplo cuando deja de ser réplica de ella)
+    def discard(self, key):
+        version = self.versions.pop(key, None)
+        if version is None:
+            return False
+        bucket = self.bucket(key)
+        self.buckets[bucket].discard(key)
+        self.update_merkle(bucket, hash_version(key, version))
+        del self.data[key]
+        return True
+
     def replicate(self, other_node):
-        for entry in self.log:
-            other_node.data[entry[0]] = entry[1]
-        other_node.log.extend(self.log)
+        start = self.shipped.get(other_node.node_id, 0)
+        self.shipped[other_node.node_id] = len(self.log)
+        entries = self.log[start:]
+        if entries:
+            self.send_entries(other_node, entries)
+
+    def send_entries(self, other_node, entries):
+        self.traffic['entries_sent'] += len(entries)
+        self.traffic['bytes_sent'] += len(pickle.dumps(entries))
+        other_node.receive_entries(entries)
+
+    def receive_entries(self, entries):
+        applied = 0
+        for key, value, version in entries:
+            applied += self.apply(key, value, version)
+        self.traffic['entries_received'] += len(entries)
+        self.traffic['entries_applied'] += applied
+        return applied
+
+    # Sincroniza con un peer que divergió (por ejemplo tras una partición):
+    # baja por los dos árboles de Merkle solo por los nodos con hash distinto
+    # y se intercambian las claves de las hojas que difieren
+    def anti_entropy(self, other_node):
+        if self.leaves != other_node.leaves:
+            raise ValueError("Los árboles de Merkle tienen distinta profundidad")
+        self.traffic['anti_entropy_rounds'] += 1
+        differing = []
+        frontier = [1]
+        while frontier:
+            self.traffic['hashes_compared'] += len(frontier)
+            self.traffic['bytes_sent'] += 8 * len(frontier)
+            next_frontier = []
+            for i in frontier:
+                if self.merkle[i] == other_node.merkle[i]:
+                    continue
+                if i >= self.leaves:
+                    differing.append(i - self.leaves)
+                else:
+                    next_frontier.append(2 * i)
+                    next_frontier.append(2 * i + 1)
+            frontier = next_frontier
+        mine = [(key, self.data[key], self.versions[key])
+                for bucket in differing for key in self.buckets.get(bucket, ())]
+        theirs = [(key, other_node.data[key], other_node.versions[key])
+                  for bucket in differing for key in other_node.buckets.get(bucket, ())]
+        if mine:
+            self.send_entries(other_node, mine)
+        if theirs:
+            other_node.send_entries(self, theirs)
+        return len(differing)
+
+    # Contadores de memoria y tráfico
+    def stats(self):
+        stats = dict(self.traffic)
+        stats.update({
+            'keys': len(self.data),
+            'log_entries': len(self.log),
+            'peers_tracked': len(self.shipped),
+            'merkle_nodes': len(self.merkle),
+        })
+        return stats
+
+# Log de escritura anticipada (WAL) segmentado para RaftNode
+# Las entradas se añaden a archivos de segmento <primer índice>.seg con un
+# registro (crc32, índice, término, longitud) + (key, value) serializado.
+# El término y el voto se guardan en 'meta' y las instantáneas de data en
+# 'snapshot', ambos reemplazando el archivo de forma atómica.
+# Con group_commit, append() solo encola el registro y sync() lo hace
+# durable: el primer hilo que llega escribe y hace fsync de todo lo
+# encolado, y los demás esperan a que termine, así muchas entradas comparten
+# un fsync. group_delay es cuánto espera ese hilo a que lleguen más registros.
+class RaftWAL:
+    RECORD = struct.Struct('<IQQI')  # crc32, índice, término, longitud
+    META = struct.Struct('<QqI')     # término, voto (-1 = ninguno), crc32
+
+    def __init__(self, directory, segment_bytes=1 << 20, group_commit=True, group_delay=0.0, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.group_commit = group_commit
+        self.group_delay = group_delay
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self.cond = threading.Condition()
+        self.pending = []     # Registros encolados y aún no escritos
+        self.pending_last = 0
+        self.appended = 0     # Número de secuencia del último registro encolado
+        self.durable = 0      # Número de secuencia del último registro durable
+        self.durable_index = 0
+        self.flushing = False
+        self.fd = None
+        self.segment_size = 0
+        self.segments = sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.seg'))
+        self.last_index = 0
+        # Estadísticas
+        self.fsyncs = 0
+        self.records = 0
+
+    def segment_path(self, first_index):
+        return os.path.join(self.directory, f'{first_index:020d}.seg')
+
+    def _sync_file(self, fd):
+        if self.fsync:
+            os.fsync(fd)
+            self.fsyncs += 1
+
+    # Reemplaza un archivo de forma atómica (archivo temporal + rename)
+    def _write_atomic(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+            f.flush()
+            self._sync_file(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def save_meta(self, term, voted_for):
+        voted_for = -1 if voted_for is None else voted_for
+        crc = zlib.crc32(struct.pack('<Qq', term, voted_for))
+        self._write_atomic('meta', self.META.pack(term, voted_for, crc))
+
+    def encode(self, index, term, key, value):
+        payload = pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL)
+        body = struct.pack('<QQI', index, term, len(payload)) + payload
+        return struct.pack('<I', zlib.crc32(body)) + body
+
+    # Encola entradas (index, term, key, value) consecutivas; devuelve el
+    # número de secuencia que hay que pasar a sync()
+    def append_batch(self, entries, wait=True):
+        data = b''.join(self.encode(*entry) for entry in entries)
+        with self.cond:
+            self.pending.append(data)
+            self.pending_last = entries[-1][0]
+            self.appended += 1
+            seq = self.appended
+            self.records += len(entries)
+            if not self.group_commit:
+                self._flush(release=False)
+        if wait:
+            self.sync(seq)
+        return seq
+
+    def append(self, index, term, key, value, wait=True):
+        return self.append_batch([(index, term, key, value)], wait)
+
+    def sync(self, seq=None):
+        with self.cond:
+            if seq is None:
+                seq = self.appended
+            while self.durable < seq:
+                if self.flushing:
+                    self.cond.wait()
+                    continue
+                self.flushing = True
+                try:
+                    if self.group_delay:
+                        self.cond.wait(self.group_delay)
+                    self._flush()
+                finally:
+                    self.flushing = False
+                    self.cond.notify_all()
+
+    # Escribe y hace durable todo lo encolado; se llama con self.cond tomado y,
+    # con release, lo suelta durante la escritura para que otros hilos sigan
+    # encolando (solo un hilo escribe a la vez gracias a self.flushing)
+    def _flush(self, release=True):
+        chunks, self.pending = self.pending, []
+        target, last_index = self.appended, self.pending_last
+        if not chunks:
+            return
+        if self.fd is None or self.segment_size >= self.segment_bytes:
+            self._roll(self.last_index + 1)
+        data = b''.join(chunks)
+        if release:
+            self.cond.release()
+        try:
+            os.write(self.fd, data)
+            self._sync_file(self.fd)
+        finally:
+            if release:
+                self.cond.acquire()
+        self.segment_size += len(data)
+        self.last_index = last_index
+        self.durable = max(self.durable, target)
+        self.durable_index = last_index
+
+    def _roll(self, first_index):
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = os.open(self.segment_path(first_index), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if not self.segments or self.segments[-1] != first_index:
+            self.segments.append(first_index)
+        self.segment_size = os.fstat(self.fd).st_size
+
+    # Recorre los registros válidos de un segmento con mmap; devuelve
+    # [(offset, index, term, payload)] y el offset donde terminan
+    def _scan(self, first_index):
+        path = self.segment_path(first_index)
+        records = []
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return records, 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                offset = 0
+                while offset + self.RECORD.size <= size:
+                    crc, index, term, length = self.RECORD.unpack_from(view, offset)
+                    end = offset + self.RECORD.size + length
+                    if end > size or zlib.crc32(view[offset + 4:end]) != crc:
+                        break  # Registro incompleto (escritura interrumpida)
+                    records.append((offset, index, term, view[offset + self.RECORD.size:end]))
+                    offset = end
+        return records, offset
+
+    # Recupera el estado: (term, voted_for, snapshot, entries) donde snapshot
+    # es (index, term, data, versions) o None y entries son las entradas
+    # (index, term, key, value) posteriores a la instantánea
+    def load(self):
+        with self.cond:
+            term, voted_for = 0, None
+            meta_path = os.path.join(self.directory, 'meta')
+            if os.path.exists(meta_path):
+                with open(meta_path, 'rb') as f:
+                    data = f.read()
+                saved_term, saved_vote, crc = self.META.unpack(data)
+                if crc == zlib.crc32(data[:-4]):
+                    term, voted_for = saved_term, (None if saved_vote < 0 else saved_vote)
+            snapshot = None
+            snapshot_path = os.path.join(self.directory, 'snapshot')
+            if os.path.exists(snapshot_path):
+                with open(snapshot_path, 'rb') as f:
+                    snapshot = pickle.load(f)
+            start = snapshot[0] if snapshot else 0
+            entries = []
+            self.last_index = start
+            for position, first_index in enumerate(self.segments):
+                records, end = self._scan(first_index)
+                for _, index, entry_term, payload in records:
+                    if index > start:
+                        key, value = pickle.loads(payload)
+                        entries.append((index, entry_term, key, value))
+                    self.last_index = max(self.last_index, index)
+                if position == len(self.segments) - 1:
+                    os.truncate(self.segment_path(first_index), end)
+            self.durable_index = self.last_index
+            if self.segments:
+                self._roll(self.segments[-1])
+            return term, voted_for, snapshot, entries
+
+    # Borra las entradas con índice >= index (conflicto en el log de Raft)
+    def truncate(self, index):
+        self.sync()
+        with self.cond:
+            while self.segments and self.segments[-1] >= index and len(self.segments) > 1:
+                os.remove(self.segment_path(self.segments.pop()))
+            if self.segments:
+                records, _ = self._scan(self.segments[-1])
+                offsets = [offset for offset, record_index, _, _ in records if record_index >= index]
+                if offsets:
+                    os.truncate(self.segment_path(self.segments[-1]), offsets[0])
+                if self.fd is not None:
+                    os.close(self.fd)
+                    self.fd = None
+                self._roll(self.segments[-1])
+            self.last_index = min(self.last_index, index - 1)
+            self.durable_index = self.last_index
+
+    # Guarda una instantánea de data hasta index y borra los segmentos que
+    # solo contienen entradas anteriores
+    def compact(self, index, term, data, versions):
+        self.sync()
+        with self.cond:
+            self._write_atomic('snapshot', pickle.dumps((index, term, data, versions), protocol=pickle.HIGHEST_PROTOCOL))
+            if self.segments and self.segments[-1] <= index:
+                # Empieza un segmento nuevo para poder borrar el actual
+                self._roll(self.last_index + 1)
+            while len(self.segments) > 1 and self.segments[1] <= index + 1:
+                os.remove(self.segment_path(self.segments.pop(0)))
+
+    # Reemplaza todo el log por una instantánea recibida del líder
+    def install(self, index, term, data, versions):
+        self.truncate(0)
+        with self.cond:
+            self.last_index = self.durable_index = index
+        self.compact(index, term, data, versions)
+
+    def size_bytes(self):
+        return sum(os.path.getsize(self.segment_path(first)) for first in self.segments)
+
+    def close(self):
+        self.sync()
+        with self.cond:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
 
 # Implementación básica de Raft para consenso distribuido
+# El log de Raft guarda entradas (term, key, value); el índice Raft de
+# self.log[i] es log_start + i + 1 (log_start > 0 cuando el inicio del log se
+# compactó). Las escrituras se aplican a data al confirmarse (commit_index).
+# Con un RaftWAL el log, el término y el voto sobreviven a restart().
+# El líder lleva next_index/match_index por seguidor, arma lotes limitados por
+# número de entradas (max_batch_entries) o por bytes (max_batch_bytes) y
+# mantiene hasta window AppendEntries en vuelo por seguidor.
+# Lecturas linealizables (read): ReadIndex confirma el liderazgo con una ronda
+# de heartbeats que sirve a todas las lecturas acumuladas; con lease (en
+# segundos) el líder responde localmente mientras la mayoría respondió a un
+# mensaje enviado hace menos de lease (supone relojes con deriva acotada y que
+# no se elige otro líder antes de que expire).
+# Un nodo sin peers es el líder de su propio clúster; con peers empieza como
+# seguidor hasta become_leader, y deja de ser líder al ver un término mayor.
 class RaftNode(Node):
-    def __init__(self, node_id):
+    def __init__(self, node_id, peers=(), max_batch_entries=5, max_batch_bytes=None, window=1, wal=None, lease=None):
         super().__init__(node_id)
+        self.peers = list(peers)
+        self.max_batch_entries = max_batch_entries
+        self.max_batch_bytes = max_batch_bytes
+        self.window = window
+        self.lease = lease
+        self.send = None  # send(recipient_id, method, args, size), lo asigna RaftCluster
+        self.now = time.monotonic  # Reloj del nodo, RaftCluster lo cambia por el tiempo virtual
+        # Secuencia de los AppendEntries enviados; no se reinicia con restart()
+        # para que una respuesta a un mensaje anterior no coincida con uno nuevo
+        self.send_seq = 0
+        self.wal = wal
+        self.lock = threading.RLock()
+        self.init_raft_state()
+        if wal is not None:
+            self.recover()
+
+    def init_raft_state(self):
+        self.role = FOLLOWER if self.peers else LEADER
         self.current_term = 0
         self.voted_for = None
         self.log = []
+        self.log_start = 0
+        self.log_start_term = 0
+        self.commit_index = 0
+        self.last_applied = 0
+        self.next_index = {}
+        self.match_index = {}
+        self.inflight = {}
+        # Lecturas: cada AppendEntries lleva un número de secuencia; ack_seq y
+        # ack_time guardan la mayor secuencia respondida por seguidor en el
+        # término actual y cuándo se envió
+        self.sent_at = {}
+        self.ack_seq = {}
+        self.ack_time = {}
+        self.lease_expiry = float('-inf')
+        self.read_batch = []  # (key, callback) esperando la próxima ronda
+        self.read_round = None  # (secuencia inicial, read_index, lecturas) en curso
+        self.ready_reads = []  # Heap (índice, n, lecturas) esperando a que se aplique el índice
+        self.ready_count = 0
+        self.read_rounds = 0
+        self.reads_local = 0
+        self.reads_failed = 0
+
+    # Reconstruye el estado desde el WAL: la instantánea y las entradas
+    # posteriores, leídas con mmap
+    def recover(self):
+        term, voted_for, snapshot, entries = self.wal.load()
+        self.current_term, self.voted_for = term, voted_for
+        if snapshot is not None:
+            index, snapshot_term, data, versions = snapshot
+            for key, value in data.items():
+                self.update_data(key, value, versions[key])
+            self.log_start, self.log_start_term = index, snapshot_term
+            self.commit_index = self.last_applied = index
+        self.log = [(entry_term, key, value) for _, entry_term, key, value in entries]
+        # Sin peers lo durable ya está confirmado: se vuelve a aplicar a data
+        if not self.peers:
+            self.advance_commit()
+
+    # Simula la caída y el reinicio del nodo: se pierde todo lo que está en
+    # memoria y se recupera lo que está en el WAL
+    def restart(self):
+        with self.lock:
+            Node.__init__(self, self.node_id, self.leaves.bit_length() - 1)
+            self.init_raft_state()
+            if self.wal is not None:
+                self.recover()
+
+    def set_term(self, term, voted_for=None):
+        if term > self.current_term and self.role == LEADER and self.peers:
+            self.step_down()
+        self.current_term = term
+        self.voted_for = voted_for
+        if self.wal is not None:
+            self.wal.save_meta(term, voted_for)
+
+    # Último índice del log que ya es durable (el que cuenta para el commit)
+    def durable_index(self):
+        if self.wal is None:
+            return self.last_log_index()
+        return min(self.wal.durable_index, self.last_log_index())
+
+    def last_log_index(self):
+        return self.log_start + len(self.log)
+
+    # Término de la entrada index; None si ya se compactó en una instantánea
+    def term_at(self, index):
+        if index == self.log_start:
+            return self.log_start_term
+        if index < self.log_start:
+            return None
+        return self.log[index - self.log_start - 1][0]
 
     def request_vote(self, term, candidate_id):
-        if term > self.current_term:
-            self.current_term = term
-            self.voted_for = candidate_id
-            return True
-        return False
+        with self.lock:
+            if term > self.current_term:
+                self.set_term(term, candidate_id)
+                return True
+            return False
+
+    # El nodo propone la escritura como líder: se añade al log y se aplica al
+    # confirmarse en la mayoría. La espera del fsync se hace fuera del lock
+    # para que las escrituras concurrentes compartan el group commit.
+    def store(self, key, value):
+        with self.lock:
+            self.log.append((self.current_term, key, value))
+            index = self.last_log_index()
+            if self.wal is not None:
+                seq = self.wal.append(index, self.current_term, key, value, wait=False)
+        if self.wal is not None:
+            self.wal.sync(seq)
+        if not self.peers:
+            with self.lock:
+                self.advance_commit()
+        return index
+
+    def become_leader(self):
+        self.role = LEADER
+        # Las respuestas a mensajes de un liderazgo anterior se descartan
+        self.sent_at, self.ack_seq, self.ack_time = {}, {}, {}
+        self.lease_expiry = float('-inf')
+        for peer_id in self.peers:
+            self.add_peer(peer_id)
+
+    # Otro nodo tiene un término mayor: se descarta el estado de líder y las
+    # lecturas y escrituras pendientes terminan con callback(False, None)
+    def step_down(self):
+        self.role = FOLLOWER
+        self.next_index, self.match_index, self.inflight = {}, {}, {}
+        self.sent_at, self.ack_seq, self.ack_time = {}, {}, {}
+        self.fail_reads()
+
+    def add_peer(self, peer_id):
+        if peer_id not in self.peers:
+            self.peers.append(peer_id)
+        self.next_index[peer_id] = self.last_log_index() + 1
+        self.match_index[peer_id] = 0
+        self.inflight[peer_id] = 0
 
+    # Devuelve (term, success, índice): con éxito, el último índice que
+    # coincide con el líder; si no, hasta dónde retroceder next_index
     def append_entries(self, term, leader_id, prev_log_index, prev_log_term, entries, leader_commit):
-        if term >= self.current_term:
-            self.current_term = term
-            self.log.extend(entries)
-            return True
-        return False
+        with self.lock:
+            return self._append_entries(term, leader_id, prev_log_index, prev_log_term, entries, leader_commit)
 
+    def _append_entries(self, term, leader_id, prev_log_index, prev_log_term, entries, leader_commit):
+        if term < self.current_term:
+            return self.current_term, False, 0
+        if term > self.current_term:
+            self.set_term(term)
+        last = self.last_log_index()
+        if prev_log_index > last:
+            return term, False, last
+        if prev_log_index > self.log_start and self.term_at(prev_log_index) != prev_log_term:
+            conflict_term = self.term_at(prev_log_index)
+            index = prev_log_index
+            while index - 1 > self.log_start and self.term_at(index - 1) == conflict_term:
+                index -= 1
+            return term, False, index - 1
+        index = prev_log_index
+        for k, entry in enumerate(entries):
+            index += 1
+            if index <= self.log_start:
+                continue
+            if index <= last:
+                # Con varios AppendEntries en vuelo una entrada puede llegar dos veces
+                if self.term_at(index) == entry[0]:
+                    continue
+                del self.log[index - self.log_start - 1:]
+                if self.wal is not None:
+                    self.wal.truncate(index)
+            self.log.extend(entries[k:])
+            if self.wal is not None:
+                self.wal.append_batch([(index + i,) + tuple(entry) for i, entry in enumerate(entries[k:])])
+            break
+        match = prev_log_index + len(entries)
+        # Un AppendEntries antiguo puede llegar después de uno más reciente:
+        # commit_index nunca retrocede
+        if min(leader_commit, match) > self.commit_index:
+            self.commit_index = min(leader_commit, match)
+            self.apply_committed()
+        return term, True, match
+
+    # El log de un RaftNode es el de Raft: lo que llega por replicación de
+    # Node (receive_entries, anti_entropy) solo actualiza data y no es durable
+    def apply(self, key, value, version):
+        return self.update_data(key, value, version)
+
+    def apply_committed(self):
+        while self.last_applied < self.commit_index:
+            self.last_applied += 1
+            term, key, value = self.log[self.last_applied - self.log_start - 1]
+            if key is not None:  # Las entradas (term, None, None) no escriben nada
+                self.update_data(key, value, (self.last_applied, term))
+        if self.ready_reads:
+            self.serve_reads()
+
+    # commit_index avanza hasta el mayor índice replicado en la mayoría con
+    # una entrada del término actual
+    def advance_commit(self):
+        matches = sorted([self.durable_index()] + [self.match_index.get(p, 0) for p in self.peers], reverse=True)
+        index = matches[(len(self.peers) + 1) // 2]
+        if index > self.commit_index and self.term_at(index) == self.current_term:
+            self.commit_index = index
+            self.apply_committed()
+
+    # Entradas desde next_index limitadas por número y por bytes
+    def next_batch(self, next_index):
+        start = next_index - self.log_start - 1
+        entries = self.log[start:start + self.max_batch_entries]
+        if self.max_batch_bytes is None:
+            return entries, len(pickle.dumps(entries))
+        size = 0
+        for count, entry in enumerate(entries):
+            entry_size = len(pickle.dumps(entry))
+            if size + entry_size > self.max_batch_bytes and count:
+                return entries[:count], size
+            size += entry_size
+        return entries, size
+
+    def append_entries_args(self, peer_id, entries):
+        prev_log_index = self.next_index[peer_id] - 1
+        return (self.current_term, self.node_id, prev_log_index, self.term_at(prev_log_index),
+                entries, self.commit_index)
+
+    def handle_append_reply(self, peer_id, term, success, index):
+        if term > self.current_term:
+            self.set_term(term)
+            return
+        if success:
+            if index > self.match_index[peer_id]:
+                self.match_index[peer_id] = index
+                self.advance_commit()
+            self.next_index[peer_id] = max(self.next_index[peer_id], index + 1)
+        else:
+            self.next_index[peer_id] = min(self.next_index[peer_id], index + 1)
+
+    # Compactación: guarda data como instantánea hasta la última entrada
+    # aplicada que ya tienen todos los seguidores y descarta el log anterior
+    def take_snapshot(self):
+        with self.lock:
+            index = min([self.last_applied] + [self.match_index.get(p, 0) for p in self.next_index])
+            if index <= self.log_start:
+                return self.log_start
+            term = self.term_at(index)
+            if self.wal is not None:
+                self.wal.compact(index, term, dict(self.data), dict(self.versions))
+            del self.log[:index - self.log_start]
+            self.log_start, self.log_start_term = index, term
+            return index
+
+    # InstallSnapshot: el seguidor necesita entradas anteriores a log_start,
+    # que ya solo existen en la instantánea
+    def needs_snapshot(self, peer_id):
+        return self.next_index[peer_id] <= self.log_start
+
+    def snapshot_args(self):
+        return (self.current_term, self.node_id, self.log_start, self.log_start_term,
+                dict(self.data), dict(self.versions))
+
+    # Devuelve (term, success, índice) como append_entries
+    def install_snapshot(self, term, leader_id, index, snapshot_term, data, versions):
+        with self.lock:
+            if term < self.current_term:
+                return self.current_term, False, 0
+            if term > self.current_term:
+                self.set_term(term)
+            if index <= self.last_applied:
+                return term, True, index
+            if index < self.last_log_index() and self.term_at(index) == snapshot_term:
+                # Se conservan las entradas posteriores a la instantánea
+                del self.log[:index - self.log_start]
+                if self.wal is not None:
+                    self.wal.compact(index, snapshot_term, data, versions)
+            else:
+                self.log = []
+                if self.wal is not None:
+                    self.wal.install(index, snapshot_term, data, versions)
+            for key in list(self.data):
+                self.discard(key)
+            for key, value in data.items():
+                self.update_data(key, value, versions[key])
+            self.log_start, self.log_start_term = index, snapshot_term
+            self.commit_index = max(self.commit_index, index)
+            self.last_applied = index
+            self.apply_committed()
+            return term, True, index
+
+    # Replicación síncrona a un seguidor con llamadas directas
     def replicate(self, other_node):
-        entries = []
-        for entry in self.log:
-            entries.append(entry)
-            if len(entries) == 5:  # Simular replicación de lotes de entradas
-                other_node.append_entries(self.current_term, self.node_id, 0, 0, entries, 0)
-                entries = []
-        if entries:
-            other_node.append_entries(self.current_term, self.node_id, 0, 0, entries, 0)
-
-# Función para simular una partición de red
-def simulate_particio_red():
-    time.sleep(random.uniform(2, 5))
-    print("¡Se ha producido una partición de red!")
-
-# Función para simular la recuperación de la red
-def simulate_recuperacion_red():
-    time.sleep(random.uniform(2, 5))
-    print("La red se ha recuperado.")
-
-# Función para ejecutar un nodo con posibles fallos
-def nodos_posibles_fallos(node):
-    while True:
-        # Simular fallos aleatorios en el nodo
-        time.sleep(random.uniform(1, 3))
-        if random.random() < 0.3:  # Probabilidad de 30% de fallo
-            print(f"Nodo {node.node_id} ha fallado.")
-            time.sleep(random.uniform(1, 3))
-            print(f"Nodo {node.node_id} está reiniciando...")
+        peer_id = other_node.node_id
+        if peer_id not in self.next_index:
+            self.add_peer(peer_id)
+        while True:
+            if self.needs_snapshot(peer_id):
+                term, success, index = other_node.install_snapshot(*self.snapshot_args())
+            else:
+                entries, _ = self.next_batch(self.next_index[peer_id])
+                args = self.append_entries_args(peer_id, entries)
+                term, success, index = other_node.append_entries(*args)
+            self.handle_append_reply(peer_id, term, success, index)
+            if self.role != LEADER or (success and index >= self.last_log_index()):
+                break
 
-# Función para ejecutar la simulación de red
-def simulacion(max_iterations):
-    nodes = [RaftNode(i) for i in range(len(connected_nodes))]
-    threads = []
+    # Envía AppendEntries al seguidor mientras haya entradas y espacio en la
+    # ventana; next_index avanza de forma optimista (pipelining)
+    def pump(self, peer_id):
+        while self.inflight[peer_id] < self.window and self.next_index[peer_id] <= self.last_log_index():
+            if self.needs_snapshot(peer_id):
+                args = self.snapshot_args()
+                self.next_index[peer_id] = self.log_start + 1
+                self.send_append(peer_id, args, len(pickle.dumps(args[4:])), 'on_install_snapshot')
+                continue
+            entries, size = self.next_batch(self.next_index[peer_id])
+            args = self.append_entries_args(peer_id, entries)
+            self.next_index[peer_id] += len(entries)
+            self.send_append(peer_id, args, size)
 
-    # Crear hilos para ejecutar nodos con posibles fallos
-    for node in nodes:
-        thread = threading.Thread(target=nodos_posibles_fallos, args=(node,))
-        thread.start()
-        threads.append(thread)
+    def send_heartbeats(self):
+        for peer_id in self.peers:
+            if self.needs_snapshot(peer_id):
+                self.pump(peer_id)
+            else:
+                self.send_append(peer_id, self.append_entries_args(peer_id, []), 0)
+
+    # Envía AppendEntries con un número de secuencia que el seguidor devuelve
+    def send_append(self, peer_id, args, size, method='on_append_entries'):
+        self.send_seq += 1
+        self.sent_at[self.send_seq] = self.now()
+        self.inflight[peer_id] += 1
+        self.send(peer_id, method, args + (self.send_seq,), size)
 
-    # Iterar sobre un número máximo de iteraciones
-    for _ in range(max_iterations):
-        # Simular operaciones entre nodos conectados
+    def on_append_entries(self, term, leader_id, prev_log_index, prev_log_term, entries, leader_commit, seq=0):
+        reply = self.append_entries(term, leader_id, prev_log_index, prev_log_term, entries, leader_commit)
+        self.send(leader_id, 'on_append_reply', (self.node_id,) + reply + (seq,), 0)
+
+    def on_install_snapshot(self, term, leader_id, index, snapshot_term, data, versions, seq=0):
+        reply = self.install_snapshot(term, leader_id, index, snapshot_term, data, versions)
+        self.send(leader_id, 'on_append_reply', (self.node_id,) + reply + (seq,), 0)
+
+    def on_append_reply(self, peer_id, term, success, index, seq=0):
+        if self.role != LEADER:
+            # Respuesta a un mensaje enviado antes de dejar de ser líder
+            if term > self.current_term:
+                self.set_term(term)
+            return
+        sent = self.sent_at.pop(seq, None)
+        if sent is None:
+            # Respuesta a un mensaje de un liderazgo anterior: no cuenta en la
+            # ventana de este liderazgo
+            if term > self.current_term:
+                self.set_term(term)
+            return
+        self.inflight[peer_id] -= 1
+        # Cualquier respuesta del término actual confirma que el seguidor aún
+        # reconoce a este líder
+        if term == self.current_term and seq > self.ack_seq.get(peer_id, 0):
+            self.ack_seq[peer_id] = seq
+            self.ack_time[peer_id] = sent
+            if self.lease is not None:
+                self.update_lease()
+            self.check_read_round()
+        self.handle_append_reply(peer_id, term, success, index)
+        if self.role == LEADER and self.current_term == term:
+            self.pump(peer_id)
+
+    # Lecturas linealizables
+
+    def majority(self):
+        return (len(self.peers) + 1) // 2 + 1
+
+    # El lease vence lease segundos después del envío más antiguo entre los
+    # confirmados por la mayoría (contando al líder)
+    def update_lease(self):
+        times = sorted((self.ack_time.get(p, float('-inf')) for p in self.peers), reverse=True)
+        needed = self.majority() - 1
+        oldest = times[needed - 1] if needed else self.now()
+        self.lease_expiry = max(self.lease_expiry, oldest + self.lease)
+
+    # Índice que una lectura debe ver: commit_index si ya hay una entrada del
+    # término actual confirmada; si no, una entrada vacía del término actual
+    # (al confirmarse, todo lo anterior queda confirmado)
+    def read_index(self):
+        if self.term_at(self.commit_index) == self.current_term:
+            return self.commit_index
+        if self.term_at(self.last_log_index()) != self.current_term:
+            self.store(None, None)
+            for peer_id in self.peers:
+                self.pump(peer_id)
+        return self.last_log_index()
+
+    # callback(ok, valor) recibe el valor linealizable de key; ok es False si
+    # el nodo no es líder o dejó de serlo antes de confirmar la lectura
+    def read(self, key, callback):
+        if self.role != LEADER:
+            self.reads_failed += 1
+            callback(False, None)
+            return
+        if self.lease is not None and self.now() < self.lease_expiry \
+                and self.term_at(self.commit_index) == self.current_term:
+            self.reads_local += 1
+            callback(True, self.data.get(key))
+            # Renueva el lease antes de que venza para no caer en ReadIndex
+            if self.read_round is None and self.lease_expiry - self.now() < self.lease / 2:
+                self.start_read_round()
+            return
+        self.read_batch.append((key, callback))
+        if self.read_round is None:
+            self.start_read_round()
+
+    # Una ronda de heartbeats confirma el liderazgo para todas las lecturas
+    # acumuladas; las que lleguen mientras tanto esperan a la siguiente ronda
+    def start_read_round(self):
+        batch, self.read_batch = self.read_batch, []
+        self.read_round = (self.send_seq + 1, self.read_index(), batch)
+        self.read_rounds += 1
+        self.send_heartbeats()
+        self.check_read_round()
+
+    def check_read_round(self):
+        if self.read_round is None:
+            return
+        start, index, batch = self.read_round
+        acks = 1 + sum(1 for p in self.peers if self.ack_seq.get(p, 0) >= start)
+        if acks < self.majority():
+            return
+        self.read_round = None
+        if batch:
+            self.wait_applied(index, batch)
+        if self.read_batch:
+            self.start_read_round()
+
+    def wait_applied(self, index, batch):
+        self.ready_count += 1
+        heapq.heappush(self.ready_reads, (index, self.ready_count, batch))
+        self.serve_reads()
+
+    # Responde las lecturas confirmadas cuyo índice ya se aplicó
+    def serve_reads(self):
+        while self.ready_reads and self.ready_reads[0][0] <= self.last_applied:
+            _, _, batch = heapq.heappop(self.ready_reads)
+            for key, callback in batch:
+                callback(True, self.data.get(key))
+
+    def fail_reads(self):
+        pending = self.read_batch + [read for _, _, batch in self.ready_reads for read in batch]
+        if self.read_round is not None:
+            pending += self.read_round[2]
+        self.read_batch, self.ready_reads, self.read_round = [], [], None
+        self.lease_expiry = float('-inf')
+        self.reads_failed += len(pending)
+        for key, callback in pending:
+            callback(False, None)
+
+    # Lectura a través del log (tan cara como una escritura): responde cuando
+    # se aplica una entrada vacía añadida después de recibir la lectura
+    def log_read(self, key, callback):
+        if self.role != LEADER:
+            self.reads_failed += 1
+            callback(False, None)
+            return
+        index = self.store(None, None)
+        for peer_id in self.peers:
+            self.pump(peer_id)
+        self.wait_applied(index, [(key, callback)])
+
+    # Escritura de un cliente: callback(ok, índice) al aplicarse
+    def write(self, key, value, callback):
+        if self.role != LEADER:
+            callback(False, None)
+            return
+        index = self.store(key, value)
+        for peer_id in self.peers:
+            self.pump(peer_id)
+        self.wait_applied(index, [(None, lambda ok, _: callback(ok, index))])
+
+
+# Clúster Raft con el nodo 0 como líder y una red simulada: cada mensaje
+# llega tras latency segundos más su tamaño entre bandwidth (bytes/s), y cada
+# enlace transmite un mensaje a la vez. El tiempo es virtual (self.now).
+class RaftCluster:
+    def __init__(self, num_nodes, max_batch_entries=5, max_batch_bytes=None, window=1,
+                 latency=0.001, bandwidth=None, header_bytes=64, lease=None):
+        self.nodes = [RaftNode(i, [p for p in range(num_nodes) if p != i], max_batch_entries, max_batch_bytes, window,
+                               lease=lease)
+                      for i in range(num_nodes)]
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.header_bytes = header_bytes
+        self.now = 0.0
+        self.events = []
+        self.sequence = 0
+        self.link_free = {}
+        self.messages = 0
+        self.bytes_sent = 0
+        for node in self.nodes:
+            node.send = self.sender(node.node_id)
+            node.now = self.clock
+        self.leader = self.nodes[0]
+        self.leader.set_term(1)
+        self.leader.become_leader()
+
+    def sender(self, sender_id):
+        def send(recipient_id, method, args, size):
+            size += self.header_bytes
+            self.messages += 1
+            self.bytes_sent += size
+            start = self.now
+            if self.bandwidth is not None:
+                link = (sender_id, recipient_id)
+                start = max(start, self.link_free.get(link, 0.0)) + size / self.bandwidth
+                self.link_free[link] = start
+            self.sequence += 1
+            heapq.heappush(self.events, (start + self.latency, self.sequence, recipient_id, method, args))
+        return send
+
+    def clock(self):
+        return self.now
+
+    # Programa una llamada local (sin mensaje) en el tiempo virtual at
+    def schedule(self, at, node_id, method, *args):
+        self.sequence += 1
+        heapq.heappush(self.events, (at, self.sequence, node_id, method, args))
+
+    def propose(self, key, value):
+        return self.leader.store(key, value)
+
+    # Operaciones de clientes en el instante at; done(ok, valor, latencia)
+    # recibe la latencia en tiempo virtual. mode es 'read_index' (read, que
+    # usa el lease si el clúster lo tiene), 'log' (log_read) o 'write'
+    def client(self, at, mode, key, value=None, done=None):
+        def callback(ok, result):
+            if done is not None:
+                done(ok, result, self.now - at)
+        if mode == 'write':
+            self.schedule(at, self.leader.node_id, 'write', key, value, callback)
+        elif mode == 'log':
+            self.schedule(at, self.leader.node_id, 'log_read', key, callback)
+        else:
+            self.schedule(at, self.leader.node_id, 'read', key, callback)
+
+    # Entrega mensajes hasta que no queda ninguno; al final un heartbeat
+    # propaga el commit_index del líder a los seguidores
+    def run(self):
+        for peer_id in self.leader.peers:
+            self.leader.pump(peer_id)
+        while True:
+            while self.events:
+                self.now, _, recipient_id, method, args = heapq.heappop(self.events)
+                getattr(self.nodes[recipient_id], method)(*args)
+            if all(node.commit_index >= self.leader.commit_index for node in self.nodes):
+                break
+            self.leader.send_heartbeats()
+        return self.leader.commit_index
+
+
+# Capa de datos particionada con hashing consistente
+VIRTUAL_NODES = 64  # Posiciones de cada nodo en el anillo
+
+
+def hash_ring(value):
+    digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+# Anillo de hashing consistente: cada nodo ocupa virtual_nodes posiciones y
+# las réplicas de una clave son los primeros replication nodos distintos que
+# aparecen en el sentido de las agujas del reloj desde el hash de la clave
+class HashRing:
+    def __init__(self, node_ids=(), virtual_nodes=VIRTUAL_NODES, replication=2):
+        self.virtual_nodes = virtual_nodes
+        self.replication = replication
+        self.positions = []  # Posiciones ordenadas
+        self.owners = []     # Nodo de cada posición
+        self.node_ids = set()
+        for node_id in node_ids:
+            self.add_node(node_id)
+
+    def vnode_positions(self, node_id):
+        return [hash_ring((node_id, v)) for v in range(self.virtual_nodes)]
+
+    def add_node(self, node_id):
+        self.node_ids.add(node_id)
+        for position in self.vnode_positions(node_id):
+            i = bisect.bisect_left(self.positions, position)
+            self.positions.insert(i, position)
+            self.owners.insert(i, node_id)
+
+    def remove_node(self, node_id):
+        self.node_ids.discard(node_id)
+        for position in self.vnode_positions(node_id):
+            i = bisect.bisect_left(self.positions, position)
+            del self.positions[i]
+            del self.owners[i]
+
+    def replicas(self, key, key_hash=None):
+        if key_hash is None:
+            key_hash = hash_ring(key)
+        wanted = min(self.replication, len(self.node_ids))
+        owners = self.owners
+        i = bisect.bisect_left(self.positions, key_hash)
+        result = []
+        while len(result) < wanted:
+            owner = owners[i % len(owners)]
+            if owner not in result:
+                result.append(owner)
+            i += 1
+        return result
+
+    # Rangos (inicio, fin] de hashes cuyas réplicas incluyen a node_id: desde
+    # cada posición del nodo hacia atrás hasta encontrar replication nodos
+    # distintos de node_id
+    def ranges(self, node_id):
+        n = len(self.positions)
+        others = len(self.node_ids - {node_id})
+        wanted = min(self.replication, others)
+        if wanted < self.replication or n == 0:
+            return [(None, None)]  # El nodo tiene réplica de todas las claves
+        result = []
+        for i, owner in enumerate(self.owners):
+            if owner != node_id:
+                continue
+            seen = set()
+            j = i
+            while len(seen) < wanted:
+                j -= 1
+                if self.owners[j % n] != node_id:
+                    seen.add(self.owners[j % n])
+            result.append((self.positions[j % n], self.positions[i]))
+        return result
+
+
+# Reparte las claves entre los nodos del clúster: put/get se envían solo a
+# las réplicas de la clave. Cada nodo guarda además los hashes de sus claves
+# ordenados para poder mover solo los rangos afectados cuando un nodo entra
+# o sale del anillo.
+class ShardedCluster:
+    def __init__(self, nodes, replication=2, virtual_nodes=VIRTUAL_NODES):
+        self.nodes = {}
+        self.ring = HashRing(virtual_nodes=virtual_nodes, replication=replication)
+        self.index = {}  # node_id -> (hashes ordenados, claves en el mismo orden)
+        self.operations = Counter()  # Operaciones atendidas por cada nodo
+        self.moved = 0
         for node in nodes:
-            for recipient_id in connected_nodes[node.node_id]:
-                node.put(f'key{recipient_id}', f'value{recipient_id}')
+            self.nodes[node.node_id] = node
+            self.index[node.node_id] = ([], [])
+            self.ring.add_node(node.node_id)
 
-        # Simular partición de red
-        print("¡Se ha producido una partición de red!")
-        simulate_particio_red()
+    # La réplica primaria coordina la escritura con store (en Node, versión
+    # de Lamport, log y árbol de Merkle) y la envía a las demás como una
+    # entrada replicada. Como todas las versiones de una clave salen del
+    # mismo nodo, también son comparables con RaftNode, cuya versión es
+    # (índice, término) en su propio log. Las réplicas en down (caídas) no
+    # reciben la escritura, y si la primaria está caída se pierde; devuelve
+    # las réplicas escritas
+    def put(self, key, value, down=()):
+        key_hash = hash_ring(key)
+        owners = self.ring.replicas(key, key_hash)
+        if owners[0] in down:
+            return []
+        owners = [owner for owner in owners if owner not in down]
+        for owner in owners:
+            if key not in self.nodes[owner].data:
+                self._index_add(owner, key_hash, key)
+            self.operations[owner] += 1
+        coordinator = self.nodes[owners[0]]
+        coordinator.store(key, value)
+        entries = [(key, value, coordinator.versions[key])]
+        for owner in owners[1:]:
+            coordinator.send_entries(self.nodes[owner], entries)
+        return owners
 
-        # Simular replicación de datos en nodos afectados
+    def get(self, key):
+        owner = self.ring.replicas(key)[0]
+        self.operations[owner] += 1
+        return self.nodes[owner].get(key)
+
+    # Reconstruye el índice de un nodo desde su data (por ejemplo tras un
+    # reinicio que solo recupera lo que estaba en su WAL)
+    def reindex(self, node_id):
+        pairs = sorted((hash_ring(key), key) for key in self.nodes[node_id].data)
+        self.index[node_id] = ([key_hash for key_hash, _ in pairs], [key for _, key in pairs])
+
+    # Lleva a las réplicas disponibles la versión más reciente de cada clave,
+    # por ejemplo las escrituras que no recibieron mientras estaban caídas.
+    # Devuelve el número de copias enviadas
+    def repair(self, down=()):
+        keys = {}
+        for node_id, (hashes, node_keys) in self.index.items():
+            if node_id not in down:
+                keys.update(zip(node_keys, hashes))
+        repaired = 0
+        for key, key_hash in keys.items():
+            owners = [owner for owner in self.ring.replicas(key, key_hash) if owner not in down]
+            holders = [owner for owner in owners if key in self.nodes[owner].versions]
+            if not holders:
+                continue
+            source = self.nodes[max(holders, key=lambda owner: self.nodes[owner].versions[key])]
+            version = source.versions[key]
+            for owner in owners:
+                if self.nodes[owner].versions.get(key) == version:
+                    continue
+                if owner not in holders:
+                    self._index_add(owner, key_hash, key)
+                source.send_entries(self.nodes[owner], [(key, source.data[key], version)])
+                repaired += 1
+        return repaired
+
+    def _index_add(self, node_id, key_hash, key):
+        hashes, keys = self.index[node_id]
+        i = bisect.bisect_left(hashes, key_hash)
+        hashes.insert(i, key_hash)
+        keys.insert(i, key)
+
+    def _index_remove(self, node_id, key_hash, key):
+        hashes, keys = self.index[node_id]
+        i = bisect.bisect_left(hashes, key_hash)
+        while keys[i] != key:
+            i += 1
+        del hashes[i]
+        del keys[i]
+
+    # Claves de un nodo con hash en (inicio, fin], con vuelta al inicio del anillo
+    def _keys_in_range(self, node_id, start, end):
+        hashes, keys = self.index[node_id]
+        if start is None:
+            return list(zip(hashes, keys))
+        if start < end:
+            lo, hi = bisect.bisect_right(hashes, start), bisect.bisect_right(hashes, end)
+            return list(zip(hashes[lo:hi], keys[lo:hi]))
+        lo, hi = bisect.bisect_right(hashes, start), bisect.bisect_right(hashes, end)
+        return list(zip(hashes[lo:], keys[lo:])) + list(zip(hashes[:hi], keys[:hi]))
+
+    # Recalcula las réplicas de las claves dadas: copia cada clave a sus
+    # réplicas nuevas y la borra de los nodos que ya no son réplica
+    def _rebalance(self, affected):
+        for key_hash, key in affected:
+            owners = self.ring.replicas(key, key_hash)
+            holders = [node_id for node_id in self.nodes
+                       if key in self.nodes[node_id].data]
+            source = self.nodes[holders[0]]
+            for owner in owners:
+                if owner not in holders:
+                    self.nodes[owner].update_data(key, source.data[key], source.versions[key])
+                    self._index_add(owner, key_hash, key)
+                    self.moved += 1
+            for holder in holders:
+                if holder not in owners:
+                    self._drop(holder, key_hash, key)
+
+    def _drop(self, node_id, key_hash, key):
+        self.nodes[node_id].discard(key)
+        self._index_remove(node_id, key_hash, key)
+
+    # El nodo nuevo recibe solo las claves de los rangos que pasa a replicar
+    def add_node(self, node):
+        self.nodes[node.node_id] = node
+        self.index[node.node_id] = ([], [])
+        self.ring.add_node(node.node_id)
+        affected = {}
+        for start, end in self.ring.ranges(node.node_id):
+            for node_id in self.nodes:
+                for key_hash, key in self._keys_in_range(node_id, start, end):
+                    affected[key] = key_hash
+        self._rebalance([(key_hash, key) for key, key_hash in affected.items()])
+
+    # Las claves del nodo que sale se copian a su nueva réplica
+    def remove_node(self, node_id):
+        self.ring.remove_node(node_id)
+        hashes, keys = self.index.pop(node_id)
+        node = self.nodes.pop(node_id)
+        for key_hash, key in zip(hashes, keys):
+            owners = self.ring.replicas(key, key_hash)
+            for owner in owners:
+                if key not in self.nodes[owner].data:
+                    self.nodes[owner].update_data(key, node.data[key], node.versions[key])
+                    self._index_add(owner, key_hash, key)
+                    self.moved += 1
+        return node
+
+    # Claves por nodo (memoria) y operaciones atendidas por nodo (carga)
+    def stats(self):
+        keys = [len(node.data) for node in self.nodes.values()]
+        operations = [self.operations[node_id] for node_id in self.nodes]
+        return {
+            'nodes': len(self.nodes),
+            'total_keys': sum(keys),
+            'mean_keys': sum(keys) / len(keys),
+            'max_keys': max(keys),
+            'max_operations': max(operations),
+            'moved': self.moved,
+        }
+
+
+# Núcleo de simulación de eventos discretos
+# Los eventos (tiempo, secuencia, función, argumentos) se guardan en un heap
+# y se ejecutan en orden de tiempo virtual, sin time.sleep. Con la misma
+# semilla la simulación es determinista. Con real_time=True se espera entre
+# eventos para que el tiempo virtual avance al ritmo del reloj real
+# (multiplicado por speed), útil para demostraciones.
+class Simulator:
+    def __init__(self, seed=0, real_time=False, speed=1.0):
+        self.random = random.Random(seed)
+        self.real_time = real_time
+        self.speed = speed
+        self.now = 0.0
+        self.queue = []
+        self.sequence = 0
+        self.running = False
+        self.events = 0
+        self.wall_time = 0.0
+
+    def schedule(self, delay, callback, *args):
+        self.sequence += 1
+        heapq.heappush(self.queue, (self.now + delay, self.sequence, callback, args))
+
+    def stop(self):
+        self.running = False
+
+    def run(self, until=None):
+        self.running = True
+        start_wall = time.perf_counter()
+        start_now = self.now
+        queue = self.queue
+        while self.running and queue:
+            if until is not None and queue[0][0] > until:
+                self.now = until
+                break
+            when, _, callback, args = heapq.heappop(queue)
+            if self.real_time:
+                delay = start_wall + (when - start_now) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.now = when
+            callback(*args)
+            self.events += 1
+        self.running = False
+        self.wall_time += time.perf_counter() - start_wall
+
+    # Rendimiento en tiempo simulado y en tiempo real
+    def stats(self):
+        return {
+            'events': self.events,
+            'simulated_time': self.now,
+            'wall_time': self.wall_time,
+            'events_per_second': self.events / self.wall_time if self.wall_time else 0.0,
+            'simulated_per_wall_second': self.now / self.wall_time if self.wall_time else 0.0,
+        }
+
+
+# Topología de num_nodes nodos en grupos (componentes conexas), cada grupo
+# un anillo; el primer grupo es el mayor
+def generar_topologia(num_nodes, grupos=2):
+    topologia = {}
+    tamano = -(-num_nodes // grupos)
+    for inicio in range(0, num_nodes, tamano):
+        grupo = list(range(inicio, min(num_nodes, inicio + tamano)))
+        for i, node_id in enumerate(grupo):
+            vecinos = {grupo[i - 1], grupo[(i + 1) % len(grupo)]} - {node_id}
+            topologia[node_id] = sorted(vecinos)
+    return topologia
+
+
+# Duración de una partición de red
+def simulate_particio_red(sim):
+    return sim.random.uniform(2, 5)
+
+# Duración de la recuperación de la red
+def simulate_recuperacion_red(sim):
+    return sim.random.uniform(2, 5)
+
+# Programa los fallos y reinicios de un nodo: cada 1-3 s hay un 30% de
+# probabilidad de fallo, y el nodo se reinicia 1-3 s después. Con cluster,
+# el índice del nodo se reconstruye con lo que recuperó del WAL
+def nodos_posibles_fallos(sim, node, estado, log, cluster=None):
+    def comprobar():
+        if not estado['activa']:
+            return
+        if sim.random.random() < 0.3:  # Probabilidad de 30% de fallo
+            log(TRACE_NETWORK, 'fallo', 'Nodo {nodo} ha fallado.', nodo=node.node_id)
+            estado['caidos'].add(node.node_id)
+            sim.schedule(sim.random.uniform(1, 3), reiniciar)
+        else:
+            sim.schedule(sim.random.uniform(1, 3), comprobar)
+
+    def reiniciar():
+        log(TRACE_NETWORK, 'reinicio', 'Nodo {nodo} está reiniciando...', nodo=node.node_id)
+        node.restart()
+        if cluster is not None:
+            cluster.reindex(node.node_id)
+        estado['caidos'].discard(node.node_id)
+        estado['reinicios'] += 1
+        sim.schedule(sim.random.uniform(1, 3), comprobar)
+
+    sim.schedule(sim.random.uniform(1, 3), comprobar)
+
+# Función para ejecutar la simulación de red
+# La latencia, las particiones, los fallos y los reinicios son eventos del
+# simulador. Cada escritura va a las réplicas de su clave en un
+# ShardedCluster; se pierde si el nodo que la hace o todas sus réplicas están
+# caídos. Con verbose los eventos se registran en las trazas (la demo los
+# imprime con eco).
+def simulacion(max_iterations, directorio=None, topologia=None, semilla=0, tiempo_real=False,
+               verbose=True, persistente=True):
+    topologia = topologia or connected_nodes
+    sim = Simulator(semilla, real_time=tiempo_real)
+    temporal = None
+    if persistente:
+        # Cada nodo guarda su log en un WAL para sobrevivir a los reinicios;
+        # sin directorio se usa uno temporal que se borra al terminar
+        if directorio is None:
+            temporal = tempfile.TemporaryDirectory(prefix='raft-')
+            directorio = temporal.name
+        nodes = [RaftNode(i, wal=RaftWAL(os.path.join(directorio, f'nodo{i}'))) for i in range(len(topologia))]
+    else:
+        nodes = [RaftNode(i) for i in range(len(topologia))]
+    cluster = ShardedCluster(nodes, replication=2)
+    estado = {'iteracion': 0, 'activa': True, 'caidos': set(), 'escrituras': 0, 'perdidas': 0, 'reinicios': 0,
+              'reparadas': 0}
+
+    def log(componente, nombre, plantilla, **args):
+        if verbose and componente.activo:
+            componente.evento(nombre, plantilla, **args)
+
+    def iniciar_iteracion():
+        if estado['iteracion'] == max_iterations:
+            estado['activa'] = False
+            sim.stop()
+            return
+        estado['iteracion'] += 1
+        # Simular operaciones entre nodos conectados: cada nodo escribe una
+        # tras otra y los nodos trabajan en paralelo
+        fin = 0.0
         for node in nodes:
-            if node.node_id == 3:
-                node.replicate(nodes[4])
+            demora = 0.0
+            for recipient_id in topologia[node.node_id]:
+                latency = sim.random.uniform(0.1, 0.5)
+                demora += latency
+                sim.schedule(demora, escribir, node, recipient_id, latency)
+            fin = max(fin, demora)
+        sim.schedule(fin, particion)
+
+    def escribir(node, recipient_id, latency):
+        if node.node_id in estado['caidos']:
+            estado['perdidas'] += 1
+            return
+        key = f'key{recipient_id}'
+        replicas = cluster.put(key, f'value{recipient_id}', estado['caidos'])
+        if not replicas:
+            estado['perdidas'] += 1
+            return
+        estado['escrituras'] += 1
+        log(TRACE_DATA, 'put', 'Nodo {nodo} ha puesto datos para Nodo {destino} con latencia {latencia:.4f} segundos',
+            nodo=node.node_id, clave=key, destino=recipient_id, latencia=latency, replicas=replicas)
 
-        # Simular recuperación de la red
-        print("La red se está recuperando...")
-        simulate_recuperacion_red()
+    # Simular partición de red
+    def particion():
+        log(TRACE_NETWORK, 'particion', '¡Se ha producido una partición de red!')
+        sim.schedule(simulate_particio_red(sim), replicar)
 
-        time.sleep(2) 
+    # Simular replicación de datos en nodos afectados y recuperación de la red
+    # Cada nodo es el líder de su propio log de Raft; las réplicas de cada
+    # clave que no recibieron una escritura (estaban caídas o se reiniciaron)
+    # se ponen al día con la réplica que tiene la versión más reciente
+    def replicar():
+        reparadas = cluster.repair(estado['caidos'])
+        estado['reparadas'] += reparadas
+        log(TRACE_NETWORK, 'replicacion', 'Replicando datos: {copias} copias enviadas a réplicas desactualizadas.',
+            copias=reparadas)
+        log(TRACE_NETWORK, 'recuperando', 'La red se está recuperando...')
+        sim.schedule(simulate_recuperacion_red(sim), recuperada)
+
+    def recuperada():
+        log(TRACE_NETWORK, 'recuperada', 'La red se ha recuperado.')
+        sim.schedule(2, iniciar_iteracion)
+
+    sim.schedule(0, iniciar_iteracion)
+    for node in nodes:
+        nodos_posibles_fallos(sim, node, estado, log, cluster)
+    try:
+        sim.run()
+    finally:
+        for node in nodes:
+            if node.wal is not None:
+                node.wal.close()
+        if temporal is not None:
+            temporal.cleanup()
+    resultado = sim.stats()
+    resultado.update({
+        'iterations': estado['iteracion'],
+        'writes': estado['escrituras'],
+        'lost_writes': estado['perdidas'],
+        'restarts': estado['reinicios'],
+        'repaired': estado['reparadas'],
+    })
+    return resultado
 
 # Ejecutar la simulación con un máximo de 5 iteraciones
+# (python Pregunta-4.py --tiempo-real la ejecuta al ritmo del reloj real)
 if __name__ == "__main__":
+    # La demo imprime los eventos; con --trazas además los guarda para chrome://tracing
+    trazas.TRAZADOR.configurar(eco=True)
     max_iterations = 5
-    simulacion(max_iterations)
\ No newline at end of file
+    simulacion(max_iterations, tiempo_real='--tiempo-real' in sys.argv)
+    if '--trazas' in sys.argv:
+        trazas.TRAZADOR.exportar_chrome('trazas-pregunta4.json')
@@ -0,0 +1,219 @@
+import importlib.util
+import os
+
+# Pruebas de Pregunta-4.py (python -m pytest desde esta carpeta)
+
+_ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Pregunta-4.py')
+_spec = importlib.util.spec_from_file_location('pregunta_4', _ruta)
+pregunta_4 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pregunta_4)
+
+
+def escribir(cluster, key, value):
+    resultado = []
+    cluster.client(cluster.now, 'write', key, value, done=lambda ok, indice, demora: resultado.append(ok))
+    cluster.run()
+    return resultado
+
+
+def leer(cluster, node_id, key):
+    resultado = []
+    cluster.schedule(cluster.now, node_id, 'read', key, lambda ok, valor: resultado.append((ok, valor)))
+    cluster.run()
+    return resultado
+
+
+# El nodo 1 es elegido en el término 2 con el voto del nodo 2 y confirma k=2
+def cambiar_lider(cluster):
+    cluster.nodes[2].set_term(2, 1)
+    cluster.nodes[1].set_term(2, 1)
+    cluster.nodes[1].become_leader()
+    cluster.leader = cluster.nodes[1]
+
+
+def test_lider_depuesto_no_responde_lecturas_obsoletas():
+    cluster = pregunta_4.RaftCluster(3)
+    assert escribir(cluster, 'k', 1) == [True]
+    assert leer(cluster, 0, 'k') == [(True, 1)]
+    cambiar_lider(cluster)
+    assert escribir(cluster, 'k', 2) == [True]
+    antiguo = cluster.nodes[0]
+    assert antiguo.role == pregunta_4.FOLLOWER
+    assert leer(cluster, 0, 'k') == [(False, None)]
+    assert leer(cluster, 1, 'k') == [(True, 2)]
+    assert antiguo.log == cluster.nodes[1].log == [(1, 'k', 1), (2, 'k', 2)]
+
+
+# El líder antiguo aún no recibió nada del nuevo: su ronda de ReadIndex
+# descubre el término mayor y la lectura falla sin añadir entradas
+def test_ronda_de_lectura_descubre_termino_mayor():
+    cluster = pregunta_4.RaftCluster(3, lease=0.01)
+    assert escribir(cluster, 'k', 1) == [True]
+    cambiar_lider(cluster)
+    antiguo = cluster.nodes[0]
+    antiguo.lease_expiry = float('-inf')
+    assert leer(cluster, 0, 'k') == [(False, None)]
+    assert antiguo.role == pregunta_4.FOLLOWER
+    assert antiguo.current_term == 2
+    assert antiguo.log == [(1, 'k', 1)]
+    # Un seguidor no sirve lecturas ni escrituras
+    assert leer(cluster, 2, 'k') == [(False, None)]
+
+
+# Con varios AppendEntries en vuelo y latencia variable, un mensaje antiguo
+# llega después de uno más reciente sin hacer retroceder commit_index
+def test_commit_index_no_retrocede():
+    cluster = pregunta_4.RaftCluster(5, 8, None, 8)
+    aleatorio = pregunta_4.random.Random(0)
+    enviar = cluster.sender
+
+    def sender(sender_id):
+        send = enviar(sender_id)
+
+        def variable(recipient_id, method, args, size):
+            cluster.latency = aleatorio.uniform(0.0001, 0.01)
+            send(recipient_id, method, args, size)
+        return variable
+
+    for node in cluster.nodes:
+        node.send = sender(node.node_id)
+    retrocesos = []
+    for node in cluster.nodes[1:]:
+        aplicar = node.apply_committed
+
+        def vigilado(node=node, aplicar=aplicar):
+            if node.commit_index < node.last_applied:
+                retrocesos.append(node.node_id)
+            aplicar()
+        node.apply_committed = vigilado
+    for i in range(3000):
+        cluster.propose(f'key{i % 100}', i)
+    cluster.run()
+    assert not retrocesos
+    assert all(node.commit_index == 3000 for node in cluster.nodes)
+
+
+# Anti-entropía entre dos nodos que son líderes de su propio log
+def test_anti_entropia_entre_lideres_sin_peers():
+    nodes = [pregunta_4.RaftNode(i) for i in range(5)]
+    nodes[3].store('key4', 'value4')
+    nodes[4].store('key3', 'value3')
+    nodes[3].anti_entropy(nodes[4])
+    assert nodes[4].get('key4') == 'value4'
+    assert nodes[4].log == [(0, 'key3', 'value3')]
+
+
+# La escritura la coordina la primera réplica con store: las demás reciben
+# la misma versión de Lamport y terminan con el mismo árbol de Merkle
+def test_sharded_put_usa_store_y_replica_la_version():
+    nodes = [pregunta_4.Node(i) for i in range(5)]
+    cluster = pregunta_4.ShardedCluster(nodes, replication=2)
+    for i in range(3):
+        assert len(cluster.put('k', i)) == 2
+    primera, segunda = cluster.ring.replicas('k')
+    coordinador = nodes[primera]
+    assert coordinador.versions['k'] == (3, primera)
+    assert coordinador.log == nodes[segunda].log == [('k', i, (i + 1, primera)) for i in range(3)]
+    assert nodes[segunda].clock == 3
+    assert coordinador.merkle == nodes[segunda].merkle
+    assert cluster.get('k') == 2
+    assert sum('k' in node.data for node in nodes) == 2
+
+
+# Una réplica secundaria caída no recibe la escritura; repair la pone al día
+def test_sharded_repair_tras_replica_caida():
+    nodes = [pregunta_4.RaftNode(i) for i in range(5)]
+    cluster = pregunta_4.ShardedCluster(nodes, replication=2)
+    cluster.put('k', 1)
+    primera, segunda = cluster.ring.replicas('k')
+    assert cluster.put('k', 2, down={segunda}) == [primera]
+    assert nodes[segunda].get('k') == 1
+    # Sin la primaria la escritura se pierde
+    assert cluster.put('k', 3, down={primera}) == []
+    assert cluster.repair() == 1
+    assert nodes[primera].get('k') == nodes[segunda].get('k') == 2
+    assert nodes[segunda].versions['k'] == (2, 0)
+    assert cluster.repair() == 0
+    resultado = pregunta_4.simulacion(2, verbose=False, persistente=False)
+    assert resultado['iterations'] == 2
+    assert resultado['writes'] > 0
+
+
+# Un nodo sin peers vuelve a aplicar sus entradas durables al reiniciarse
+def test_reinicio_sin_peers_recupera_data(tmp_path):
+    nodo = pregunta_4.RaftNode(0, wal=pregunta_4.RaftWAL(str(tmp_path)))
+    nodo.store('a', 1)
+    nodo.store('b', 2)
+    nodo.restart()
+    assert nodo.data == {'a': 1, 'b': 2}
+    assert nodo.commit_index == 2
+    nodo.wal.close()
+
+
+# Tras compactar el log, un seguidor nuevo recibe la instantánea
+# (InstallSnapshot) y después las entradas posteriores
+def test_seguidor_nuevo_tras_compactar_recibe_instantanea(tmp_path):
+    lider = pregunta_4.RaftNode(0, [1])
+    lider.set_term(1)
+    lider.become_leader()
+    seguidor = pregunta_4.RaftNode(1)
+    for i in range(10):
+        lider.store(f'key{i}', i)
+    lider.replicate(seguidor)
+    assert lider.take_snapshot() == 10
+    assert lider.term_at(3) is None
+    lider.store('key10', 10)
+    nuevo = pregunta_4.RaftNode(2, wal=pregunta_4.RaftWAL(str(tmp_path)))
+    lider.replicate(nuevo)
+    lider.replicate(nuevo)  # El siguiente AppendEntries lleva el commit_index
+    assert nuevo.log_start == 10
+    assert nuevo.data == {f'key{i}': i for i in range(11)}
+    nuevo.restart()
+    assert nuevo.log_start == 10 and nuevo.last_log_index() == 11
+    nuevo.wal.close()
+
+
+# El nodo 2 pierde su disco y vuelve vacío: el líder retrocede next_index
+# hasta antes de log_start y le envía la instantánea
+def test_cluster_envia_instantanea_a_seguidor_vacio():
+    cluster = pregunta_4.RaftCluster(3, window=4)
+    lider = cluster.leader
+    for i in range(50):
+        cluster.propose(f'key{i}', i)
+    cluster.run()
+    assert lider.take_snapshot() == 50
+    vacio = pregunta_4.RaftNode(2, [0, 1])
+    vacio.send = cluster.sender(2)
+    vacio.now = cluster.clock
+    cluster.nodes[2] = vacio
+    cluster.propose('key50', 50)
+    cluster.run()
+    assert vacio.log_start == 50
+    assert vacio.data == lider.data
+    assert vacio.commit_index == 51
+
+
+# Un líder que vuelve a ser elegido ignora las respuestas a los AppendEntries
+# de su liderazgo anterior: inflight no baja de 0 ni se supera la ventana
+def test_reelegido_ignora_respuestas_del_termino_anterior():
+    cluster = pregunta_4.RaftCluster(3, 1, None, 2)
+    lider = cluster.leader
+    maximo = []
+    enviar = lider.send
+
+    def vigilado(recipient_id, method, args, size):
+        enviar(recipient_id, method, args, size)
+        maximo.append(max(lider.inflight.values()))
+    lider.send = vigilado
+    for i in range(20):
+        cluster.propose(f'key{i}', i)
+    for peer_id in lider.peers:
+        lider.pump(peer_id)
+    # Se reelige con mensajes aún en vuelo
+    lider.set_term(2)
+    lider.become_leader()
+    cluster.propose('key20', 20)
+    cluster.run()
+    assert min(lider.inflight.values()) == 0
+    assert max(maximo) <= 2
+    assert all(node.commit_index == 21 for node in cluster.nodes)
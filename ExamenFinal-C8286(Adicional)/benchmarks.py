@@ -0,0 +1,1166 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import gc
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import pickle
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from queue import PriorityQueue
+
+import trazas
+
+# Suite de microbenchmarks de las cuatro preguntas
+# Cada caso ejecuta un algoritmo a varias escalas (número de nodos, volumen
+# de mensajes, tamaño del heap) y mide operaciones por segundo, percentiles
+# de latencia por llamada y pico de memoria (tracemalloc, en una segunda
+# ejecución para no contaminar los tiempos). Los resultados se guardan en
+# JSON y el modo comparar marca las regresiones entre dos ejecuciones.
+# Las trazas están desactivadas salvo con --trazas; la opción se guarda en
+# los resultados y comparar rechaza dos ejecuciones con distinta opción.
+# Uso:
+#   python benchmarks.py [--escala pequena|mediana|grande] [--casos nombre ...]
+#                        [--repeticiones N] [--sin-memoria] [--trazas] [--salida resultados.json]
+#   python benchmarks.py comparar base.json nuevo.json [--umbral 0.10]
+
+_DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+# Carga un archivo de las preguntas sin ejecutar su demo (los nombres con
+# guion no son nombres de módulo válidos para import)
+def cargar(nombre, carpeta, archivo):
+    spec = importlib.util.spec_from_file_location(nombre, os.path.join(_DIRECTORIO, carpeta, archivo))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+pregunta_1 = cargar('pregunta_1', 'Pregunta-1', 'Pregunta_1.py')
+pregunta_2 = cargar('pregunta_2', 'Pregunta-2', 'Pregunta-2.py')
+pregunta_3 = cargar('pregunta_3', 'Pregunta-3', 'Pregunta-3.py')
+pregunta_4 = cargar('pregunta_4', 'Pregunta-4', 'Pregunta-4.py')
+
+# Pregunta_1 configura logging en nivel DEBUG al importarse
+logging.disable(logging.CRITICAL)
+
+
+# Descarta la salida de los print de los algoritmos durante las mediciones
+@contextlib.contextmanager
+def silencio():
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+
+# Percentil p (0-100) de una lista de valores
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+# Implementaciones anteriores con las que se comparan las nuevas
+
+# Pregunta 1: PriorityQueue consultada desde el executor. Se añade un
+# contador de desempate porque comparar dos eventos (dict) con la misma
+# prioridad lanza TypeError en la versión original.
+class ColaExecutor:
+    def __init__(self):
+        self.evento_prio = PriorityQueue()
+        self.secuencia = itertools.count()
+
+    def put_nowait(self, prioridad, evento):
+        self.evento_prio.put((prioridad, next(self.secuencia), evento))
+
+    async def get(self):
+        loop = asyncio.get_running_loop()
+        prioridad, _, evento = await loop.run_in_executor(None, self.evento_prio.get)
+        return prioridad, evento
+
+
+# Pregunta 2: difusión causal que recorre todo el buffer tras cada llegada
+# buscando mensajes entregables (la alternativa sin índice de pendientes)
+class DifusionReescaneo:
+    def __init__(self, num_nodos, node_id):
+        self.entregados = [0] * num_nodos
+        self.node_id = node_id
+        self.buffer = []
+        self.entregas = 0
+
+    def entregable(self, emisor, vector):
+        if vector[emisor] != self.entregados[emisor] + 1:
+            return False
+        return all(v <= e for k, (v, e) in enumerate(zip(vector, self.entregados)) if k != emisor)
+
+    def receive(self, emisor, vector, payload):
+        self.buffer.append((emisor, vector))
+        progreso = True
+        while progreso:
+            progreso = False
+            for i, (emisor, vector) in enumerate(self.buffer):
+                if self.entregable(emisor, vector):
+                    self.entregados[emisor] = vector[emisor]
+                    self.entregas += 1
+                    del self.buffer[i]
+                    progreso = True
+                    break
+
+
+def difundir_reescaneo(node, payload):
+    node.entregados[node.node_id] += 1
+    return node.node_id, list(node.entregados), payload
+
+
+# Pregunta 4: replicación original, reenvía el log completo y el receptor lo
+# añade al suyo
+def replicar_original(origen, destino):
+    for entrada in origen.log:
+        destino.data[entrada[0]] = entrada[1]
+    destino.log.extend(origen.log)
+    return len(origen.log), len(pickle.dumps(origen.log))
+
+
+# Motor local que cuenta cuántas celdas se ejecutan realmente
+class EjecutorContador(pregunta_1.EjecutorLocal):
+    def __init__(self):
+        super().__init__(retardo=0)
+        self.ejecuciones = 0
+
+    async def ejecutar(self, codigo, entradas=None, definidos=(), timeout=None):
+        self.ejecuciones += 1
+        return await super().ejecutar(codigo, entradas, definidos, timeout)
+
+
+# Casos
+# Cada caso devuelve (operaciones, latencias) o (operaciones, latencias,
+# métricas): el número de unidades de trabajo realizadas, la duración en
+# segundos de cada llamada medida y, opcionalmente, un diccionario con
+# métricas propias del algoritmo (mensajes por entrada, pausas, bytes...).
+# Una llamada puede abarcar varias operaciones (por ejemplo, una ronda de
+# Raft). Cuando las latencias se solapan (eventos en vuelo a la vez), el
+# rendimiento en tiempo real va en las métricas.
+
+# Pregunta 1: put_nowait y get_nowait sobre la cola de prioridad del notebook
+def caso_cola_eventos(eventos, semilla=0):
+    cola = pregunta_1.ColaEventos()
+    aleatorio = random.Random(semilla)
+    prioridades = [aleatorio.randint(0, 5) for _ in range(eventos)]
+    latencias = []
+    for i, prioridad in enumerate(prioridades):
+        t = time.perf_counter()
+        cola.put_nowait(prioridad, i)
+        latencias.append(time.perf_counter() - t)
+    for _ in range(eventos):
+        t = time.perf_counter()
+        cola.get_nowait()
+        latencias.append(time.perf_counter() - t)
+    return 2 * eventos, latencias
+
+
+# Pregunta 1: un productor envía ráfagas de eventos y un consumidor los
+# despacha, con la cola de asyncio o con la PriorityQueue consultada desde el
+# executor; la latencia va desde que se encola cada evento hasta que se despacha
+def caso_despacho_cola(eventos, variante, rafaga=100, semilla=0):
+    cola = ColaExecutor() if variante == 'executor' else pregunta_1.ColaEventos()
+    aleatorio = random.Random(semilla)
+    latencias = []
+
+    async def consumidor():
+        for _ in range(eventos):
+            _, evento = await cola.get()
+            latencias.append(time.perf_counter() - evento['t'])
+
+    async def productor():
+        for inicio in range(0, eventos, rafaga):
+            for _ in range(min(rafaga, eventos - inicio)):
+                tipo = aleatorio.choice(('add_cell', 'execute'))
+                cola.put_nowait(aleatorio.randint(0, 5), {'type': tipo, 't': time.perf_counter()})
+            await asyncio.sleep(0)
+
+    async def reproducir():
+        tarea = asyncio.create_task(consumidor())
+        await productor()
+        await tarea
+
+    t0 = time.perf_counter()
+    asyncio.run(reproducir())
+    return eventos, latencias, {'eventos_por_seg': eventos / (time.perf_counter() - t0)}
+
+
+# Pregunta 1: celdas CPU-bound con el motor local o con procesos mientras una
+# corrutina mide cuánto se retrasa el bucle de eventos (ticks de 10 ms)
+def caso_ejecutores(celdas, motor, iteraciones=300000):
+    codigo = f'sum(i * i for i in range({iteraciones}))'
+    latencias = []
+    retrasos = []
+
+    async def medir_celdas():
+        ejecutor = pregunta_1.EjecutorLocal(retardo=0) if motor == 'local' else pregunta_1.EjecutorProcesos()
+        activo = True
+
+        async def monitor():
+            while activo:
+                t = time.perf_counter()
+                await asyncio.sleep(0.01)
+                retrasos.append(time.perf_counter() - t - 0.01)
+
+        async def celda():
+            t = time.perf_counter()
+            await ejecutor.ejecutar(codigo)
+            latencias.append(time.perf_counter() - t)
+
+        tarea_monitor = asyncio.create_task(monitor())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(celda() for _ in range(celdas)))
+        total = time.perf_counter() - t0
+        activo = False
+        await tarea_monitor
+        await ejecutor.cerrar()
+        return total
+
+    total = asyncio.run(medir_celdas())
+    return celdas, latencias, {
+        'celdas_por_seg': celdas / total,
+        'retraso_max_bucle_ms': max(retrasos, default=0.0) * 1000,
+    }
+
+
+# Pregunta 1: bucle de eventos del Jupyter_Notebook reproduciendo una sesión
+# con re-ejecuciones repetidas de las mismas celdas, con y sin coalescer;
+# cada llamada es el tiempo hasta despachar un lote
+def caso_notebook(celdas, ejecuciones, coalescer=True, lote=500, semilla=0):
+    aleatorio = random.Random(semilla)
+    eventos = [(0, {'type': 'add_cell', 'code': f'x{i} = {i} * 2'}) for i in range(celdas)]
+    eventos += [(1, {'type': 'execute', 'celda_id': aleatorio.randint(1, celdas)})
+                for _ in range(ejecuciones)]
+    latencias = []
+    ejecutor = EjecutorContador()
+
+    async def reproducir():
+        notebook = pregunta_1.Jupyter_Notebook(ejecutor=ejecutor, coalescer=coalescer)
+        bucle = asyncio.create_task(notebook.event_loop())
+        for inicio in range(0, len(eventos), lote):
+            t = time.perf_counter()
+            notebook.add_eventos(eventos[inicio:inicio + lote])
+            while notebook.tareas or not notebook.evento_prio.empty():
+                await asyncio.sleep(0)
+            latencias.append(time.perf_counter() - t)
+        notebook.cerrar()
+        await bucle
+        return notebook.coalescidos
+
+    coalescidos = asyncio.run(reproducir())
+    return len(eventos), latencias, {'ejecuciones': ejecutor.ejecuciones, 'coalescidos': coalescidos}
+
+
+# Pregunta 2: instantáneas de Chandy-Lamport superpuestas mientras los robots
+# intercambian mensajes; cada latencia es el tiempo de compleción de una
+# instantánea y se comprueba que cada una conserva el total
+def caso_instantaneas(robots, instantaneas=5, semilla=0):
+    runtime = pregunta_2.SnapshotRuntime(robots)
+    runtime.start()
+    activo = True
+
+    def trafico():
+        aleatorio = random.Random(semilla)
+        while activo:
+            for _ in range(100):
+                runtime.transfer(aleatorio.randrange(robots), aleatorio.randrange(4), aleatorio.randint(1, 10))
+            time.sleep(0.001)
+
+    hilo = threading.Thread(target=trafico)
+    hilo.start()
+    try:
+        time.sleep(0.05)
+        aleatorio = random.Random(semilla)
+        ids = [runtime.initiate_snapshot(aleatorio.randrange(robots)) for _ in range(instantaneas)]
+        latencias = []
+        consistentes = True
+        for snapshot_id in ids:
+            global_snapshot = runtime.wait_snapshot(snapshot_id, timeout=120)
+            total = sum(estado + sum(sum(m) for m in canales.values())
+                        for estado, canales in global_snapshot.values())
+            consistentes = consistentes and total == robots * 100
+            latencias.append(runtime.collector.duration(snapshot_id))
+    finally:
+        activo = False
+        hilo.join()
+        runtime.stop()
+    return instantaneas, latencias, {'consistentes': consistentes}
+
+
+# Historia sintética de instantáneas de una flota: en cada instantánea cambia
+# una fracción pequeña de los robots
+def historia_instantaneas(num_robots, num_instantaneas, cambios=0.02, semilla=0):
+    aleatorio = random.Random(semilla)
+    estado = {p: (100, {}) for p in range(num_robots)}
+    for _ in range(num_instantaneas):
+        for _ in range(max(1, int(num_robots * cambios))):
+            p = aleatorio.randrange(num_robots)
+            estado[p] = (aleatorio.randint(0, 200), {(p + 1) % num_robots: [aleatorio.randint(1, 5)]})
+        yield dict(estado)
+
+
+# Pregunta 2: escrituras en el almacén de instantáneas con deltas y lecturas
+# de instantáneas al azar; compara los bytes en disco con las copias completas
+def caso_almacen_instantaneas(robots, instantaneas, cargas=100, semilla=0):
+    directorio = tempfile.mkdtemp()
+    try:
+        almacen = pregunta_2.SnapshotStore(os.path.join(directorio, 'instantaneas'))
+        bytes_completos = 0
+        latencias = []
+        for snapshot_id, instantanea in enumerate(historia_instantaneas(robots, instantaneas, semilla=semilla)):
+            t = time.perf_counter()
+            almacen.append(snapshot_id, instantanea)
+            latencias.append(time.perf_counter() - t)
+            bytes_completos += len(pickle.dumps(instantanea))
+        aleatorio = random.Random(semilla + 1)
+        cargas_latencias = []
+        for _ in range(cargas):
+            t = time.perf_counter()
+            almacen.load(aleatorio.randrange(instantaneas))
+            cargas_latencias.append(time.perf_counter() - t)
+        metricas = {
+            'bytes_disco': almacen.size_bytes(),
+            'bytes_copias_completas': bytes_completos,
+            'carga_p99_ms': percentil(cargas_latencias, 99) * 1000,
+        }
+        almacen.close()
+    finally:
+        shutil.rmtree(directorio)
+    return instantaneas + cargas, latencias + cargas_latencias, metricas
+
+
+# Pregunta 2: envío y recepción de un mensaje entre robots con cada variante
+# de reloj vectorial
+def caso_relojes_vectoriales(robots, mensajes, variante, semilla=0):
+    if variante == 'original':
+        relojes = [pregunta_2.VectorClock(robots, i) for i in range(robots)]
+    else:
+        relojes = [pregunta_2.CompactVectorClock(robots, i, sparse=variante == 'deltas') for i in range(robots)]
+    aleatorio = random.Random(semilla)
+    pares = [aleatorio.sample(range(robots), 2) for _ in range(mensajes)]
+    latencias = []
+    for origen, destino in pares:
+        t = time.perf_counter()
+        marca = relojes[origen].send_event(destino) if variante == 'deltas' else relojes[origen].send_event()
+        relojes[destino].receive_event(marca)
+        latencias.append(time.perf_counter() - t)
+    return mensajes, latencias
+
+
+# Pregunta 2: comparación en lote de marcas de tiempo registradas (con NumPy
+# si está instalado)
+def caso_comparar_relojes(robots, comparaciones, semilla=0):
+    aleatorio = random.Random(semilla)
+    marcas = [[aleatorio.randrange(50) for _ in range(robots)] for _ in range(200)]
+    a = [aleatorio.choice(marcas) for _ in range(comparaciones)]
+    b = [aleatorio.choice(marcas) for _ in range(comparaciones)]
+    if pregunta_2.np is not None:
+        # Un registro grande de marcas de tiempo ya estaría guardado como matriz
+        a = pregunta_2.np.asarray(a, dtype=pregunta_2.np.uint64)
+        b = pregunta_2.np.asarray(b, dtype=pregunta_2.np.uint64)
+    t = time.perf_counter()
+    pregunta_2.compare_clocks_batch(a, b)
+    latencias = [time.perf_counter() - t]
+    return comparaciones, latencias, {'motor': 'numpy' if pregunta_2.np is not None else 'array'}
+
+
+# Pregunta 2: llegadas a la difusión causal con los mensajes de cada nodo
+# en vuelo desordenados (cada llamada es una recepción, con sus entregas).
+# La variante 'reescaneo' recorre todo el buffer tras cada llegada.
+def caso_difusion_causal(nodos, difusiones, variante='indexada', reorden=1.0, en_vuelo=1000, semilla=0):
+    grupo = pregunta_2.CausalGroup(nodos, reorder=reorden, seed=semilla)
+    if variante == 'reescaneo':
+        grupo.nodes = [DifusionReescaneo(nodos, i) for i in range(nodos)]
+        for node in grupo.nodes:
+            node.broadcast = functools.partial(difundir_reescaneo, node)
+    aleatorio = random.Random(semilla)
+    for _ in range(difusiones):
+        grupo.broadcast(aleatorio.randrange(nodos), None)
+    mensajes = list(grupo.in_flight)
+    # Desorden acotado: con probabilidad reorden cada mensaje se adelanta o
+    # atrasa hasta en_vuelo posiciones
+    claves = [i + (aleatorio.randrange(en_vuelo) if aleatorio.random() < reorden else 0)
+              for i in range(len(mensajes))]
+    mensajes = [mensajes[i] for i in sorted(range(len(mensajes)), key=lambda i: (claves[i], i))]
+    latencias = []
+    for recipient_id, sender_id, vector, payload in mensajes:
+        node = grupo.nodes[recipient_id]
+        t = time.perf_counter()
+        node.receive(sender_id, vector, payload)
+        latencias.append(time.perf_counter() - t)
+    if variante == 'reescaneo':
+        return len(mensajes), latencias, {'entregas': sum(node.entregas for node in grupo.nodes)}
+    estadisticas = [node.stats() for node in grupo.nodes]
+    entregas = sum(e['delivered'] for e in estadisticas) - difusiones
+    return len(mensajes), latencias, {
+        'entregas': entregas,
+        'retenidos': sum(e['buffered'] for e in estadisticas) / entregas,
+        'buffer_medio': sum(e['mean_pending'] for e in estadisticas) / nodos,
+        'buffer_max': max(e['max_pending'] for e in estadisticas),
+    }
+
+
+# Pregunta 2: rondas de exclusión mutua de Raymond en un árbol k-ario (aridad
+# 1 = cadena, la más profunda) con varios nodos pidiendo el token a la vez
+def caso_raymond(nodos, contencion, aridad=2, rondas=50, semilla=0):
+    arbol = pregunta_2.RaymondTree(pregunta_2.kary_tree(nodos, aridad))
+    aleatorio = random.Random(semilla)
+    latencias = []
+    for _ in range(rondas):
+        pedidos = aleatorio.sample(range(nodos), contencion)
+        t = time.perf_counter()
+        for node_id in pedidos:
+            arbol.request_access(node_id)
+        arbol.run()
+        latencias.append(time.perf_counter() - t)
+    return arbol.cs_entries, latencias, {'mensajes_por_entrada': arbol.messages_sent / arbol.cs_entries}
+
+
+# Pregunta 2: asignaciones en el heap generacional (las pausas de recolección
+# aparecen en los percentiles altos)
+def caso_heap_generacional(joven, asignaciones, semilla=0):
+    heap = pregunta_2.GenerationalHeap(joven, joven * 4)
+    aleatorio = random.Random(semilla)
+    vivos = max(10, joven // 20)
+    raices = [heap.add_root(heap.allocate(i)) for i in range(vivos)]
+    latencias = []
+    for i in range(asignaciones):
+        destino = heap.root(raices[aleatorio.randrange(vivos)])
+        k = aleatorio.randrange(vivos)
+        t = time.perf_counter()
+        direccion = heap.allocate(i, (destino,))
+        heap.remove_root(raices[k])
+        raices[k] = heap.add_root(direccion)
+        latencias.append(time.perf_counter() - t)
+    estadisticas = heap.stats()
+    return asignaciones, latencias, {
+        'menor_p99_ms': estadisticas['minor']['p99_ms'],
+        'menor_max_ms': estadisticas['minor']['max_ms'],
+        'mayor_max_ms': estadisticas['major']['max_ms'],
+        'recolecciones_mayores': estadisticas['major']['count'],
+    }
+
+
+# Pregunta 3: entrada y salida de la sección crítica con RicartAgrawalaMutex,
+# clásico o con la optimización de Roucairol-Carvalho. La carga elige el
+# nodo al azar, en ronda o repitiendo el mismo nodo el 90% de las veces.
+def caso_ricart_agrawala(nodos, entradas, carga='aleatoria', roucairol_carvalho=False, semilla=0):
+    red = pregunta_3.Network(nodos)
+    for node in red.nodes:
+        node.mutex.roucairol_carvalho = roucairol_carvalho
+    aleatorio = random.Random(semilla)
+    orden = []
+    actual = 0
+    for i in range(entradas):
+        if carga == 'ronda':
+            actual = i % nodos
+        elif carga == 'aleatoria' or aleatorio.random() >= 0.9:
+            actual = aleatorio.randrange(nodos)
+        orden.append(actual)
+    latencias = []
+    for node_id in orden:
+        t = time.perf_counter()
+        red.nodes[node_id].request_cs()
+        red.nodes[node_id].release_cs()
+        latencias.append(time.perf_counter() - t)
+    return entradas, latencias, {'mensajes_por_entrada': sum(red.messages_sent.values()) / entradas}
+
+
+# Pregunta 3: mensajes entre nodos al azar; después, hasta 100 nodos piden la
+# sección crítica a la vez. La red es un MailboxTransport (un buzón por nodo
+# en asyncio) o una ProcessNetwork con los nodos repartidos entre procesos
+async def _trafico_buzones(nodos, mensajes, latencia, semilla):
+    transporte = pregunta_3.MailboxTransport(latency=latencia)
+    red = pregunta_3.Network(nodos, transport=transporte)
+    aleatorio = random.Random(semilla)
+    transporte.start()
+    t0 = time.perf_counter()
+    for i in range(mensajes):
+        red.post(i % nodos, 'send_message', aleatorio.randrange(nodos), i)
+    await transporte.wait_idle()
+    trafico = time.perf_counter() - t0
+    contendientes = min(nodos, 100)
+    t0 = time.perf_counter()
+    for node_id in range(contendientes):
+        red.post(node_id, 'request_cs')
+    await transporte.wait_idle()
+    contencion = time.perf_counter() - t0
+    await transporte.stop()
+    entradas = sum(node.mutex.cs_entries for node in red.nodes)
+    return transporte.delivered, trafico, contencion, entradas == contendientes
+
+
+def caso_transporte(nodos, mensajes, retardo_ms=0, semilla=0):
+    if retardo_ms:
+        latencia = pregunta_3.uniform_latency(0, retardo_ms / 1000, semilla)
+    else:
+        latencia = pregunta_3.no_latency
+    entregados, trafico, contencion, completas = asyncio.run(_trafico_buzones(nodos, mensajes, latencia, semilla))
+    return entregados, [trafico], {'contencion_ms': contencion * 1000, 'completas': completas}
+
+
+def caso_multiproceso(nodos, mensajes, trabajadores, semilla=0):
+    aleatorio = random.Random(semilla)
+    with pregunta_3.ProcessNetwork(nodos, num_workers=trabajadores) as red:
+        t0 = time.perf_counter()
+        for i in range(mensajes):
+            red.post(i % nodos, 'send_message', aleatorio.randrange(nodos), i)
+        red.wait_idle()
+        trafico = time.perf_counter() - t0
+        entregados = red.messages_delivered()
+        contendientes = min(nodos, 100)
+        t0 = time.perf_counter()
+        for node_id in range(contendientes):
+            red.post(node_id, 'request_cs')
+        red.wait_idle()
+        contencion = time.perf_counter() - t0
+        entradas = sum(red.gather('mutex.cs_entries'))
+    return entregados, [trafico], {
+        'contencion_ms': contencion * 1000,
+        'completas': entradas == contendientes,
+        # Tamaño de un REQUEST en la red frente al mismo mensaje con pickle
+        'bytes_solicitud': len(pregunta_3.encode_call(1, 'receive_request', (12, 3))),
+        'bytes_solicitud_pickle': len(pickle.dumps(('receive_request', (12, 3)))),
+    }
+
+
+# Pregunta 3: asignaciones en el CheneyCollector con un conjunto vivo fijo;
+# el semiespacio tiene el cuádruple del tamaño del conjunto vivo
+def caso_cheney(vivos, asignaciones, semilla=0):
+    tamano_objeto = pregunta_3.HEADER.size + 2 * pregunta_3.REF.size + 8
+    heap = pregunta_3.CheneyCollector(size=vivos * tamano_objeto * 4)
+    compartido = heap.add_root(heap.allocate(b'compartido'))
+    anterior = None
+    raices = []
+    for i in range(vivos):
+        anterior = heap.allocate(i.to_bytes(8, 'little'), (anterior, heap.root(compartido)))
+        raices.append(heap.add_root(anterior))
+    aleatorio = random.Random(semilla)
+    heap.pauses.clear()
+    latencias = []
+    for i in range(asignaciones):
+        destino = heap.root(raices[aleatorio.randrange(vivos)])
+        datos = i.to_bytes(8, 'little')
+        t = time.perf_counter()
+        heap.allocate(datos, (destino, None))
+        latencias.append(time.perf_counter() - t)
+    estadisticas = heap.stats()
+    return asignaciones, latencias, {
+        'recolecciones': len(heap.pauses),
+        'pausa_media_ms': estadisticas['mean_pause_ms'],
+        'pausa_p99_ms': estadisticas['p99_pause_ms'],
+        'pausa_max_ms': estadisticas['max_pause_ms'],
+    }
+
+
+# Pregunta 3: terminaciones de una computación difusa en árbol y entrega de
+# reconocimientos en lotes con el TerminationDetector; la última llamada es
+# la latencia de detección del fin
+def caso_terminacion(fanout, profundidad, lote=1000, semilla=0):
+    detector = pregunta_3.TerminationDetector(1)
+    detector.start(0)
+    nivel = [0]
+    num_procesos = 1
+    for _ in range(profundidad):
+        siguiente = []
+        for padre in nivel:
+            for _ in range(fanout):
+                detector.add_process(False)
+                detector.send(padre, num_procesos)
+                siguiente.append(num_procesos)
+                num_procesos += 1
+        nivel = siguiente
+    orden = list(range(num_procesos))
+    random.Random(semilla).shuffle(orden)
+    latencias = []
+    for inicio in range(0, num_procesos, lote):
+        t = time.perf_counter()
+        for proceso in orden[inicio:inicio + lote]:
+            detector.finish(proceso)
+        detector.flush()
+        latencias.append(time.perf_counter() - t)
+    return num_procesos, latencias, {
+        'terminada': detector.is_done(),
+        'reconocimientos': detector.acks,
+        'senales': detector.signals,
+    }
+
+
+# Pregunta 3: rondas de sincronización de relojes hasta un desfase menor
+# que 1 unidad. Después los relojes avanzan 10000 unidades con una deriva de
+# hasta ±100 ppm por nodo y se mide el desfase antes y después de una ronda más.
+def caso_relojes(nodos, modo, rondas=1000, semilla=0):
+    red = pregunta_3.Network(nodos)
+    red.clock_sync = pregunta_3.ClockSyncService(red, mode=modo, seed=semilla)
+    aleatorio = random.Random(semilla)
+    for node in red.nodes:
+        node.clock = aleatorio.uniform(0, 1000)
+    derivas = [aleatorio.uniform(-100, 100) for _ in range(nodos)]
+    latencias = []
+    for _ in range(rondas):
+        t = time.perf_counter()
+        red.clock_sync.run_round()
+        latencias.append(time.perf_counter() - t)
+        if red.clock_sync.stats()['skew'] < 1.0:
+            break
+    mensajes = sum(red.messages_sent.values())
+    pregunta_3.advance_clocks(red, 10000, derivas)
+    desfase_deriva = red.clock_sync.stats()['skew']
+    red.clock_sync.run_round()
+    estadisticas = red.clock_sync.stats()
+    return mensajes, latencias, {
+        'rondas': len(latencias),
+        'desfase_deriva': desfase_deriva,
+        'desfase_tras_ronda': estadisticas['skew'],
+        'correccion_media': estadisticas['mean_adjustment'],
+    }
+
+
+# Pregunta 4: en cada ronda el nodo 0 hace `escrituras` escrituras sobre
+# `claves` claves y replica al nodo 1, reenviando el log completo (original)
+# o solo las entradas nuevas (incremental)
+def caso_replicacion(rondas, variante, escrituras=50, claves=1000, semilla=0):
+    origen, destino = pregunta_4.Node(0), pregunta_4.Node(1)
+    aleatorio = random.Random(semilla)
+    entradas = bytes_enviados = 0
+    latencias = []
+    for _ in range(rondas):
+        for _ in range(escrituras):
+            origen.store(f'key{aleatorio.randrange(claves)}', aleatorio.random())
+        t = time.perf_counter()
+        if variante == 'original':
+            n, b = replicar_original(origen, destino)
+            entradas += n
+            bytes_enviados += b
+        else:
+            origen.replicate(destino)
+        latencias.append(time.perf_counter() - t)
+    if variante == 'incremental':
+        entradas = origen.traffic['entries_sent']
+        bytes_enviados = origen.traffic['bytes_sent']
+    return rondas * escrituras, latencias, {
+        'entradas_enviadas': entradas,
+        'bytes_enviados': bytes_enviados,
+        'log_receptor': len(destino.log),
+    }
+
+
+# Pregunta 4: dos réplicas sincronizadas divergen durante una partición
+# (cada lado modifica `cambios` claves) y se reconcilian con anti-entropía
+# de Merkle
+def caso_anti_entropia(claves, cambios, semilla=0):
+    a, b = pregunta_4.Node(0), pregunta_4.Node(1)
+    for i in range(claves):
+        a.store(f'key{i}', i)
+    a.replicate(b)
+    aleatorio = random.Random(semilla)
+    for nodo in (a, b):
+        for _ in range(cambios):
+            nodo.store(f'key{aleatorio.randrange(claves)}', aleatorio.random())
+    a.traffic.clear()
+    b.traffic.clear()
+    t = time.perf_counter()
+    hojas = a.anti_entropy(b)
+    latencias = [time.perf_counter() - t]
+    return 2 * cambios, latencias, {
+        'hojas_distintas': hojas,
+        'hashes_comparados': a.traffic['hashes_compared'],
+        'entradas_enviadas': a.traffic['entries_sent'] + b.traffic['entries_sent'],
+        'bytes_enviados': a.traffic['bytes_sent'] + b.traffic['bytes_sent'],
+        'bytes_datos_completos': len(pickle.dumps(a.data)),
+        'convergen': a.data == b.data,
+    }
+
+
+# Pregunta 4: RaftNode.replicate síncrono del líder a cada seguidor tras
+# cada lote de escrituras
+def caso_raft_replicate(nodos, entradas, lote=100):
+    lider = pregunta_4.RaftNode(0, max_batch_entries=64)
+    seguidores = [pregunta_4.RaftNode(i) for i in range(1, nodos)]
+    lider.set_term(1)
+    lider.become_leader()
+    latencias = []
+    for inicio in range(0, entradas, lote):
+        for i in range(inicio, min(entradas, inicio + lote)):
+            lider.store(f'key{i % 1000}', i)
+        t = time.perf_counter()
+        for seguidor in seguidores:
+            lider.replicate(seguidor)
+        latencias.append(time.perf_counter() - t)
+    return entradas, latencias
+
+
+# Pregunta 4: rondas de propuestas confirmadas por el RaftCluster con
+# AppendEntries en tubería sobre la red simulada (1 ms de latencia, enlaces
+# de 100 Mbit/s), con lotes de hasta lote_entradas entradas o lote_bytes bytes
+def caso_raft_cluster(nodos, entradas, ventana, lote_entradas=64, lote_bytes=None, lote=1000):
+    if lote_bytes is not None:
+        lote_entradas = 10 ** 6
+    cluster = pregunta_4.RaftCluster(nodos, lote_entradas, lote_bytes, ventana, 0.001, 12.5e6)
+    latencias = []
+    for inicio in range(0, entradas, lote):
+        t = time.perf_counter()
+        for i in range(inicio, min(entradas, inicio + lote)):
+            cluster.propose(f'key{i % 1000}', i)
+        cluster.run()
+        latencias.append(time.perf_counter() - t)
+    return entradas, latencias, {
+        'confirmadas_por_seg_virtual': entradas / cluster.now,
+        'mensajes': cluster.messages,
+    }
+
+
+# Pregunta 4: 90% de lecturas linealizables (modo 'log', 'read_index' o
+# 'read_index' con lease) que llegan como un proceso de Poisson de `tasa`
+# operaciones por segundo de tiempo virtual. Las métricas están en tiempo
+# virtual: lecturas por segundo, latencias, mensajes por operación, lecturas
+# por ronda de ReadIndex y entradas añadidas al log (con WAL, cada una es un fsync)
+def caso_lecturas_raft(nodos, operaciones, modo, lease=None, tasa=20000, lote=1000, semilla=0):
+    cluster = pregunta_4.RaftCluster(nodos, max_batch_entries=64, window=4, lease=lease)
+    aleatorio = random.Random(semilla)
+    demoras = []
+
+    def leida(ok, valor, demora):
+        demoras.append(demora)
+
+    latencias = []
+    for inicio in range(0, operaciones, lote):
+        instante = cluster.now
+        for i in range(inicio, min(operaciones, inicio + lote)):
+            instante += aleatorio.expovariate(tasa)
+            clave = f'key{aleatorio.randrange(1000)}'
+            if aleatorio.random() < 0.9:
+                cluster.client(instante, modo, clave, done=leida)
+            else:
+                cluster.client(instante, 'write', clave, i)
+        t = time.perf_counter()
+        cluster.run()
+        latencias.append(time.perf_counter() - t)
+    lider = cluster.leader
+    return operaciones, latencias, {
+        'lecturas_por_seg_virtual': len(demoras) / cluster.now,
+        'lectura_p50_ms': percentil(demoras, 50) * 1000,
+        'lectura_p99_ms': percentil(demoras, 99) * 1000,
+        'mensajes_por_operacion': cluster.messages / operaciones,
+        'lecturas_por_ronda': (len(demoras) - lider.reads_local) / lider.read_rounds if lider.read_rounds else 0.0,
+        'lecturas_locales': lider.reads_local,
+        'entradas_log': lider.last_log_index(),
+    }
+
+
+# Modos de agrupar los fsync del WAL
+MODOS_WAL = {
+    'fsync': dict(group_commit=False),
+    'group_commit': dict(group_commit=True),
+    'group_commit_1ms': dict(group_commit=True, group_delay=0.001),
+    'sin_fsync': dict(group_commit=True, fsync=False),
+}
+
+
+# Pregunta 4: escrituras durables en un nodo con WAL según cuántos hilos
+# escriben a la vez y cómo se agrupan los fsync (MODOS_WAL)
+def caso_wal(hilos, modo, escrituras=4000):
+    directorio = tempfile.mkdtemp()
+    try:
+        nodo = pregunta_4.RaftNode(0, wal=pregunta_4.RaftWAL(directorio, **MODOS_WAL[modo]))
+        latencias = []
+
+        def escribir(hilo):
+            for i in range(escrituras // hilos):
+                t = time.perf_counter()
+                nodo.store(f'key{hilo}-{i}', i)
+                latencias.append(time.perf_counter() - t)
+
+        trabajadores = [threading.Thread(target=escribir, args=(h,)) for h in range(hilos)]
+        t0 = time.perf_counter()
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        total = time.perf_counter() - t0
+        metricas = {
+            'escrituras_por_seg': nodo.wal.records / total,
+            'escrituras_por_fsync': nodo.wal.records / max(1, nodo.wal.fsyncs),
+        }
+        nodo.wal.close()
+    finally:
+        shutil.rmtree(directorio)
+    return len(latencias), latencias, metricas
+
+
+# Pregunta 4: tiempo de reinicio (recuperación desde el WAL) según el tamaño
+# del log, sin compactar o tomando una instantánea cada `cada` entradas
+def caso_recuperacion(entradas, compactar, claves=1000, cada=10000):
+    directorio = tempfile.mkdtemp()
+    try:
+        nodo = pregunta_4.RaftNode(0, wal=pregunta_4.RaftWAL(directorio, fsync=False))
+        for inicio in range(0, entradas, cada):
+            for i in range(inicio, min(entradas, inicio + cada)):
+                nodo.log.append((0, f'key{i % claves}', i))
+            # Escritura en bloque para preparar el log rápidamente
+            nodo.wal.append_batch([(j + 1, 0, f'key{j % claves}', j)
+                                   for j in range(inicio, min(entradas, inicio + cada))])
+            nodo.advance_commit()
+            # Tras la última instantánea quedan `cada` entradas en el log
+            if compactar and inicio + cada < entradas:
+                nodo.take_snapshot()
+        t = time.perf_counter()
+        nodo.restart()
+        latencias = [time.perf_counter() - t]
+        metricas = {'bytes_log': nodo.wal.size_bytes(), 'entradas_releidas': len(nodo.log)}
+        nodo.wal.close()
+    finally:
+        shutil.rmtree(directorio)
+    return entradas, latencias, metricas
+
+
+# Pregunta 4: escrituras y lecturas en la capa particionada con 2 réplicas.
+# El rendimiento agregado supone que cada nodo atiende `capacidad`
+# operaciones/s en paralelo: lo limita el nodo más cargado. Al final se
+# cuentan las claves movidas al añadir y al quitar un nodo.
+def caso_particiones(nodos, claves, capacidad=10000, semilla=0):
+    cluster = pregunta_4.ShardedCluster([pregunta_4.Node(i) for i in range(nodos)], replication=2)
+    aleatorio = random.Random(semilla)
+    lecturas = [f'key{aleatorio.randrange(claves)}' for _ in range(claves)]
+    latencias = []
+    for i in range(claves):
+        clave = f'key{i}'
+        t = time.perf_counter()
+        cluster.put(clave, i)
+        latencias.append(time.perf_counter() - t)
+    for clave in lecturas:
+        t = time.perf_counter()
+        cluster.get(clave)
+        latencias.append(time.perf_counter() - t)
+    estadisticas = cluster.stats()
+    operaciones = sum(cluster.operations.values())
+    cluster.moved = 0
+    cluster.add_node(pregunta_4.Node(nodos))
+    movidas_entrada = cluster.moved
+    cluster.moved = 0
+    cluster.remove_node(0)
+    return 2 * claves, latencias, {
+        'rendimiento_agregado': operaciones / (estadisticas['max_operations'] / capacidad),
+        'claves_media': estadisticas['mean_keys'],
+        'claves_max': estadisticas['max_keys'],
+        'movidas_entrada': movidas_entrada,
+        'movidas_salida': cluster.moved,
+    }
+
+
+# Pregunta 4: simulacion sobre el simulador de eventos discretos (sin WAL)
+# con clústeres de distinto tamaño; las operaciones son los eventos
+def caso_simulacion(nodos, iteraciones, semilla=0):
+    topologia = pregunta_4.connected_nodes if nodos == 5 else pregunta_4.generar_topologia(nodos)
+    r = pregunta_4.simulacion(iteraciones, topologia=topologia, semilla=semilla, verbose=False, persistente=False)
+    return r['events'], [r['wall_time']], {
+        'horas_simuladas': r['simulated_time'] / 3600,
+        'simulados_por_seg': r['simulated_per_wall_second'],
+        'escrituras': r['writes'],
+        'perdidas': r['lost_writes'],
+    }
+
+
+# Parámetros de cada caso por escala
+CASOS = {
+    'cola_eventos': (caso_cola_eventos, {
+        'pequena': [{'eventos': 10000}],
+        'mediana': [{'eventos': 10000}, {'eventos': 100000}],
+        'grande': [{'eventos': 100000}, {'eventos': 1000000}],
+    }),
+    'despacho_cola': (caso_despacho_cola, {
+        'pequena': [{'eventos': 2000, 'variante': v} for v in ('executor', 'asyncio')],
+        'mediana': [{'eventos': 20000, 'variante': v} for v in ('executor', 'asyncio')],
+        'grande': [{'eventos': 200000, 'variante': v} for v in ('executor', 'asyncio')],
+    }),
+    'ejecutores': (caso_ejecutores, {
+        'pequena': [{'celdas': 4, 'motor': m, 'iteraciones': 100000} for m in ('local', 'procesos')],
+        'mediana': [{'celdas': 16, 'motor': m} for m in ('local', 'procesos')],
+        'grande': [{'celdas': 64, 'motor': m} for m in ('local', 'procesos')],
+    }),
+    'notebook': (caso_notebook, {
+        'pequena': [{'celdas': 50, 'ejecuciones': 2000}],
+        'mediana': [{'celdas': 50, 'ejecuciones': 20000, 'coalescer': c} for c in (False, True)],
+        'grande': [{'celdas': 50, 'ejecuciones': 20000}, {'celdas': 1000, 'ejecuciones': 100000}],
+    }),
+    'instantaneas': (caso_instantaneas, {
+        'pequena': [{'robots': 10}],
+        'mediana': [{'robots': r} for r in (10, 100)],
+        'grande': [{'robots': r} for r in (100, 1000)],
+    }),
+    'almacen_instantaneas': (caso_almacen_instantaneas, {
+        'pequena': [{'robots': 100, 'instantaneas': 50}],
+        'mediana': [{'robots': 1000, 'instantaneas': 200}],
+        'grande': [{'robots': 10000, 'instantaneas': 500}],
+    }),
+    'relojes_vectoriales': (caso_relojes_vectoriales, {
+        'pequena': [{'robots': 100, 'mensajes': 2000, 'variante': v} for v in ('original', 'compacto', 'deltas')],
+        'mediana': [{'robots': r, 'mensajes': 5000, 'variante': v}
+                    for r in (100, 1000) for v in ('original', 'compacto', 'deltas')],
+        'grande': [{'robots': r, 'mensajes': 20000, 'variante': v}
+                   for r in (1000, 10000) for v in ('original', 'compacto', 'deltas')],
+    }),
+    'comparar_relojes': (caso_comparar_relojes, {
+        'pequena': [{'robots': 100, 'comparaciones': 2000}],
+        'mediana': [{'robots': 500, 'comparaciones': 20000}],
+        'grande': [{'robots': 1000, 'comparaciones': 100000}],
+    }),
+    'difusion_causal': (caso_difusion_causal, {
+        'pequena': [{'nodos': 10, 'difusiones': 500, 'variante': v} for v in ('indexada', 'reescaneo')],
+        'mediana': [{'nodos': n, 'difusiones': 2000, 'variante': v, 'reorden': r}
+                    for n in (10, 50) for r in (0.0, 0.5, 1.0) for v in ('indexada', 'reescaneo')],
+        'grande': [{'nodos': n, 'difusiones': 5000, 'variante': v}
+                   for n in (50, 200) for v in ('indexada', 'reescaneo')],
+    }),
+    'raymond': (caso_raymond, {
+        'pequena': [{'nodos': 200, 'contencion': 10}],
+        'mediana': [{'nodos': 2000, 'contencion': c, 'aridad': a, 'rondas': 20}
+                    for a in (1, 2, 8) for c in (1, 10, 100)],
+        'grande': [{'nodos': 20000, 'contencion': c} for c in (1, 100, 1000)],
+    }),
+    'heap_generacional': (caso_heap_generacional, {
+        'pequena': [{'joven': 1000, 'asignaciones': 20000}],
+        'mediana': [{'joven': j, 'asignaciones': 100000} for j in (1000, 10000, 100000)],
+        'grande': [{'joven': j, 'asignaciones': 500000} for j in (10000, 100000, 1000000)],
+    }),
+    'ricart_agrawala': (caso_ricart_agrawala, {
+        'pequena': [{'nodos': 50, 'entradas': 500}],
+        'mediana': [{'nodos': n, 'entradas': 2000, 'carga': c, 'roucairol_carvalho': rc}
+                    for n in (100, 200) for c in ('ronda', 'repetida') for rc in (False, True)],
+        'grande': [{'nodos': n, 'entradas': 5000, 'carga': c, 'roucairol_carvalho': rc}
+                   for n in (200, 1000) for c in ('ronda', 'repetida') for rc in (False, True)],
+    }),
+    'transporte': (caso_transporte, {
+        'pequena': [{'nodos': 100, 'mensajes': 5000}],
+        'mediana': [{'nodos': n, 'mensajes': 50000, 'retardo_ms': r} for n in (100, 1000) for r in (0, 1)],
+        'grande': [{'nodos': n, 'mensajes': 50000, 'retardo_ms': r} for n in (100, 1000, 5000) for r in (0, 1)],
+    }),
+    'multiproceso': (caso_multiproceso, {
+        'pequena': [{'nodos': 100, 'mensajes': 5000, 'trabajadores': 1}],
+        'mediana': [{'nodos': 1000, 'mensajes': 50000, 'trabajadores': t}
+                    for t in sorted({1, os.cpu_count() or 1})],
+        'grande': [{'nodos': 5000, 'mensajes': 200000, 'trabajadores': t}
+                   for t in sorted({1, os.cpu_count() or 1})],
+    }),
+    'cheney': (caso_cheney, {
+        'pequena': [{'vivos': 1000, 'asignaciones': 20000}],
+        'mediana': [{'vivos': v, 'asignaciones': 100000} for v in (100, 1000, 10000, 50000)],
+        'grande': [{'vivos': v, 'asignaciones': 200000} for v in (10000, 50000)],
+    }),
+    'terminacion': (caso_terminacion, {
+        'pequena': [{'fanout': 10, 'profundidad': 3}],
+        'mediana': [{'fanout': f, 'profundidad': p} for f, p in ((2, 14), (10, 4), (100, 2))],
+        'grande': [{'fanout': f, 'profundidad': p}
+                   for f, p in ((1, 100000), (2, 17), (10, 5), (1000, 2), (100000, 1))],
+    }),
+    'relojes': (caso_relojes, {
+        'pequena': [{'nodos': 100, 'modo': m} for m in ('berkeley', 'gossip')],
+        'mediana': [{'nodos': n, 'modo': m} for n in (100, 1000) for m in ('berkeley', 'gossip')],
+        'grande': [{'nodos': n, 'modo': m} for n in (1000, 10000) for m in ('berkeley', 'gossip')],
+    }),
+    'replicacion': (caso_replicacion, {
+        'pequena': [{'rondas': 10, 'variante': v} for v in ('original', 'incremental')],
+        'mediana': [{'rondas': r, 'variante': v} for r in (10, 50) for v in ('original', 'incremental')],
+        'grande': [{'rondas': r, 'variante': v} for r in (50, 200) for v in ('original', 'incremental')],
+    }),
+    'anti_entropia': (caso_anti_entropia, {
+        'pequena': [{'claves': 10000, 'cambios': 10}],
+        'mediana': [{'claves': 10000, 'cambios': c} for c in (10, 100, 1000)],
+        'grande': [{'claves': 100000, 'cambios': c} for c in (10, 100, 1000, 10000)],
+    }),
+    'raft_replicate': (caso_raft_replicate, {
+        'pequena': [{'nodos': 3, 'entradas': 2000}],
+        'mediana': [{'nodos': n, 'entradas': 10000} for n in (3, 5)],
+        'grande': [{'nodos': n, 'entradas': 50000} for n in (5, 9)],
+    }),
+    'raft_cluster': (caso_raft_cluster, {
+        'pequena': [{'nodos': 3, 'entradas': 2000, 'ventana': 4}],
+        'mediana': [{'nodos': 5, 'entradas': 10000, 'ventana': v, 'lote_entradas': n}
+                    for n in (1, 8, 64) for v in (1, 4, 16)]
+                   + [{'nodos': 5, 'entradas': 10000, 'ventana': v, 'lote_bytes': 4096} for v in (1, 4, 16)],
+        'grande': [{'nodos': n, 'entradas': 50000, 'ventana': v, 'lote_entradas': b}
+                   for n in (5, 9) for v in (1, 16) for b in (64, 512)],
+    }),
+    'lecturas_raft': (caso_lecturas_raft, {
+        'pequena': [{'nodos': 3, 'operaciones': 2000, 'modo': 'read_index'}],
+        'mediana': [{'nodos': 5, 'operaciones': 10000, 'modo': m, 'lease': l, 'tasa': t}
+                    for t in (2000, 20000, 100000)
+                    for m, l in (('log', None), ('read_index', None), ('read_index', 0.01))],
+        'grande': [{'nodos': 5, 'operaciones': 50000, 'modo': m, 'lease': l}
+                   for m, l in (('log', None), ('read_index', None), ('read_index', 0.01))],
+    }),
+    'wal': (caso_wal, {
+        'pequena': [{'hilos': 8, 'modo': m, 'escrituras': 400} for m in ('group_commit', 'sin_fsync')],
+        'mediana': [{'hilos': h, 'modo': m} for h in (1, 8, 32) for m in MODOS_WAL],
+        'grande': [{'hilos': h, 'modo': m, 'escrituras': 20000} for h in (8, 32, 128) for m in MODOS_WAL],
+    }),
+    'recuperacion': (caso_recuperacion, {
+        'pequena': [{'entradas': 20000, 'compactar': c} for c in (False, True)],
+        'mediana': [{'entradas': e, 'compactar': c} for e in (10000, 50000, 200000) for c in (False, True)],
+        'grande': [{'entradas': e, 'compactar': c} for e in (200000, 1000000) for c in (False, True)],
+    }),
+    'particiones': (caso_particiones, {
+        'pequena': [{'nodos': 5, 'claves': 5000}],
+        'mediana': [{'nodos': n, 'claves': 20000} for n in (5, 10, 50, 100)],
+        'grande': [{'nodos': n, 'claves': 100000} for n in (10, 100)],
+    }),
+    'simulacion': (caso_simulacion, {
+        'pequena': [{'nodos': 5, 'iteraciones': 100}],
+        'mediana': [{'nodos': n, 'iteraciones': i} for n, i in ((5, 1000), (100, 1000), (1000, 100))],
+        'grande': [{'nodos': n, 'iteraciones': i} for n, i in ((100, 10000), (1000, 1000))],
+    }),
+}
+
+
+# Nombre de una medición: caso[param=valor,...]
+def nombre_medicion(caso, parametros):
+    return f"{caso}[{','.join(f'{k}={v}' for k, v in parametros.items())}]"
+
+
+# Ejecuta un caso con unos parámetros y resume la ejecución con más ops/s
+# de las repeticiones; el pico de memoria sale de una ejecución aparte
+def medir(funcion, parametros, repeticiones=1, memoria=True):
+    mejor = None
+    for _ in range(repeticiones):
+        gc.collect()
+        with silencio():
+            operaciones, latencias, *metricas = funcion(**parametros)
+        ocupado = sum(latencias)
+        ops_por_seg = operaciones / ocupado if ocupado > 0 else 0.0
+        if mejor is None or ops_por_seg > mejor['ops_por_seg']:
+            mejor = {
+                'operaciones': operaciones,
+                'llamadas': len(latencias),
+                'segundos': ocupado,
+                'ops_por_seg': ops_por_seg,
+                'p50_us': percentil(latencias, 50) * 1e6,
+                'p90_us': percentil(latencias, 90) * 1e6,
+                'p99_us': percentil(latencias, 99) * 1e6,
+                'max_us': max(latencias, default=0.0) * 1e6,
+                'metricas': metricas[0] if metricas else {},
+            }
+    mejor['pico_memoria_kib'] = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with silencio():
+                funcion(**parametros)
+            mejor['pico_memoria_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return mejor
+
+
+def _formatear_metrica(valor):
+    return f'{valor:.4g}' if isinstance(valor, float) else str(valor)
+
+
+def ejecutar(escala='pequena', casos=None, repeticiones=1, memoria=True, con_trazas=False):
+    trazas.TRAZADOR.configurar(activo=con_trazas)
+    resultados = {}
+    for caso, (funcion, escalas) in CASOS.items():
+        if casos and caso not in casos:
+            continue
+        for parametros in escalas[escala]:
+            nombre = nombre_medicion(caso, parametros)
+            r = medir(funcion, parametros, repeticiones, memoria)
+            resultados[nombre] = r
+            pico = f"{r['pico_memoria_kib']:10.0f} KiB" if r['pico_memoria_kib'] is not None else ''
+            print(f"{nombre:<64} {r['ops_por_seg']:12.0f} ops/s  p50 {r['p50_us']:10.1f} us"
+                  f"  p99 {r['p99_us']:10.1f} us  {pico}")
+            if r['metricas']:
+                print('    ' + '  '.join(f'{k}={_formatear_metrica(v)}' for k, v in r['metricas'].items()))
+    return {
+        'meta': {
+            'escala': escala,
+            'repeticiones': repeticiones,
+            'trazas': con_trazas,
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'resultados': resultados,
+    }
+
+
+# Compara dos ejecuciones: es regresión que ops/s baje, o que la latencia p99
+# o el pico de memoria suban, más que el umbral relativo. Las dos ejecuciones
+# deben haberse medido con la misma opción de trazas
+def comparar(base, nuevo, umbral=0.10):
+    trazas_base, trazas_nuevo = base['meta'].get('trazas'), nuevo['meta'].get('trazas')
+    if trazas_base != trazas_nuevo:
+        raise ValueError(f"No se pueden comparar ejecuciones con trazas={trazas_base} y trazas={trazas_nuevo}")
+    regresiones = []
+    for nombre, b in base['resultados'].items():
+        n = nuevo['resultados'].get(nombre)
+        if n is None:
+            print(f"{nombre:<64} falta en la nueva ejecución")
+            continue
+        cambios = []
+        if b['ops_por_seg'] > 0:
+            cambio = n['ops_por_seg'] / b['ops_por_seg'] - 1
+            cambios.append(('ops/s', cambio, cambio < -umbral))
+        for metrica, etiqueta in (('p99_us', 'p99'), ('pico_memoria_kib', 'memoria')):
+            if b.get(metrica) and n.get(metrica) is not None:
+                cambio = n[metrica] / b[metrica] - 1
+                cambios.append((etiqueta, cambio, cambio > umbral))
+        marcas = [etiqueta for etiqueta, _, regresion in cambios if regresion]
+        if marcas:
+            regresiones.append((nombre, marcas))
+        detalle = '  '.join(f"{etiqueta} {cambio:+7.1%}" for etiqueta, cambio, _ in cambios)
+        print(f"{nombre:<64} {detalle}  {'REGRESIÓN' if marcas else 'ok'}")
+    for nombre in nuevo['resultados'].keys() - base['resultados'].keys():
+        print(f"{nombre:<64} nueva medición")
+    print(f"{len(regresiones)} regresiones con umbral {umbral:.0%}")
+    return regresiones
+
+
+def main(argumentos):
+    if argumentos[:1] == ['comparar']:
+        parser = argparse.ArgumentParser(prog='benchmarks.py comparar')
+        parser.add_argument('base')
+        parser.add_argument('nuevo')
+        parser.add_argument('--umbral', type=float, default=0.10)
+        opciones = parser.parse_args(argumentos[1:])
+        with open(opciones.base) as f:
+            base = json.load(f)
+        with open(opciones.nuevo) as f:
+            nuevo = json.load(f)
+        try:
+            return 1 if comparar(base, nuevo, opciones.umbral) else 0
+        except ValueError as error:
+            print(error)
+            return 2
+    parser = argparse.ArgumentParser(prog='benchmarks.py')
+    parser.add_argument('--escala', choices=('pequena', 'mediana', 'grande'), default='pequena')
+    parser.add_argument('--casos', nargs='*', choices=sorted(CASOS))
+    parser.add_argument('--repeticiones', type=int, default=1)
+    parser.add_argument('--sin-memoria', action='store_true')
+    parser.add_argument('--trazas', action='store_true')
+    parser.add_argument('--salida', default='resultados.json')
+    opciones = parser.parse_args(argumentos)
+    informe = ejecutar(opciones.escala, opciones.casos, opciones.repeticiones, not opciones.sin_memoria,
+                       opciones.trazas)
+    with open(opciones.salida, 'w') as f:
+        json.dump(informe, f, indent=2, sort_keys=True)
+    print(f"Resultados guardados en {opciones.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,202 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+# Trazas estructuradas compartidas por las cuatro preguntas
+# Los protocolos registran eventos tipados en un buffer circular
+# preasignado en lugar de imprimir: el texto del evento (una plantilla de
+# str.format con sus argumentos) solo se formatea al exportar o con eco.
+# Cada componente se activa y desactiva por separado y puede muestrear uno de
+# cada n eventos. Con el componente desactivado el coste es leer un atributo:
+#
+#     if TRAZA.activo:
+#         TRAZA.evento('recibido', 'Mensaje recibido en Nodo {nodo}', nodo=self.node_id)
+#
+# Las trazas se exportan en el formato JSON de eventos de Chrome
+# (chrome://tracing, Perfetto) para analizar los flujos de mensajes.
+
+# Fases de los eventos de Chrome
+INSTANTANEO = 'i'
+COMPLETO = 'X'
+CONTADOR = 'C'
+
+
+class Componente:
+    __slots__ = ('trazador', 'nombre', 'activo', 'muestreo', 'eco', '_cuenta')
+
+    def __init__(self, trazador, nombre, activo=True, muestreo=1, eco=False):
+        self.trazador = trazador
+        self.nombre = nombre
+        self.activo = activo
+        self.muestreo = muestreo  # Se registra uno de cada muestreo eventos
+        self.eco = eco            # Además de registrar, imprime el evento formateado
+        self._cuenta = itertools.count()
+
+    def _muestreado(self):
+        return self.muestreo <= 1 or next(self._cuenta) % self.muestreo == 0
+
+    def evento(self, nombre, plantilla=None, **args):
+        if self.activo and self._muestreado():
+            self.trazador.registrar(INSTANTANEO, self, nombre, plantilla, args, 0)
+
+    def contador(self, nombre, **valores):
+        if self.activo and self._muestreado():
+            self.trazador.registrar(CONTADOR, self, nombre, None, valores, 0)
+
+    # Evento con duración: with TRAZA.intervalo('recolectar'): ...
+    def intervalo(self, nombre, plantilla=None, **args):
+        if self.activo and self._muestreado():
+            return _Intervalo(self, nombre, plantilla, args)
+        return _NADA
+
+
+class _Intervalo:
+    __slots__ = ('componente', 'nombre', 'plantilla', 'args', 'inicio')
+
+    def __init__(self, componente, nombre, plantilla, args):
+        self.componente = componente
+        self.nombre = nombre
+        self.plantilla = plantilla
+        self.args = args
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *excepcion):
+        duracion = time.perf_counter_ns() - self.inicio
+        self.componente.trazador.registrar(COMPLETO, self.componente, self.nombre, self.plantilla,
+                                           self.args, duracion, self.inicio)
+        return False
+
+
+class _SinIntervalo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+_NADA = _SinIntervalo()
+
+
+# Formatea el texto legible de un evento
+def formatear(componente, nombre, plantilla, args):
+    if plantilla is not None:
+        return plantilla.format(**args)
+    detalle = ' '.join(f'{k}={v}' for k, v in args.items())
+    return f'[{componente}] {nombre} {detalle}'.rstrip()
+
+
+def _json(valor):
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    return repr(valor)
+
+
+# Tipos que se copian al registrar: así la traza muestra el contenido del
+# contenedor en el momento del evento aunque el llamador lo modifique después
+_MUTABLES = (list, dict, set)
+
+
+# Buffer circular de eventos: cada evento es una tupla
+# (indice, ts_ns, fase, componente, nombre, plantilla, args, hilo, duracion_ns).
+# El índice del siguiente hueco sale de un itertools.count, que avanza de
+# forma atómica con el GIL, así que registrar no toma ningún lock; el número
+# de eventos registrados es el siguiente valor del contador.
+# Al registrar se guardan referencias a los argumentos (con una copia
+# superficial de las listas, diccionarios y conjuntos); el repr de los que no
+# son escalares se calcula solo al exportar.
+class Trazador:
+    def __init__(self, capacidad=1 << 16):
+        self.capacidad = capacidad
+        self.eventos = [None] * capacidad
+        self.componentes = {}
+        self.inicio = time.perf_counter_ns()
+        self._indice = itertools.count()
+
+    def componente(self, nombre, activo=True, muestreo=1):
+        if nombre not in self.componentes:
+            self.componentes[nombre] = Componente(self, nombre, activo, muestreo)
+        return self.componentes[nombre]
+
+    # Cambia la configuración de un componente o, sin nombre, de todos
+    def configurar(self, nombre=None, activo=None, muestreo=None, eco=None):
+        componentes = self.componentes.values() if nombre is None else [self.componente(nombre)]
+        for componente in componentes:
+            if activo is not None:
+                componente.activo = activo
+            if muestreo is not None:
+                componente.muestreo = muestreo
+            if eco is not None:
+                componente.eco = eco
+
+    def registrar(self, fase, componente, nombre, plantilla, args, duracion, ts=None):
+        indice = next(self._indice)
+        if ts is None:
+            ts = time.perf_counter_ns()
+        for k, v in args.items():
+            if type(v) in _MUTABLES:
+                args[k] = v.copy()
+        self.eventos[indice % self.capacidad] = (indice, ts, fase, componente.nombre, nombre, plantilla, args,
+                                                  threading.get_ident(), duracion)
+        if componente.eco:
+            print(formatear(componente.nombre, nombre, plantilla, args))
+
+    # Número de eventos registrados desde el último limpiar
+    @property
+    def registrados(self):
+        # repr(itertools.count(n)) es 'count(n)'; leerlo no avanza el contador
+        return int(repr(self._indice)[6:-1])
+
+    # Eventos aún en el buffer, del más antiguo al más reciente
+    def contenido(self):
+        eventos = sorted((evento for evento in self.eventos if evento is not None), key=lambda evento: evento[0])
+        return [evento[1:] for evento in eventos]
+
+    # Eventos que se sobrescribieron por falta de espacio
+    def descartados(self):
+        return max(0, self.registrados - self.capacidad)
+
+    def limpiar(self):
+        self.eventos = [None] * self.capacidad
+        self._indice = itertools.count()
+
+    def chrome(self):
+        pid = os.getpid()
+        eventos = []
+        for ts, fase, componente, nombre, plantilla, args, hilo, duracion in self.contenido():
+            evento = {
+                'name': nombre,
+                'cat': componente,
+                'ph': fase,
+                'ts': (ts - self.inicio) / 1000,
+                'pid': pid,
+                'tid': hilo,
+                'args': {k: _json(v) for k, v in args.items()},
+            }
+            if fase == INSTANTANEO:
+                evento['s'] = 't'
+                if plantilla is not None:
+                    evento['args']['mensaje'] = formatear(componente, nombre, plantilla, args)
+            elif fase == COMPLETO:
+                evento['dur'] = duracion / 1000
+            eventos.append(evento)
+        return {
+            'traceEvents': eventos,
+            'displayTimeUnit': 'ms',
+            'otherData': {'descartados': self.descartados()},
+        }
+
+    def exportar_chrome(self, ruta):
+        with open(ruta, 'w') as f:
+            json.dump(self.chrome(), f)
+
+
+# Trazador global del proceso
+TRAZADOR = Trazador()